@@ -0,0 +1,214 @@
+"""Harvest analytics served from the rekap_panen_bulanan rollup (migration 0004)."""
+from datetime import date
+
+DIMENSIONS = ('komoditas_bulan', 'petani', 'ringkasan')
+
+
+def _range(where, params, dari, sampai):
+    if dari:
+        where.append("r.bulan >= date_trunc('month', %s::date)")
+        params.append(dari)
+    if sampai:
+        where.append("r.bulan <= %s")
+        params.append(sampai)
+
+
+def per_komoditas_bulan(conn, user_id, dari=None, sampai=None):
+    where, params = ["r.user_id = %s"], [user_id]
+    _range(where, params, dari, sampai)
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT r.bulan, r.nama_komoditas, sum(r.total_jumlah), sum(r.jumlah_catatan)
+            FROM rekap_panen_bulanan r
+            WHERE {' AND '.join(where)}
+            GROUP BY r.bulan, r.nama_komoditas
+            ORDER BY r.bulan DESC, r.nama_komoditas
+        """, params)
+        return [
+            {'bulan': bulan.strftime('%Y-%m'), 'nama_komoditas': komoditas,
+             'total_jumlah': float(total), 'jumlah_catatan': int(catatan)}
+            for bulan, komoditas, total, catatan in cur.fetchall()
+        ]
+
+
+def per_petani(conn, user_id, dari=None, sampai=None):
+    """Total harvest per farmer and yield per hectare of the farmer's parcel (luas_lahan is in m²)."""
+    where, params = ["r.user_id = %s"], [user_id]
+    _range(where, params, dari, sampai)
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT p.id, p.nama, t.total, t.catatan, p.luas_lahan
+            FROM (
+                SELECT r.petani_id, sum(r.total_jumlah) AS total, sum(r.jumlah_catatan) AS catatan
+                FROM rekap_panen_bulanan r
+                WHERE {' AND '.join(where)}
+                GROUP BY r.petani_id
+            ) t
+            JOIN petani p ON p.id = t.petani_id
+            ORDER BY t.total DESC, p.nama
+        """, params)
+        result = []
+        for petani_id, nama, total, catatan, luas_m2 in cur.fetchall():
+            luas_ha = float(luas_m2) / 10000.0 if luas_m2 else None
+            result.append({
+                'petani_id': petani_id,
+                'nama': nama,
+                'total_jumlah': float(total),
+                'jumlah_catatan': int(catatan),
+                'luas_lahan_ha': round(luas_ha, 4) if luas_ha else None,
+                'hasil_per_ha': round(float(total) / luas_ha, 2) if luas_ha else None,
+            })
+        return result
+
+
+def ringkasan(conn, user_id, dari=None, sampai=None):
+    """Totals for the whole user: harvest, records, farmers with harvests, yield per hectare."""
+    where, params = ["r.user_id = %s"], [user_id]
+    _range(where, params, dari, sampai)
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT COALESCE(sum(t.total), 0), COALESCE(sum(t.catatan), 0), count(*),
+                   COALESCE(sum(p.luas_lahan), 0)
+            FROM (
+                SELECT r.petani_id, sum(r.total_jumlah) AS total, sum(r.jumlah_catatan) AS catatan
+                FROM rekap_panen_bulanan r
+                WHERE {' AND '.join(where)}
+                GROUP BY r.petani_id
+            ) t
+            JOIN petani p ON p.id = t.petani_id
+        """, params)
+        total, catatan, jumlah_petani, luas_m2 = cur.fetchone()
+    luas_ha = float(luas_m2) / 10000.0
+    return {
+        'total_jumlah': float(total),
+        'jumlah_catatan': int(catatan),
+        'jumlah_petani': int(jumlah_petani),
+        'luas_lahan_ha': round(luas_ha, 4),
+        'hasil_per_ha': round(float(total) / luas_ha, 2) if luas_ha else None,
+    }
+
+
+# A komoditas counts as an active planting for this many days after tanggal_tanam.
+MASA_TANAM_HARI = 120
+ENTRI_TERBARU = 5
+
+
+def musim_tanam(today):
+    """Returns (label, first day) of the planting season containing ``today``.
+
+    Musim hujan runs October-March, musim kemarau April-September.
+    """
+    if today.month >= 10:
+        return f"Musim Hujan {today.year}/{today.year + 1}", date(today.year, 10, 1)
+    if today.month <= 3:
+        return f"Musim Hujan {today.year - 1}/{today.year}", date(today.year - 1, 10, 1)
+    return f"Musim Kemarau {today.year}", date(today.year, 4, 1)
+
+
+DASHBOARD_SQL = """
+    WITH p AS (
+        SELECT count(*) AS jumlah, COALESCE(sum(luas_lahan), 0) AS luas
+        FROM petani WHERE user_id = %(user_id)s
+    ), tanam AS (
+        SELECT count(*) AS jumlah
+        FROM komoditas k JOIN petani pt ON pt.id = k.petani_id
+        WHERE pt.user_id = %(user_id)s
+          AND k.tanggal_tanam > %(today)s::date - %(masa_tanam)s
+          AND k.tanggal_tanam <= %(today)s::date
+    ), panen AS (
+        SELECT COALESCE(sum(total_jumlah), 0) AS total, COALESCE(sum(jumlah_catatan), 0) AS catatan
+        FROM rekap_panen_bulanan
+        WHERE user_id = %(user_id)s AND bulan >= %(mulai)s
+    ), log AS (
+        SELECT DISTINCT ON (table_name, row_id) table_name, row_id, change_id, changed_at
+        FROM (
+            SELECT table_name, row_id, change_id, changed_at FROM sync_log
+            WHERE user_id = %(user_id)s AND op = 'u'
+            ORDER BY txid DESC, change_id DESC
+            LIMIT %(scan)s
+        ) recent
+        ORDER BY table_name, row_id, change_id DESC
+    ), terbaru AS (
+        SELECT log.table_name AS jenis, log.change_id, log.changed_at,
+               CASE log.table_name
+                   WHEN 'petani' THEN tp.nama
+                   WHEN 'komoditas' THEN kp.nama || ' - ' || k.nama_komoditas
+                   ELSE hp.nama || ' - ' || h.nama_komoditas || ' (' || h.jumlah || ')'
+               END AS keterangan
+        FROM log
+        LEFT JOIN petani tp ON log.table_name = 'petani' AND tp.id = log.row_id
+        LEFT JOIN komoditas k ON log.table_name = 'komoditas' AND k.id = log.row_id
+        LEFT JOIN petani kp ON kp.id = k.petani_id
+        LEFT JOIN hasil_panen h ON log.table_name = 'hasil_panen' AND h.id = log.row_id
+        LEFT JOIN petani hp ON hp.id = h.petani_id
+    )
+    SELECT p.jumlah, p.luas, tanam.jumlah, panen.total, panen.catatan,
+           (SELECT COALESCE(json_agg(json_build_object(
+                       'jenis', t.jenis, 'keterangan', t.keterangan,
+                       'waktu', to_char(t.changed_at, 'YYYY-MM-DD"T"HH24:MI:SSOF'))
+                       ORDER BY t.change_id DESC), '[]'::json)
+            FROM (SELECT * FROM terbaru WHERE keterangan IS NOT NULL
+                  ORDER BY change_id DESC LIMIT %(limit)s) t)
+    FROM p, tanam, panen
+"""
+
+
+def dashboard_params(user_id, today):
+    """Query parameters of DASHBOARD_SQL for ``user_id`` on ``today``."""
+    return {'user_id': user_id, 'today': today, 'masa_tanam': MASA_TANAM_HARI,
+            'mulai': musim_tanam(today)[1], 'scan': ENTRI_TERBARU * 4, 'limit': ENTRI_TERBARU}
+
+
+def dashboard(conn, user_id, today):
+    """KPIs for the dashboard in one round trip.
+
+    Farmer count and area come from petani, active plantings from komoditas
+    (index on petani_id, tanggal_tanam), season totals from the harvest
+    rollup, and the latest entries from the newest sync_log rows of the user
+    (index on user_id, txid), so no part scans the user's full history.
+    """
+    label, mulai = musim_tanam(today)
+    with conn.cursor() as cur:
+        cur.execute(DASHBOARD_SQL, dashboard_params(user_id, today))
+        jumlah_petani, luas_m2, tanam_aktif, total_panen, catatan_panen, terbaru = cur.fetchone()
+    return {
+        'jumlah_petani': int(jumlah_petani),
+        'luas_lahan_ha': round(float(luas_m2) / 10000.0, 2),
+        'tanam_aktif': int(tanam_aktif),
+        'musim': label,
+        'musim_mulai': mulai.isoformat(),
+        'panen_musim_ini': float(total_panen),
+        'catatan_panen_musim_ini': int(catatan_panen),
+        'terbaru': terbaru,
+    }
+
+
+QUERIES = {
+    'komoditas_bulan': per_komoditas_bulan,
+    'petani': per_petani,
+    'ringkasan': ringkasan,
+}
+
+
+def rebuild_rollups(conn, user_id=None):
+    """Recomputes rekap_panen_bulanan from hasil_panen, for one user or everyone.
+
+    Only needed to repair drift (e.g. after bulk SQL run with triggers
+    disabled); normal writes keep the rollup current through the trigger.
+    """
+    with conn.cursor() as cur:
+        if user_id is None:
+            cur.execute("DELETE FROM rekap_panen_bulanan")
+        else:
+            cur.execute("DELETE FROM rekap_panen_bulanan WHERE user_id = %s", (user_id,))
+        cur.execute(f"""
+            INSERT INTO rekap_panen_bulanan (user_id, petani_id, nama_komoditas, bulan, total_jumlah, jumlah_catatan)
+            SELECT p.user_id, h.petani_id, h.nama_komoditas, date_trunc('month', h.tanggal_panen)::date,
+                   COALESCE(sum(h.jumlah), 0), count(*)
+            FROM hasil_panen h
+            JOIN petani p ON p.id = h.petani_id
+            WHERE h.tanggal_panen IS NOT NULL AND p.user_id IS NOT NULL
+              {'' if user_id is None else 'AND p.user_id = %s'}
+            GROUP BY p.user_id, h.petani_id, h.nama_komoditas, date_trunc('month', h.tanggal_panen)
+        """, () if user_id is None else (user_id,))
+        return cur.rowcount
@@ -1,82 +1,125 @@
-from flask import Flask, render_template, request, redirect, session, url_for, flash
+from flask import Flask, current_app, g, message_flashed, render_template, request, redirect, session, url_for, flash, jsonify, Response, make_response, stream_template, stream_with_context, abort
 import psycopg2
 import os
-from urllib.parse import urlparse
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.utils import secure_filename
 from functools import wraps
 from dotenv import load_dotenv
 from datetime import datetime
-import logging
+import hashlib
+
+import analitik
+import cache
+import config
+import db
+import export
+import geometri
+import hashing
+import importer
+import ingest
+import jobs
+import logs
+import metrics
+import pagination
+import pencarian
+import spasial
+import sync
+import tiles
+import versions
 
 load_dotenv()
+# Parsed and checked once per process (in the gunicorn master when preloading);
+# a bad value stops startup instead of failing on the first request.
+settings = config.load()
+logs.configure(settings)
+db.configure(
+    workers=settings['WEB_CONCURRENCY'],
+    max_connections=settings['DB_MAX_CONNECTIONS'],
+    minconn=settings['DB_POOL_MIN'],
+    maxconn=settings['DB_POOL_MAX'],
+    timeout=settings['DB_POOL_TIMEOUT'],
+    health_check_interval=settings['DB_POOL_HEALTH_CHECK_INTERVAL'],
+    max_lifetime=settings['DB_POOL_MAX_LIFETIME'],
+)
+
+# Process-wide services shared by every app create_app() builds. All of them
+# are lazy about threads, processes and connections, so they are safe to
+# create before gunicorn forks its workers.
+app_cache = cache.make_cache(
+    settings['CACHE_BACKEND'],
+    default_ttl=settings['CACHE_TTL'],
+    max_entries=settings['CACHE_MAX_ENTRIES'],
+)
+
+password_hasher = hashing.PasswordHasher(
+    method=settings['PASSWORD_HASH_METHOD'] or hashing.DEFAULT_METHOD,
+    workers=settings['HASH_WORKERS'],
+    max_pending=settings['HASH_MAX_PENDING'],
+    timeout=settings['HASH_TIMEOUT'],
+)
 
-app = Flask(__name__)
+login_limiter = hashing.AttemptLimiter(
+    cache.make_cache(settings['CACHE_BACKEND'], max_entries=10000, namespace='login_attempts'),
+    max_per_username=settings['LOGIN_MAX_FAILURES_PER_USER'],
+    max_per_ip=settings['LOGIN_MAX_FAILURES_PER_IP'],
+    window=settings['LOGIN_FAILURE_WINDOW'],
+)
 
-app.secret_key = os.environ.get("SECRET_KEY")
-if not app.secret_key:
-    app.secret_key = "super_secret_dev_key_ganti_ini_di_prod"
-    app.logger.warning("SECRET_KEY not set in environment. Using a default development key. CHANGE THIS FOR PRODUCTION!")
+tile_cache = tiles.TileCache(
+    settings['TILE_CACHE_DIR'],
+    max_bytes=settings['TILE_CACHE_MAX_BYTES'],
+    disk_max_bytes=settings['TILE_CACHE_DISK_MAX_BYTES'],
+    max_age=settings['TILE_CACHE_MAX_AGE'],
+)
 
-UPLOAD_FOLDER = 'uploads/shapefiles'
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+page_cache = cache.Cache(
+    cache.MemoryBackend(
+        max_entries=settings['PAGE_CACHE_MAX_ENTRIES'],
+        max_bytes=settings['PAGE_CACHE_MAX_BYTES'],
+    ),
+    default_ttl=settings['PAGE_CACHE_TTL'],
+)
 
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
-app.logger.setLevel(logging.DEBUG)
+# Typeahead answers per user and data version; small, per worker.
+search_cache = pencarian.PrefixCache(cache.Cache(
+    cache.MemoryBackend(max_entries=settings['SEARCH_CACHE_MAX_ENTRIES']),
+    default_ttl=settings['SEARCH_CACHE_TTL'],
+))
 
 def get_db_conn():
+    """Returns this request's pooled connection, or None if it could not be obtained.
+
+    The same connection is handed out for the whole request and goes back to
+    the pool when the app context is torn down (see db.init_app).
+    """
     conn = None
     try:
-        database_url = os.environ.get('DATABASE_URL')
-
-        if database_url:
-            url = urlparse(database_url)
-
-            db_port_val = url.port
-            if db_port_val is None:
-                db_port = 5432
-            else:
-                db_port = db_port_val
-
-            conn = psycopg2.connect(
-                host=url.hostname,
-                port=db_port,
-                database=url.path[1:],
-                user=url.username,
-                password=url.password
-            )
-        else:
-            try:
-                from config import DB_CONFIG
-                db_config_copy = DB_CONFIG.copy()
-                if 'port' in db_config_copy and isinstance(db_config_copy['port'], str):
-                    try:
-                        db_config_copy['port'] = int(db_config_copy['port'])
-                    except ValueError:
-                        db_config_copy['port'] = 5432
-
-                conn = psycopg2.connect(**db_config_copy)
-            except ImportError as e:
-                app.logger.error(f"config.py not found or DB_CONFIG not defined: {e}", exc_info=True)
-                flash("Database connection failed: Configuration missing.", "danger")
-            except KeyError as ke:
-                app.logger.error(f"DB_CONFIG incomplete: Missing key {ke}", exc_info=True)
-                flash(f"Database connection failed: Incomplete DB_CONFIG ({ke}).", "danger")
-            except Exception as e:
-                app.logger.error(f"Error connecting via DB_CONFIG: {e}", exc_info=True)
-                flash("Database connection failed: Error with DB_CONFIG.", "danger")
-
+        conn = db.request_conn()
+    except db.PoolTimeout as e:
+        current_app.logger.error(f"Database pool exhausted: {e} stats={db.pool_stats()}")
+        flash("Database sedang sibuk. Silakan coba lagi.", "danger")
     except psycopg2.Error as e:
-        app.logger.error(f"PostgreSQL connection error: {e}", exc_info=True)
+        current_app.logger.error(f"PostgreSQL connection error: {e}", exc_info=True)
         flash(f"Database connection failed: {e}", "danger")
     except Exception as e:
-        app.logger.error(f"An unexpected error occurred during database connection: {e}", exc_info=True)
+        current_app.logger.error(f"An unexpected error occurred during database connection: {e}", exc_info=True)
         flash(f"Database connection failed: An unexpected error occurred.", "danger")
 
     return conn
 
 def close_db_connection(conn):
-    if conn:
-        conn.close()
+    # Pooled connections are released in db.init_app's teardown, once per
+    # request, so callers can keep using get_db_conn() after "closing".
+    pass
+
+_routes = []
+
+def route(rule, **options):
+    """Like ``app.route``, but recorded so that every app create_app() builds gets the view."""
+    def decorator(view):
+        _routes.append((rule, options, view))
+        return view
+    return decorator
 
 def login_required(f):
     @wraps(f)
@@ -87,13 +130,94 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-@app.route('/', methods=['GET', 'POST'])
+def data_versions(user_id):
+    """The user's ``(version, tile_version)`` from PostgreSQL, or None when the database is unavailable.
+
+    Every write bumps them in its own transaction (versions.bump), including
+    the ones worker.py makes, so all web processes agree on them. Read at
+    most once per request: versioned_page and the view it wraps share it.
+    """
+    known = g.setdefault('data_versions', {})
+    if user_id in known:
+        return known[user_id]
+    conn = None
+    try:
+        conn = db.request_conn()
+        known[user_id] = versions.get(conn, user_id)
+    except psycopg2.Error as e:
+        current_app.logger.error(f"Could not read data version (user_id: {user_id}): {e}", exc_info=True)
+        if conn is not None and not conn.closed:
+            conn.rollback()
+        known[user_id] = None
+    return known[user_id]
+
+def data_version(user_id):
+    """Token that changes whenever the user's petani/komoditas/hasil_panen data changes; None without a database."""
+    current = data_versions(user_id)
+    return None if current is None else current[0]
+
+def _template_stamp():
+    folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+    return str(max((os.path.getmtime(os.path.join(folder, name)) for name in os.listdir(folder)), default=0))
+
+TEMPLATE_STAMP = _template_stamp()
+
+@message_flashed.connect
+def _note_flash(sender, message, category, **extra):
+    # Lets versioned_page see that a view flashed something without reading
+    # (and so consuming) the flashed messages itself.
+    g.flashed = True
+
+def versioned_page(view):
+    """ETag / 304 handling and a rendered-page cache for read-only pages of user data.
+
+    The ETag covers endpoint, user, data version, query string and template
+    version, so a matching If-None-Match is answered with one primary-key
+    lookup (the data version) instead of the page's queries. That lookup on
+    the 304 path is deliberate: a process-local copy of the version would
+    have to be invalidated across gunicorn workers and hosts, and the GET
+    that follows a write's redirect can reach another worker before such an
+    invalidation does, answering 304 for the page the write just changed.
+    Pages rendered
+    with flash messages, ``?stream=1`` pages and pages rendered while the
+    data version cannot be read are neither tagged nor cached; messages a
+    view flashes but does not render stay in the session for the next page.
+    """
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        if request.args.get('stream') == '1' or session.get('_flashes'):
+            return view(*args, **kwargs)
+
+        user_id = session['user_id']
+        version = data_version(user_id)
+        if version is None:
+            return view(*args, **kwargs)
+        etag = hashlib.sha1(
+            f"{request.endpoint}|{user_id}|{version}|{request.query_string.decode()}|{TEMPLATE_STAMP}"
+            .encode()
+        ).hexdigest()[:24]
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            html = page_cache.get(etag)
+            if html is None:
+                html = view(*args, **kwargs)
+                if not isinstance(html, str) or g.get('flashed'):
+                    return html
+                page_cache.set(etag, html)
+            response = make_response(html)
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return decorated_function
+
+@route('/', methods=['GET', 'POST'])
 def index():
     if 'user_id' in session:
         return redirect(url_for('dashboard'))
     return redirect(url_for('login'))
 
-@app.route('/login', methods=['GET', 'POST'])
+@route('/login', methods=['GET', 'POST'])
 def login():
     if 'user_id' in session:
         return redirect(url_for('dashboard'))
@@ -101,6 +225,11 @@ def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
+        client_ip = request.remote_addr or '-'
+
+        if login_limiter.blocked(username, client_ip):
+            flash("Terlalu banyak percobaan login. Silakan coba lagi nanti.", "danger")
+            return render_template('login.html'), 429
 
         conn = get_db_conn()
         if conn:
@@ -110,15 +239,34 @@ def login():
                 cur.execute("SELECT id, password FROM users WHERE username = %s", (username,))
                 user = cur.fetchone()
 
-                if user and check_password_hash(user[1], password):
+                if user and password_hasher.verify(user[1], password):
+                    login_limiter.success(username, client_ip)
+                    if password_hasher.needs_rehash(user[1]):
+                        # Cost parameters changed since this hash was made; upgrade it
+                        # now that we know the plaintext. Best effort: the password
+                        # was right, so a failed upgrade must not refuse the login.
+                        try:
+                            cur.execute("UPDATE users SET password = %s WHERE id = %s",
+                                        (password_hasher.hash(password), user[0]))
+                            conn.commit()
+                        except hashing.HashingBusy:
+                            pass
+                        except psycopg2.Error as e:
+                            conn.rollback()
+                            current_app.logger.error(f"Rehash of password failed (user_id: {user[0]}): {e}", exc_info=True)
                     session['user_id'] = user[0]
                     session['username'] = username
                     if cur: cur.close()
                     close_db_connection(conn)
                     return redirect(url_for('dashboard'))
                 else:
+                    login_limiter.failure(username, client_ip)
                     flash("Login gagal. Cek username dan password.", "danger")
+            except hashing.HashingBusy:
+                flash("Server sedang sibuk. Silakan coba login lagi sebentar lagi.", "danger")
+                return render_template('login.html'), 503
             except psycopg2.Error as e:
+                conn.rollback()
                 flash("Terjadi kesalahan database saat login. Silakan coba lagi.", "danger")
             finally:
                 if cur:
@@ -129,12 +277,11 @@ def login():
 
     return render_template('login.html')
 
-@app.route('/register', methods=['GET', 'POST'])
+@route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        hashed_pw = generate_password_hash(password)
 
         conn = get_db_conn()
         if conn:
@@ -146,10 +293,14 @@ def register():
                 if existing:
                     flash("Username sudah terdaftar.", "danger")
                 else:
+                    # Hash only once we know the username is free.
+                    hashed_pw = password_hasher.hash(password)
                     cur.execute("INSERT INTO users (username, password) VALUES (%s, %s)", (username, hashed_pw))
                     conn.commit()
                     flash("Registrasi berhasil. Silakan login.", "success")
                     return redirect(url_for('login'))
+            except hashing.HashingBusy:
+                flash("Server sedang sibuk. Silakan coba registrasi lagi sebentar lagi.", "danger")
             except psycopg2.Error as e:
                 conn.rollback()
                 flash("Terjadi kesalahan database saat registrasi. Silakan coba lagi.", "danger")
@@ -162,7 +313,7 @@ def register():
 
     return render_template('register.html')
 
-@app.route('/logout')
+@route('/logout')
 def logout():
     session.clear()
     return redirect(url_for('login'))
@@ -171,45 +322,81 @@ def logout():
 from datetime import datetime
 # ... (kode lainnya)
 
-@app.route('/dashboard')
+NAMA_HARI = ["Senin", "Selasa", "Rabu", "Kamis", "Jumat", "Sabtu", "Minggu"]
+NAMA_BULAN = ["Januari", "Februari", "Maret", "April", "Mei", "Juni",
+              "Juli", "Agustus", "September", "Oktober", "November", "Desember"]
+
+def tanggal_indonesia(day):
+    return f"{NAMA_HARI[day.weekday()]}, {day.day} {NAMA_BULAN[day.month - 1]} {day.year}"
+
+def format_angka(value, digits=0):
+    """Formats a number the Indonesian way: 12.345,67."""
+    text = f"{value:,.{digits}f}"
+    return text.replace(",", "_").replace(".", ",").replace("_", ".")
+
+DASHBOARD_CACHE_TTL = settings['DASHBOARD_CACHE_TTL']
+
+def dashboard_key(user_id, version, today):
+    return f"dashboard:{user_id}:{version}:{today.isoformat()}"
+
+@route('/dashboard')
 @login_required
 def dashboard():
-    conn = get_db_conn()
-    petani_data = None
-    if conn:
-        cur = None
-        try:
-            cur = conn.cursor()
-            cur.execute("SELECT id FROM petani WHERE user_id = %s LIMIT 1", (session['user_id'],))
-            petani_data = cur.fetchone()
-        except psycopg2.Error as e:
-            app.logger.error(f"Database error fetching petani data for dashboard (user_id: {session.get('user_id')}): {e}", exc_info=True)
-            flash("Terjadi kesalahan saat mengambil data petani.", "danger")
-        finally:
-            if cur:
-                cur.close()
-            close_db_connection(conn)
-    else:
-        flash("Gagal terhubung ke database saat memuat dashboard.", "danger")
-
-    now = datetime.now()
-    nama_hari = ["Senin", "Selasa", "Rabu", "Kamis", "Jumat", "Sabtu", "Minggu"]
-    nama_bulan = ["Januari", "Februari", "Maret", "April", "Mei", "Juni",
-                  "Juli", "Agustus", "September", "Oktober", "November", "Desember"]
+    user_id = session['user_id']
+    today = datetime.now().date()
+    # The page depends only on the username, the day and the user's data
+    # (rollup rebuilds bump the data version too), so while the shared data
+    # version is unchanged browsers get a 304 and workers share one summary.
+    version = data_version(user_id)
+    etag = None
+    if version is not None:
+        etag = hashlib.sha1(
+            f"dashboard|{user_id}|{session.get('username')}|{version}|{today.isoformat()}|{TEMPLATE_STAMP}"
+            .encode()
+        ).hexdigest()[:20]
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
 
-    hari_ini = nama_hari[now.weekday()]
-    bulan_ini = nama_bulan[now.month - 1]
-    tanggal_formatted = f"{hari_ini}, {now.day} {bulan_ini} {now.year}"
+    ringkasan = app_cache.get(dashboard_key(user_id, version, today)) if version is not None else None
+    if ringkasan is None:
+        conn = get_db_conn()
+        if conn:
+            try:
+                ringkasan = analitik.dashboard(conn, user_id, today)
+                if version is not None:
+                    app_cache.set(dashboard_key(user_id, version, today), ringkasan, DASHBOARD_CACHE_TTL)
+            except psycopg2.Error as e:
+                conn.rollback()
+                ringkasan = None
+                current_app.logger.error(f"Database error fetching dashboard summary (user_id: {user_id}): {e}", exc_info=True)
+                flash("Terjadi kesalahan saat mengambil data petani.", "danger")
+            finally:
+                close_db_connection(conn)
+        else:
+            ringkasan = None
+            flash("Gagal terhubung ke database saat memuat dashboard.", "danger")
 
-    return render_template(
+    response = make_response(render_template(
         'dashboard.html',
         username=session.get('username'),
-        petani_data=petani_data,
-        tanggal=tanggal_formatted
-    )
+        ringkasan=ringkasan,
+        tanggal=tanggal_indonesia(today)
+    ))
+    if etag and ringkasan is not None:
+        response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
+def _saved_message(action, luas_lahan):
+    """Success flash for a stored petani; luas_lahan is NULL when the trigger could not measure the parcel."""
+    if luas_lahan is None:
+        return f"Data petani berhasil {action}!"
+    return f"Data petani berhasil {action}! Luas lahan: {luas_lahan:,.2f} m²"
 
-@app.route('/form_petani', methods=['GET', 'POST'])
+@route('/form_petani', methods=['GET', 'POST'])
 @login_required
 def form_petani():
     if request.method == 'POST':
@@ -220,16 +407,12 @@ def form_petani():
         alamat = request.form['alamat']
         lat = request.form['latitude']
         lon = request.form['longitude']
-        lahan_geom_wkt = request.form.get('lahan_geom')
-        luas_lahan_str = request.form.get('luas_lahan', '0.0')
+        lahan_geom = request.form.get('lahan_geom')
+        lahan_geom_format = request.form.get('lahan_geom_format') or None
 
         try:
-            luas_lahan = float(luas_lahan_str)
-        except ValueError:
-            flash("Luas lahan tidak valid.", "danger")
-            return render_template('add_petani.html')
-
-        if not lahan_geom_wkt or not lahan_geom_wkt.strip().upper().startswith('POLYGON'):
+            geom_sql, geom_param = geometri.parse(lahan_geom, lahan_geom_format, placeholder='%s')
+        except geometri.GeometryInputError:
             flash("Geometri lahan tidak valid atau kosong. Harap gambar poligon lahan Anda.", "danger")
             return render_template('add_petani.html')
 
@@ -242,19 +425,28 @@ def form_petani():
 
         cur = None
         try:
+            tumpang_tindih = spasial.overlaps(conn, session['user_id'], lahan_geom, fmt=lahan_geom_format)
             cur = conn.cursor()
+            # luas_lahan is computed (geodesically) by the petani_sync_lahan_geom
+            # trigger after the polygon has been repaired; the browser's
+            # estimate is only shown to the user while drawing.
             cur.execute("""
                 INSERT INTO petani (user_id, nama, nik, tanggal_lahir, no_telpon, alamat,
-                                    lokasi_point, lahan_geom, luas_lahan)
+                                    lokasi_point, lahan_geom)
                 VALUES (%s, %s, %s, %s, %s, %s,
                         ST_GeomFromText(%s, 4326),
-                        ST_GeomFromText(%s, 4326), %s)
-            """, (
+                        """ + geom_sql + """)
+                RETURNING luas_lahan""", (
                 session['user_id'], nama, nik, tanggal_lahir, no_telpon, alamat,
-                lokasi_point, lahan_geom_wkt, luas_lahan
+                lokasi_point, geom_param
             ))
+            pesan = _saved_message("disimpan", cur.fetchone()[0])
+            versions.bump(conn, session['user_id'], tiles=True)
             conn.commit()
-            flash("Data petani berhasil disimpan!", "success")
+            flash(pesan, "success")
+            peringatan = spasial.overlap_message(tumpang_tindih)
+            if peringatan:
+                flash(peringatan, "warning")
             return redirect(url_for('dashboard'))
         except psycopg2.Error as e:
             conn.rollback()
@@ -266,27 +458,49 @@ def form_petani():
 
     return render_template('add_petani.html')
 
-@app.route('/isi_komoditas', methods=['GET', 'POST'])
-@login_required
-def isi_komoditas():
+def petani_list_key(user_id, version):
+    return f"petani_list:{user_id}:{version}"
+
+def get_petani_list():
+    """(id, nama) of the current user's farmers for the riwayat filter <select>.
+
+    Served from app_cache under the user's shared data version, so a petani
+    write made by any process (or by worker.py) switches every worker to a
+    new key at once; old entries just expire. Its callers are the riwayat
+    pages, where versioned_page has already read the version for the ETag,
+    so a hit costs no query at all and a miss costs one. Returns None when
+    the database is unavailable.
+    """
+    user_id = session['user_id']
+    version = data_version(user_id)
+    if version is not None:
+        petani_list = app_cache.get(petani_list_key(user_id, version))
+        if petani_list is not None:
+            return petani_list
+
     conn = get_db_conn()
     if not conn:
-        flash("Gagal koneksi ke database. Cek konfigurasi database Anda.", "danger")
-        return redirect(url_for('dashboard'))
-
+        return None
     cur = None
-    petani_list = []
     try:
         cur = conn.cursor()
-        cur.execute("SELECT id, nama FROM petani WHERE user_id = %s", (session['user_id'],))
-        petani_list = cur.fetchall()
+        cur.execute("SELECT id, nama FROM petani WHERE user_id = %s ORDER BY nama", (user_id,))
+        petani_list = [list(row) for row in cur.fetchall()]
     except psycopg2.Error as e:
+        current_app.logger.error(f"Database error fetching petani list (user_id: {user_id}): {e}", exc_info=True)
         flash("Terjadi kesalahan database saat mengambil daftar petani.", "danger")
+        return []
     finally:
         if cur:
             cur.close()
         close_db_connection(conn)
+    if version is not None:
+        app_cache.set(petani_list_key(user_id, version), petani_list)
+    return petani_list
 
+@route('/isi_komoditas', methods=['GET', 'POST'])
+@login_required
+def isi_komoditas():
     if request.method == 'POST':
         petani_id = request.form['petani_id']
         nama_komoditas = request.form['nama_komoditas']
@@ -298,10 +512,18 @@ def isi_komoditas():
             cur_post = None
             try:
                 cur_post = conn_post.cursor()
+                # Only into the user's own farmers: the SELECT yields no row otherwise.
                 cur_post.execute("""
                     INSERT INTO komoditas (petani_id, nama_komoditas, luas_lahan, tanggal_tanam)
-                    VALUES (%s, %s, %s, %s)
-                """, (petani_id, nama_komoditas, luas_lahan, tanggal_tanam))
+                    SELECT p.id, %s, %s::double precision, %s::date
+                    FROM petani p
+                    WHERE p.id = %s AND p.user_id = %s
+                """, (nama_komoditas, luas_lahan, tanggal_tanam, petani_id, session['user_id']))
+                if cur_post.rowcount == 0:
+                    conn_post.rollback()
+                    flash("Data petani tidak ditemukan atau Anda tidak memiliki akses.", "danger")
+                    return render_template('isi_komoditas.html')
+                versions.bump(conn_post, session['user_id'])
                 conn_post.commit()
                 flash("Data komoditas berhasil disimpan", "success")
                 return redirect(url_for('dashboard'))
@@ -316,29 +538,12 @@ def isi_komoditas():
             flash("Gagal terhubung ke database saat menyimpan komoditas. Cek konfigurasi database Anda.", "danger")
             return redirect(url_for('dashboard'))
 
-    return render_template('isi_komoditas.html', petani_list=petani_list)
+    # The farmer is picked through /petani/search, not a list of every farmer.
+    return render_template('isi_komoditas.html')
 
-@app.route('/isi_hasil_panen', methods=['GET', 'POST'])
+@route('/isi_hasil_panen', methods=['GET', 'POST'])
 @login_required
 def isi_hasil_panen():
-    conn = get_db_conn()
-    if not conn:
-        flash("Gagal koneksi ke database. Cek konfigurasi database Anda.", "danger")
-        return redirect(url_for('dashboard'))
-
-    cur = None
-    petani_list = []
-    try:
-        cur = conn.cursor()
-        cur.execute("SELECT id, nama FROM petani WHERE user_id = %s", (session['user_id'],))
-        petani_list = cur.fetchall()
-    except psycopg2.Error as e:
-        flash("Terjadi kesalahan database saat mengambil daftar petani.", "danger")
-    finally:
-        if cur:
-            cur.close()
-        close_db_connection(conn)
-
     if request.method == 'POST':
         petani_id = request.form['petani_id']
         nama_komoditas = request.form['nama_komoditas']
@@ -350,10 +555,18 @@ def isi_hasil_panen():
             cur_post = None
             try:
                 cur_post = conn_post.cursor()
+                # Only into the user's own farmers: the SELECT yields no row otherwise.
                 cur_post.execute("""
                     INSERT INTO hasil_panen (petani_id, nama_komoditas, jumlah, tanggal_panen)
-                    VALUES (%s, %s, %s, %s)
-                """, (petani_id, nama_komoditas, jumlah, tanggal_panen))
+                    SELECT p.id, %s, %s::double precision, %s::date
+                    FROM petani p
+                    WHERE p.id = %s AND p.user_id = %s
+                """, (nama_komoditas, jumlah, tanggal_panen, petani_id, session['user_id']))
+                if cur_post.rowcount == 0:
+                    conn_post.rollback()
+                    flash("Data petani tidak ditemukan atau Anda tidak memiliki akses.", "danger")
+                    return render_template('isi_hasil_panen.html')
+                versions.bump(conn_post, session['user_id'])
                 conn_post.commit()
                 flash("Data hasil panen berhasil disimpan", "success")
                 return redirect(url_for('dashboard'))
@@ -368,36 +581,162 @@ def isi_hasil_panen():
             flash("Gagal terhubung ke database saat menyimpan hasil panen. Cek konfigurasi database Anda.", "danger")
             return redirect(url_for('dashboard'))
 
-    return render_template('isi_hasil_panen.html', petani_list=petani_list)
+    # The farmer is picked through /petani/search, not a list of every farmer.
+    return render_template('isi_hasil_panen.html')
 
-@app.route("/riwayat_petani")
+@route('/petani/search')
 @login_required
+def cari_petani():
+    """Typeahead over nama, nik and alamat: ``?q=`` (2+ characters) and ``limit`` (max 20), best match first."""
+    q = pencarian.normalize(request.args.get('q'))
+    try:
+        limit = max(1, min(int(request.args.get('limit', 10)), pencarian.MAX_RESULTS))
+    except ValueError:
+        return jsonify({'error': 'limit harus berupa angka'}), 400
+    if not q:
+        return jsonify({'q': q, 'hasil': []})
+
+    user_id = session['user_id']
+    version = data_version(user_id)
+    scope = f"{user_id}:{version}"
+    hasil = search_cache.get(scope, q) if version is not None else None
+    if hasil is None:
+        conn = get_db_conn()
+        if conn is None:
+            return jsonify({'error': 'Gagal terhubung ke database.'}), 503
+        try:
+            hasil = pencarian.search(conn, user_id, q)
+        except psycopg2.Error as e:
+            conn.rollback()
+            current_app.logger.error(f"Database error in cari_petani (user_id: {user_id}): {e}", exc_info=True)
+            return jsonify({'error': 'Kesalahan database saat mencari petani.'}), 500
+        finally:
+            close_db_connection(conn)
+        if version is not None:
+            search_cache.set(scope, q, hasil)
+    return jsonify({'q': q, 'hasil': hasil[:limit]})
+
+PETANI_ORDER = [("id", "ASC")]
+
+def _enqueue_job(kind, payload=None, files=None):
+    """Queues a background job for the current user.
+
+    Returns ``(job_id, None, 202)``, or ``(None, message, status)`` when the
+    database is unavailable (get_db_conn() has flashed why; message is None)
+    or the user already has JOB_MAX_ACTIVE_PER_USER unfinished jobs.
+    """
+    conn = get_db_conn()
+    if conn is None:
+        return None, None, 503
+    try:
+        job_id = jobs.enqueue(conn, session['user_id'], kind, payload, files=files,
+                              max_active=settings['JOB_MAX_ACTIVE_PER_USER'])
+        conn.commit()
+        return job_id, None, 202
+    except jobs.TooManyJobs as e:
+        conn.rollback()
+        return None, f"Anda masih memiliki {e.args[0]} tugas yang belum selesai. Tunggu hingga salah satunya selesai.", 429
+    except psycopg2.Error as e:
+        conn.rollback()
+        current_app.logger.error(f"Database error enqueuing {kind} job (user_id: {session.get('user_id')}): {e}", exc_info=True)
+        return None, "Kesalahan database saat membuat tugas.", 500
+    finally:
+        close_db_connection(conn)
+
+def _wants_json():
+    return request.accept_mimetypes.accept_json and not request.accept_mimetypes.accept_html
+
+def _job_accepted(job_id, api=False):
+    """202 with the job's status URL for API clients, a redirect to the status page for browsers."""
+    if api or _wants_json():
+        response = jsonify({'id': job_id, 'status': 'queued', 'status_url': url_for('api_tugas', id=job_id)})
+        response.status_code = 202
+        response.headers['Location'] = url_for('api_tugas', id=job_id)
+        return response
+    return redirect(url_for('status_tugas', id=job_id))
+
+def _job_refused(error, status):
+    return jsonify({'error': error or 'Gagal terhubung ke database.'}), status
+
+def _recent_jobs(kind, limit=10):
+    conn = get_db_conn()
+    if conn is None:
+        return []
+    try:
+        return jobs.recent(conn, session['user_id'], kind, limit)
+    except psycopg2.Error as e:
+        current_app.logger.error(f"Database error listing {kind} jobs (user_id: {session.get('user_id')}): {e}", exc_info=True)
+        return []
+    finally:
+        close_db_connection(conn)
+
+def _import_page():
+    return render_template('import_petani.html', tugas=_recent_jobs('import_petani'),
+                           status_labels=jobs.STATUS_LABELS)
+
+@route('/import_petani', methods=['GET', 'POST'])
+@login_required
+def import_petani():
+    """Queues a bulk load of farmers and land parcels from a shapefile/GeoJSON/GeoPackage.
+
+    The upload is stored with the job and imported by worker.py; the browser
+    is sent to the job's status page right away.
+    """
+    if request.method == 'GET':
+        return _import_page()
+
+    berkas = request.files.get('berkas')
+    if not berkas or not berkas.filename:
+        flash("Pilih berkas yang akan diimpor.", "danger")
+        return _import_page()
+
+    filename = secure_filename(berkas.filename)
+    if os.path.splitext(filename)[1].lower() not in importer.ALLOWED_EXTENSIONS:
+        flash("Format berkas tidak didukung. Gunakan .zip (shapefile), .geojson atau .gpkg.", "danger")
+        return _import_page()
+
+    job_id, error, _ = _enqueue_job('import_petani', {'filename': filename}, files={'input': berkas.stream})
+    if job_id is None:
+        if error:
+            flash(error, "danger")
+        return _import_page()
+    return _job_accepted(job_id)
+
+@route("/riwayat_petani")
+@login_required
+@versioned_page
 def riwayat_petani():
     user_id = session.get('user_id')
+    stream = request.args.get('stream') == '1'
+    per_page = pagination.parse_per_page(request.args.get('per_page'))
+    cursor_token = request.args.get('cursor')
     conn = get_db_conn()
     petani_data = []
+    next_cursor = None
     if conn:
-        cur = None
+        select_sql = "SELECT id, nama, nik, tanggal_lahir, no_telpon, alamat, luas_lahan FROM petani"
+        where = ["user_id = %s"]
+        params = [user_id]
         try:
-            cur = conn.cursor()
-            cur.execute(
-                "SELECT id, nama, nik, tanggal_lahir, no_telpon, alamat, luas_lahan FROM petani WHERE user_id = %s",
-                (user_id,)
+            if stream:
+                petani_data = pagination.stream_rows(conn, 'riwayat_petani', select_sql, where, params, PETANI_ORDER)
+                return Response(stream_template("riwayat_petani.html", petani=petani_data, stream=True))
+            petani_data, next_cursor = pagination.fetch_page(
+                conn, select_sql, where, params, PETANI_ORDER,
+                lambda row: (row[0],), cursor_token, per_page
             )
-            petani_data = cur.fetchall()
         except psycopg2.Error as e:
             flash(f"Terjadi kesalahan database saat mengambil riwayat petani: {e}", "danger")
-            app.logger.error(f"Error fetching petani data for user {user_id}: {e}", exc_info=True)
+            current_app.logger.error(f"Error fetching petani data for user {user_id}: {e}", exc_info=True)
         finally:
-            if cur:
-                cur.close()
             close_db_connection(conn)
     else:
         flash("Gagal koneksi ke database. Cek konfigurasi database Anda.", "danger")
 
-    return render_template("riwayat_petani.html", petani=petani_data)
+    return render_template("riwayat_petani.html", petani=petani_data, next_cursor=next_cursor,
+                           per_page=per_page, is_first_page=not cursor_token)
 
-@app.route("/edit_petani/<int:id>", methods=["GET", "POST"])
+@route("/edit_petani/<int:id>", methods=["GET", "POST"])
 @login_required
 def edit_petani(id):
     conn = get_db_conn()
@@ -414,20 +753,45 @@ def edit_petani(id):
             tanggal_lahir = request.form['tanggal_lahir']
             no_telpon = request.form['no_telpon']
             alamat = request.form['alamat']
-            lahan_geom = request.form['lahan_geom']
+            lahan_geom = request.form.get('lahan_geom', '').strip()
+            lahan_geom_format = request.form.get('lahan_geom_format') or None
 
+            # An empty lahan_geom means the parcel was not redrawn on the map:
+            # the stored geometry is kept and the overlap check is skipped.
+            set_geom, geom_params, tumpang_tindih = "", (), None
+            if lahan_geom:
+                try:
+                    geom_sql, geom_param = geometri.parse(lahan_geom, lahan_geom_format, placeholder='%s')
+                except geometri.GeometryInputError as e:
+                    flash(f"Geometri lahan tidak valid: {e}", "danger")
+                    return redirect(url_for('edit_petani', id=id))
+                set_geom, geom_params = ", lahan_geom=" + geom_sql, (geom_param,)
+                tumpang_tindih = spasial.overlaps(conn, session['user_id'], lahan_geom,
+                                                  exclude_id=id, fmt=lahan_geom_format)
             cur.execute("""
                 UPDATE petani
-                SET nama=%s, nik=%s, tanggal_lahir=%s, no_telpon=%s, alamat=%s, lahan_geom=ST_GeomFromText(%s, 4326)
+                SET nama=%s, nik=%s, tanggal_lahir=%s, no_telpon=%s, alamat=%s""" + set_geom + """
                 WHERE id=%s AND user_id=%s
-            """, (nama, nik, tanggal_lahir, no_telpon, alamat, lahan_geom, id, session['user_id']))
+                RETURNING luas_lahan""",
+                (nama, nik, tanggal_lahir, no_telpon, alamat) + geom_params + (id, session['user_id']))
+            row = cur.fetchone()
+            if row is None:
+                conn.rollback()
+                flash("Data petani tidak ditemukan atau Anda tidak memiliki akses.", "danger")
+                return redirect(url_for("riwayat_petani"))
+            # Built before the commit: nothing after it may fail and roll back a saved edit.
+            pesan = _saved_message("diperbarui", row[0])
+            versions.bump(conn, session['user_id'], tiles=True)
             conn.commit()
-            flash("Data petani berhasil diperbarui!", "success")
+            flash(pesan, "success")
+            peringatan = tumpang_tindih and spasial.overlap_message(tumpang_tindih)
+            if peringatan:
+                flash(peringatan, "warning")
             return redirect(url_for("riwayat_petani"))
 
         else:
             cur.execute("""
-                SELECT id, nama, nik, tanggal_lahir, no_telpon, alamat, lokasi_point, ST_AsText(lahan_geom), luas_lahan
+                SELECT id, nama, nik, tanggal_lahir, no_telpon, alamat, lokasi_point, luas_lahan
                 FROM petani
                 WHERE id = %s AND user_id = %s
             """, (id, session['user_id']))
@@ -444,14 +808,13 @@ def edit_petani(id):
                 'no_telpon': petani[4],
                 'alamat': petani[5],
                 'lokasi_point': petani[6],
-                'lahan_geom': petani[7],
-                'luas_lahan': petani[8]
+                'luas_lahan': petani[7]
             }
             return render_template("edit_petani.html", petani=petani_dict)
     except Exception as e:
         conn.rollback()
         flash(f"Terjadi kesalahan saat memperbarui data petani: {e}", "danger")
-        app.logger.error(f"Edit Petani Error: {e}", exc_info=True)
+        current_app.logger.error(f"Edit Petani Error: {e}", exc_info=True)
     finally:
         if cur:
             cur.close()
@@ -459,7 +822,7 @@ def edit_petani(id):
 
     return redirect(url_for('riwayat_petani'))
 
-@app.route("/hapus_petani/<int:id>")
+@route("/hapus_petani/<int:id>")
 @login_required
 def hapus_petani(id):
     conn = get_db_conn()
@@ -468,6 +831,8 @@ def hapus_petani(id):
         try:
             cur = conn.cursor()
             cur.execute("DELETE FROM petani WHERE id = %s AND user_id = %s", (id, session['user_id'],))
+            if cur.rowcount:
+                versions.bump(conn, session['user_id'], tiles=True)
             conn.commit()
             flash("Data berhasil dihapus", "success")
         except psycopg2.Error as e:
@@ -482,71 +847,625 @@ def hapus_petani(id):
         flash("Gagal koneksi ke database. Cek konfigurasi database Anda.", "danger")
         return redirect(url_for('riwayat_petani'))
 
-@app.route("/riwayat_komoditas")
+def _history_filters(filters, date_column, komoditas_column, petani_column):
+    """Turns pagination.parse_filters() output into SQL conditions for a history query."""
+    where = ["p.user_id = %s"]
+    params = [session['user_id']]
+    if filters['dari']:
+        where.append(f"{date_column} >= %s")
+        params.append(filters['dari'])
+    if filters['sampai']:
+        where.append(f"{date_column} <= %s")
+        params.append(filters['sampai'])
+    if filters['komoditas']:
+        where.append(f"{komoditas_column} ILIKE %s")
+        params.append(f"%{filters['komoditas']}%")
+    if filters['petani_id']:
+        where.append(f"{petani_column} = %s")
+        params.append(filters['petani_id'])
+    return where, params
+
+KOMODITAS_ORDER = [("k.tanggal_tanam", "DESC NULLS LAST"), ("p.nama", "ASC NULLS LAST"), ("k.id", "ASC")]
+
+@route("/riwayat_komoditas")
 @login_required
+@versioned_page
 def riwayat_komoditas():
-    """Displays a list of commodity records for the current user's farmers."""
+    """Displays a list of commodity records for the current user's farmers.
+
+    Pages are keyset-paginated on (tanggal_tanam DESC, nama, id); ``?stream=1``
+    streams the whole filtered result from a server-side cursor instead.
+    """
+    filters = pagination.parse_filters(request.args)
+    stream = request.args.get('stream') == '1'
+    per_page = pagination.parse_per_page(request.args.get('per_page'))
+    cursor_token = request.args.get('cursor')
     conn = get_db_conn()
     komoditas_data = []
+    petani_options = []
+    next_cursor = None
     if conn:
-        cur = None
+        select_sql = """
+            SELECT k.id, p.nama, k.nama_komoditas, k.luas_lahan, k.tanggal_tanam
+            FROM komoditas k
+            JOIN petani p ON k.petani_id = p.id
+        """
+        where, params = _history_filters(filters, "k.tanggal_tanam", "k.nama_komoditas", "k.petani_id")
         try:
-            cur = conn.cursor()
-            cur.execute("""
-                SELECT k.id, p.nama, k.nama_komoditas, k.luas_lahan, k.tanggal_tanam
-                FROM komoditas k
-                JOIN petani p ON k.petani_id = p.id
-                WHERE p.user_id = %s
-                ORDER BY k.tanggal_tanam DESC, p.nama ASC
-            """, (session['user_id'],))
-            komoditas_data = cur.fetchall()
+            petani_options = get_petani_list() or []
+            if stream:
+                komoditas_data = pagination.stream_rows(conn, 'riwayat_komoditas', select_sql, where, params, KOMODITAS_ORDER)
+                return Response(stream_template("riwayat_komoditas.html", komoditas=komoditas_data,
+                                                filters=filters, petani_options=petani_options, stream=True))
+            komoditas_data, next_cursor = pagination.fetch_page(
+                conn, select_sql, where, params, KOMODITAS_ORDER,
+                lambda row: (row[4], row[1], row[0]), cursor_token, per_page
+            )
         except psycopg2.Error as e:
-            app.logger.error(f"Database error fetching komoditas data (user_id: {session.get('user_id')}): {e}", exc_info=True)
+            current_app.logger.error(f"Database error fetching komoditas data (user_id: {session.get('user_id')}): {e}", exc_info=True)
             flash(f"Kesalahan database saat mengambil data komoditas: {e}", "danger")
         except Exception as e:
-            app.logger.error(f"Unexpected error fetching komoditas data (user_id: {session.get('user_id')}): {e}", exc_info=True)
+            current_app.logger.error(f"Unexpected error fetching komoditas data (user_id: {session.get('user_id')}): {e}", exc_info=True)
             flash("Terjadi kesalahan tak terduga saat mengambil data komoditas.", "danger")
         finally:
-            if cur:
-                cur.close()
             close_db_connection(conn)
     else:
         flash("Gagal terhubung ke database. Coba lagi nanti.", "danger")
 
-    return render_template("riwayat_komoditas.html", komoditas=komoditas_data)
+    return render_template("riwayat_komoditas.html", komoditas=komoditas_data, filters=filters,
+                           petani_options=petani_options, next_cursor=next_cursor,
+                           per_page=per_page, is_first_page=not cursor_token)
+
+HASIL_PANEN_ORDER = [("h.tanggal_panen", "DESC NULLS LAST"), ("p.nama", "ASC NULLS LAST"), ("h.id", "ASC")]
 
-@app.route("/riwayat_hasil_panen")
+@route("/riwayat_hasil_panen")
 @login_required
+@versioned_page
 def riwayat_hasil_panen():
-    """Displays a list of harvest records for the current user's farmers."""
+    """Displays a list of harvest records for the current user's farmers.
+
+    Pages are keyset-paginated on (tanggal_panen DESC, nama, id); ``?stream=1``
+    streams the whole filtered result from a server-side cursor instead.
+    """
+    filters = pagination.parse_filters(request.args)
+    stream = request.args.get('stream') == '1'
+    per_page = pagination.parse_per_page(request.args.get('per_page'))
+    cursor_token = request.args.get('cursor')
     conn = get_db_conn()
     hasil_data = []
+    petani_options = []
+    next_cursor = None
     if conn:
-        cur = None
+        select_sql = """
+            SELECT h.id, p.nama, h.nama_komoditas, h.jumlah, h.tanggal_panen
+            FROM hasil_panen h
+            JOIN petani p ON h.petani_id = p.id
+        """
+        where, params = _history_filters(filters, "h.tanggal_panen", "h.nama_komoditas", "h.petani_id")
         try:
-            cur = conn.cursor()
-            cur.execute("""
-                SELECT h.id, p.nama, h.nama_komoditas, h.jumlah, h.tanggal_panen
-                FROM hasil_panen h
-                JOIN petani p ON h.petani_id = p.id
-                WHERE p.user_id = %s
-                ORDER BY h.tanggal_panen DESC, p.nama ASC
-            """, (session['user_id'],))
-            hasil_data = cur.fetchall()
+            petani_options = get_petani_list() or []
+            if stream:
+                hasil_data = pagination.stream_rows(conn, 'riwayat_hasil_panen', select_sql, where, params, HASIL_PANEN_ORDER)
+                return Response(stream_template("riwayat_hasil_panen.html", hasil_panen=hasil_data,
+                                                filters=filters, petani_options=petani_options, stream=True))
+            hasil_data, next_cursor = pagination.fetch_page(
+                conn, select_sql, where, params, HASIL_PANEN_ORDER,
+                lambda row: (row[4], row[1], row[0]), cursor_token, per_page
+            )
         except psycopg2.Error as e:
-            app.logger.error(f"Database error fetching hasil_panen data (user_id: {session.get('user_id')}): {e}", exc_info=True)
+            current_app.logger.error(f"Database error fetching hasil_panen data (user_id: {session.get('user_id')}): {e}", exc_info=True)
             flash(f"Kesalahan database saat mengambil data hasil panen: {e}", "danger")
         except Exception as e:
-            app.logger.error(f"Unexpected error fetching hasil_panen data (user_id: {session.get('user_id')}): {e}", exc_info=True)
+            current_app.logger.error(f"Unexpected error fetching hasil_panen data (user_id: {session.get('user_id')}): {e}", exc_info=True)
             flash("Terjadi kesalahan tak terduga saat mengambil data hasil panen.", "danger")
         finally:
-            if cur:
-                cur.close()
             close_db_connection(conn)
     else:
         flash("Gagal terhubung ke database. Coba lagi nanti.", "danger")
 
-    return render_template("riwayat_hasil_panen.html", hasil_panen=hasil_data)
+    return render_template("riwayat_hasil_panen.html", hasil_panen=hasil_data, filters=filters,
+                           petani_options=petani_options, next_cursor=next_cursor,
+                           per_page=per_page, is_first_page=not cursor_token)
+
+
+@route("/api/<any(komoditas, hasil_panen):table>/batch", methods=["POST"])
+@login_required
+def ingest_batch(table):
+    """Inserts an array of komoditas / hasil_panen records in one transaction.
+
+    Body: ``{"records": [{"petani_id": 1, "nama_komoditas": "Padi", ...,
+    "idempotency_key": "..."}]}``. Responds with one result per record.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'Body harus berupa JSON objek dengan kunci "records".'}), 400
+
+    conn = get_db_conn()
+    if conn is None:
+        return jsonify({'error': 'Gagal terhubung ke database.'}), 503
+    try:
+        results = ingest.ingest(conn, table, session['user_id'], payload.get('records'))
+        if any(r['status'] == 'created' for r in results):
+            versions.bump(conn, session['user_id'])
+        conn.commit()
+    except ingest.BatchError as e:
+        conn.rollback()
+        return jsonify({'error': str(e)}), 400
+    except psycopg2.Error as e:
+        conn.rollback()
+        current_app.logger.error(f"Database error in batch ingest of {table} (user_id: {session.get('user_id')}): {e}", exc_info=True)
+        return jsonify({'error': 'Kesalahan database; tidak ada record yang disimpan.'}), 500
+    finally:
+        close_db_connection(conn)
+
+    summary = {status: sum(1 for r in results if r['status'] == status)
+               for status in ('created', 'duplicate', 'error')}
+    status_code = 200 if summary['error'] == 0 else 207
+    return jsonify({'summary': summary, 'results': results}), status_code
+
+@route("/sync")
+@login_required
+def sync_changes():
+    """Delta sync for offline clients: rows created, changed or deleted since ``?since=<cursor>``.
+
+    Call repeatedly with the returned cursor while ``has_more`` is true. A
+    410 response means the cursor is too old and the client must resync
+    from an empty cursor.
+    """
+    conn = get_db_conn()
+    if conn is None:
+        return jsonify({'error': 'Gagal terhubung ke database.'}), 503
+    try:
+        result = sync.changes_since(conn, session['user_id'], request.args.get('since', ''),
+                                    request.args.get('limit', sync.DEFAULT_LIMIT, type=int))
+    except sync.CursorExpired:
+        return jsonify({'error': 'Cursor kedaluwarsa; lakukan sinkronisasi penuh.', 'resync': True}), 410
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except psycopg2.Error as e:
+        current_app.logger.error(f"Database error in sync (user_id: {session.get('user_id')}): {e}", exc_info=True)
+        return jsonify({'error': 'Kesalahan database saat sinkronisasi.'}), 500
+    finally:
+        conn.rollback()
+        close_db_connection(conn)
+    return jsonify(result)
+
+@route("/api/analitik/panen/<dimensi>")
+@login_required
+def analitik_panen(dimensi):
+    """Harvest totals from the incremental rollup: per komoditas/bulan, per petani, or a summary."""
+    if dimensi not in analitik.QUERIES:
+        abort(404)
+    dari = pagination.parse_date(request.args.get('dari'))
+    sampai = pagination.parse_date(request.args.get('sampai'))
+
+    conn = get_db_conn()
+    if conn is None:
+        return jsonify({'error': 'Gagal terhubung ke database.'}), 503
+    try:
+        data = analitik.QUERIES[dimensi](conn, session['user_id'], dari, sampai)
+    except psycopg2.Error as e:
+        current_app.logger.error(f"Database error in analitik_panen/{dimensi} (user_id: {session.get('user_id')}): {e}", exc_info=True)
+        return jsonify({'error': 'Kesalahan database saat mengambil analitik.'}), 500
+    finally:
+        close_db_connection(conn)
+    return jsonify({'dimensi': dimensi, 'data': data})
+
+def _spatial_response(query, *args, **kwargs):
+    """Runs a spasial query for the current user and returns it as a JSON response."""
+    conn = get_db_conn()
+    if conn is None:
+        return jsonify({'error': 'Gagal terhubung ke database.'}), 503
+    try:
+        result = query(conn, session['user_id'], *args, **kwargs)
+    except spasial.SpatialInputError as e:
+        return jsonify({'error': str(e)}), 400
+    except psycopg2.Error as e:
+        conn.rollback()
+        if e.pgcode and e.pgcode.startswith('22'):
+            # Data exceptions: malformed geometry input (invalid_parameter_value,
+            # invalid_text_representation). PostGIS internal errors (class XX)
+            # are logged as 500s below.
+            return jsonify({'error': 'Geometri tidak valid.'}), 400
+        current_app.logger.error(f"Database error in spatial query {query.__name__} (user_id: {session.get('user_id')}): {e}", exc_info=True)
+        return jsonify({'error': 'Kesalahan database.'}), 500
+    finally:
+        close_db_connection(conn)
+    return jsonify(result)
+
+@route("/api/petani/terdekat")
+@login_required
+def petani_terdekat():
+    """GeoJSON of the ``k`` (default 10) farmers nearest to ``?lat=&lon=``, with ``jarak_m``."""
+    try:
+        lat, lon = spasial.parse_point(request.args.get('lat'), request.args.get('lon'))
+        k = int(request.args.get('k', 10))
+    except (spasial.SpatialInputError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    return _spatial_response(spasial.nearest, lat, lon, k=k, geometry=request.args.get('geometri', 'titik'))
+
+@route("/api/petani/radius")
+@login_required
+def petani_radius():
+    """GeoJSON of farmers within ``?meter=`` of ``?lat=&lon=``, nearest first."""
+    try:
+        lat, lon = spasial.parse_point(request.args.get('lat'), request.args.get('lon'))
+    except spasial.SpatialInputError as e:
+        return jsonify({'error': str(e)}), 400
+    return _spatial_response(spasial.within_radius, lat, lon, request.args.get('meter'),
+                             geometry=request.args.get('geometri', 'titik'))
+
+@route("/api/petani/area", methods=["POST"])
+@login_required
+def petani_dalam_area():
+    """GeoJSON of farmers inside a drawn polygon.
+
+    Body ``{"geometry": ..., "format": "geojson|twkb|polyline|wkt"}`` (format
+    optional except for TWKB) or ``{"wkt": "POLYGON(...)"}``.
+    """
+    payload = request.get_json(silent=True) or {}
+    polygon = payload.get('geometry') or payload.get('wkt')
+    return _spatial_response(spasial.within_polygon, polygon, geometry=payload.get('geometri', 'titik'),
+                             fmt=payload.get('format'))
+
+@route("/api/petani/tumpang_tindih", methods=["POST"])
+@login_required
+def petani_tumpang_tindih():
+    """Overlap check for a parcel being drawn: body as for /api/petani/area plus ``"kecuali": <petani id>``."""
+    payload = request.get_json(silent=True) or {}
+    polygon = payload.get('geometry') or payload.get('wkt')
+    try:
+        exclude_id = int(payload['kecuali']) if payload.get('kecuali') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'kecuali harus berupa ID petani'}), 400
+    response = _spatial_response(spasial.overlaps, polygon, exclude_id=exclude_id, fmt=payload.get('format'))
+    if isinstance(response, tuple):
+        return response
+    result = response.get_json()
+    result['pesan'] = spasial.overlap_message(result)
+    return jsonify(result)
+
+@route("/api/petani/<int:id>/geometri")
+@login_required
+def petani_geometri(id):
+    """One parcel in a compact encoding: ``?format=geojson|twkb|polyline&presisi=0..8`` (default geojson, 6)."""
+    try:
+        fmt = geometri.parse_format(request.args.get('format'))
+        presisi = geometri.parse_precision(request.args.get('presisi'))
+    except geometri.GeometryInputError as e:
+        return jsonify({'error': str(e)}), 400
+    user_id = session['user_id']
+    # Parcels only change with the user's tile version, so a map page that is
+    # opened again revalidates instead of downloading the polygon.
+    current = data_versions(user_id)
+    etag = current and hashlib.sha1(f"geometri|{user_id}|{id}|{fmt}|{presisi}|{current[1]}".encode()).hexdigest()[:24]
+    if etag and request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    conn = get_db_conn()
+    if conn is None:
+        return jsonify({'error': 'Gagal terhubung ke database.'}), 503
+    try:
+        document = geometri.parcel(conn, user_id, id, fmt, presisi)
+    except psycopg2.Error as e:
+        conn.rollback()
+        current_app.logger.error(f"Database error in petani_geometri/{id} (user_id: {session.get('user_id')}): {e}", exc_info=True)
+        return jsonify({'error': 'Kesalahan database.'}), 500
+    finally:
+        close_db_connection(conn)
+    if document is None:
+        return jsonify({'error': 'Data petani tidak ditemukan.'}), 404
+    response = Response(document, mimetype='application/json')
+    if etag:
+        response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@route("/tiles/<int:z>/<int:x>/<int:y>.mvt")
+@login_required
+def petani_tiles(z, x, y):
+    """Mapbox Vector Tile of the logged-in user's land parcels (layer ``petani``)."""
+    if not tiles.valid_tile(z, x, y):
+        abort(404)
+    user_id = session['user_id']
+    current = data_versions(user_id)
+    if current is None:
+        abort(503)
+    # The version is read before the tile is rendered: a petani write that
+    # commits in between moves the version on, and this tile is stored under
+    # the old one where no later request looks.
+    tile_version = current[1]
+
+    data = tile_cache.get(user_id, tile_version, z, x, y)
+    cache_status = 'HIT'
+    if data is None:
+        cache_status = 'MISS'
+        conn = get_db_conn()
+        if conn is None:
+            abort(503)
+        try:
+            data = tiles.fetch_tile(conn, user_id, z, x, y)
+        except psycopg2.Error as e:
+            current_app.logger.error(f"Database error rendering tile {z}/{x}/{y} (user_id: {user_id}): {e}", exc_info=True)
+            abort(500)
+        finally:
+            close_db_connection(conn)
+        tile_cache.put(user_id, tile_version, z, x, y, data)
+
+    response = Response(data, mimetype='application/vnd.mapbox-vector-tile')
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.headers['X-Tile-Cache'] = cache_status
+    return response
+
+@route("/export/<dataset>.<fmt>", methods=["GET", "POST"])
+@login_required
+def export_data(dataset, fmt):
+    """Exports the user's petani / komoditas / hasil_panen rows as CSV, GeoJSON lines or GeoPackage.
+
+    POST (the history pages' buttons) queues an export job and answers with
+    its id; the file is downloaded from the job once worker.py has built it.
+    GET streams the export directly, for scripts and small datasets.
+    """
+    if dataset not in export.DATASETS or fmt not in export.FORMATS:
+        abort(404)
+
+    mimetype, extension = export.FORMATS[fmt]
+    filename = f"{dataset}_{datetime.now():%Y%m%d_%H%M%S}.{extension}"
+
+    if request.method == 'POST':
+        job_id, error, status = _enqueue_job('export', {'dataset': dataset, 'format': fmt, 'filename': filename})
+        if job_id is None:
+            if _wants_json():
+                return _job_refused(error, status)
+            if error:
+                flash(error, "danger")
+            return redirect(request.referrer or url_for('dashboard'))
+        return _job_accepted(job_id)
+
+    conn = get_db_conn()
+    if not conn:
+        return redirect(url_for('dashboard'))
+
+    body = export.WRITERS[fmt](conn, dataset, session['user_id'])
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'X-Accel-Buffering': 'no',
+        },
+    )
+
+@route("/api/analitik/rekap", methods=["POST"])
+@login_required
+def bangun_ulang_rekap():
+    """Queues a rebuild of the user's monthly harvest rollup (see analitik.rebuild_rollups)."""
+    job_id, error, status = _enqueue_job('rekap_panen')
+    if job_id is None:
+        return _job_refused(error, status)
+    return _job_accepted(job_id, api=True)
+
+def _job_json(job):
+    """The public view of a jobs row: progress, result and download links of produced files."""
+    berkas = (job['result'] or {}).get('berkas', {}) if job['status'] == 'succeeded' else {}
+    return {
+        'id': job['id'],
+        'jenis': job['kind'],
+        'label': jobs.KINDS.get(job['kind'], {}).get('label', job['kind']),
+        'status': job['status'],
+        'selesai': job['progress_done'],
+        'total': job['progress_total'],
+        'pesan': job['message'],
+        'hasil': job['result'],
+        'error': job['error'],
+        'percobaan': job['attempts'],
+        'maks_percobaan': job['max_attempts'],
+        'dibuat_pada': job['created_at'],
+        'mulai_pada': job['started_at'],
+        'selesai_pada': job['finished_at'],
+        'coba_lagi_pada': job['run_after'] if job['status'] == 'queued' and job['attempts'] else None,
+        'unduh': {name: url_for('unduh_tugas', id=job['id'], name=name) for name in berkas},
+    }
+
+def _load_job(id):
+    """The current user's job ``id`` (aborting with 404/503), for the job routes."""
+    conn = get_db_conn()
+    if conn is None:
+        abort(503)
+    try:
+        job = jobs.get(conn, session['user_id'], id)
+    except psycopg2.Error as e:
+        current_app.logger.error(f"Database error reading job {id} (user_id: {session.get('user_id')}): {e}", exc_info=True)
+        abort(500)
+    finally:
+        close_db_connection(conn)
+    if job is None:
+        abort(404)
+    return job
+
+@route("/tugas/<int:id>")
+@login_required
+def status_tugas(id):
+    """Status page of a background job; it polls /api/tugas/<id> until the job finishes."""
+    return render_template('tugas.html', tugas=_job_json(_load_job(id)), status_labels=jobs.STATUS_LABELS)
+
+@route("/api/tugas/<int:id>")
+@login_required
+def api_tugas(id):
+    response = jsonify(_job_json(_load_job(id)))
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@route("/api/tugas")
+@login_required
+def daftar_tugas():
+    """The user's latest jobs, newest first; ``?jenis=`` limits them to one kind."""
+    jenis = request.args.get('jenis') or None
+    if jenis is not None and jenis not in jobs.KINDS:
+        return jsonify({'error': f"jenis harus salah satu dari {', '.join(jobs.KINDS)}"}), 400
+    conn = get_db_conn()
+    if conn is None:
+        return jsonify({'error': 'Gagal terhubung ke database.'}), 503
+    try:
+        daftar = jobs.recent(conn, session['user_id'], jenis)
+    except psycopg2.Error as e:
+        current_app.logger.error(f"Database error listing jobs (user_id: {session.get('user_id')}): {e}", exc_info=True)
+        return jsonify({'error': 'Kesalahan database saat mengambil daftar tugas.'}), 500
+    finally:
+        close_db_connection(conn)
+    return jsonify({'tugas': [_job_json(job) for job in daftar]})
+
+@route("/api/tugas/<int:id>/batal", methods=["POST"])
+@login_required
+def batal_tugas(id):
+    """Cancels a queued job, or asks the worker to stop a running one at its next progress update."""
+    conn = get_db_conn()
+    if conn is None:
+        return jsonify({'error': 'Gagal terhubung ke database.'}), 503
+    try:
+        status = jobs.cancel(conn, session['user_id'], id)
+        conn.commit()
+    except psycopg2.Error as e:
+        conn.rollback()
+        current_app.logger.error(f"Database error cancelling job {id} (user_id: {session.get('user_id')}): {e}", exc_info=True)
+        return jsonify({'error': 'Kesalahan database saat membatalkan tugas.'}), 500
+    finally:
+        close_db_connection(conn)
+    if status is None:
+        abort(404)
+    return jsonify({'id': id, 'status': status})
+
+@route("/tugas/<int:id>/unduh/<name>")
+@login_required
+def unduh_tugas(id, name):
+    """Streams a file a finished job produced (export result, import error report) from job_files."""
+    job = _load_job(id)
+    berkas = (job['result'] or {}).get('berkas', {}) if job['status'] == 'succeeded' else {}
+    if name not in berkas:
+        abort(404)
+
+    conn = get_db_conn()
+    if conn is None:
+        abort(503)
+    return Response(
+        stream_with_context(jobs.iter_file(conn, id, name)),
+        mimetype=berkas[name]['mimetype'],
+        headers={
+            'Content-Disposition': f'attachment; filename="{berkas[name]["filename"]}"',
+            'X-Accel-Buffering': 'no',
+        },
+    )
+
+def _require_metrics_token():
+    token = settings['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f"Bearer {token}":
+        abort(401)
+
+@route("/health/db")
+def health_db():
+    """Connection pool statistics for this worker, for scraping by monitoring. Guarded like /metrics."""
+    _require_metrics_token()
+    return jsonify(db.pool_stats())
+
+@route("/health/hashing")
+def health_hashing():
+    """Password hash latency histogram and pool rejections for this worker. Guarded like /metrics."""
+    _require_metrics_token()
+    return jsonify(password_hasher.metrics())
+
+@route("/health/cache")
+def health_cache():
+    """Hit/miss counters of this worker's app_cache, tile cache, rendered-page and search caches. Guarded like /metrics."""
+    _require_metrics_token()
+    return jsonify({'app_cache': app_cache.stats(), 'tile_cache': tile_cache.stats(),
+                    'page_cache': page_cache.stats(), 'search_cache': search_cache.store.stats()})
+
+@route("/health/jobs")
+def health_jobs():
+    """Queued and running background jobs per kind, with the age of the oldest one. Guarded like /metrics."""
+    _require_metrics_token()
+    conn = get_db_conn()
+    if conn is None:
+        return jsonify({'error': 'Gagal terhubung ke database.'}), 503
+    try:
+        return jsonify({'jobs': jobs.counts(conn), 'limits': jobs.KINDS})
+    except psycopg2.Error as e:
+        current_app.logger.error(f"Database error reading job counts: {e}", exc_info=True)
+        return jsonify({'error': 'Kesalahan database saat membaca antrian tugas.'}), 500
+    finally:
+        close_db_connection(conn)
+
+@route("/metrics")
+def metrics_endpoint():
+    """Prometheus scrape target for this worker. Set METRICS_TOKEN to require a bearer token."""
+    _require_metrics_token()
+
+    pid = {'pid': os.getpid()}
+    pool = db.pool_stats()
+    extra = metrics.gauge_lines(
+        'petani_db_pool_connections', 'Pooled connections by state.',
+        [(dict(pid, state=state), pool.get(state)) for state in ('in_use', 'idle', 'waiting')])
+    extra += metrics.gauge_lines(
+        'petani_db_pool_events_total', 'Pool lifecycle counters.',
+        [(dict(pid, event=event), pool.get(event))
+         for event in ('created', 'closed', 'checkouts', 'timeouts', 'failed_health_checks')],
+        kind='counter')
+    cache_samples = []
+    for name, stats in (('app_cache', app_cache.stats()), ('tile_cache', tile_cache.stats()),
+                        ('page_cache', page_cache.stats()), ('search_cache', search_cache.store.stats())):
+        cache_samples += [(dict(pid, cache=name, result='hit'), stats['hits']),
+                          (dict(pid, cache=name, result='miss'), stats['misses'])]
+    extra += metrics.gauge_lines('petani_cache_lookups_total', 'Cache lookups by result.',
+                                 cache_samples, kind='counter')
+    hashing_stats = password_hasher.metrics()
+    extra += metrics.gauge_lines(
+        'petani_password_hash_seconds_sum', 'Total time spent hashing or verifying passwords.',
+        [(dict(pid, operation=op), e['sum_seconds']) for op, e in hashing_stats['latency'].items()],
+        kind='counter')
+    extra += metrics.gauge_lines(
+        'petani_password_hash_total', 'Password hash operations.',
+        [(dict(pid, operation=op), e['count']) for op, e in hashing_stats['latency'].items()],
+        kind='counter')
+    extra += metrics.gauge_lines('petani_log_records_dropped_total',
+                                 'Log records dropped because the log queue was full.',
+                                 [(pid, logs.dropped())], kind='counter')
+    extra += metrics.gauge_lines('petani_password_hash_rejected_total',
+                                 'Hash requests refused because the pool was full.',
+                                 [(pid, hashing_stats['rejected'])], kind='counter')
+    return Response(metrics.render(extra), mimetype='text/plain; version=0.0.4')
+
+
+def create_app():
+    """Builds the Flask app: request hooks, template filters and every ``@route`` view.
+
+    Settings and the shared services above are set up once at import; this
+    only wires them into a new Flask object, so it is cheap to call again
+    (tests, scripts).
+    """
+    app = Flask(__name__)
+    if settings['TRUSTED_PROXY_HOPS']:
+        # remote_addr is otherwise the proxy's address, shared by every client
+        # (one login_limiter IP bucket for everyone).
+        hops = settings['TRUSTED_PROXY_HOPS']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
+    app.secret_key = settings['SECRET_KEY']
+    app.config['APP_ENV'] = settings['APP_ENV']
+
+    logs.init_app(app)
+    db.init_app(app)
+    metrics.init_app(app, log_query_params=settings['SLOW_QUERY_LOG_PARAMS'],
+                     slow_query_ms=settings['SLOW_QUERY_MS'], slow_request_ms=settings['SLOW_REQUEST_MS'])
+
+    app.add_template_filter(format_angka, 'angka')
+    for rule, options, view in _routes:
+        app.add_url_rule(rule, view_func=view, **options)
+    return app
+
+
+# The WSGI entry point used by gunicorn.conf.py, Procfile, Dockerfile and railway.json.
+app = create_app()
 
 
 if __name__ == "__main__":
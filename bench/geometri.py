@@ -0,0 +1,140 @@
+"""Compares parcel payload size and decode time for each geometry transport format.
+
+    python -m bench.geometri                         # 1000 largest parcels, presisi 6
+    python -m bench.geometri --segmentize 2          # densify to a vertex every 2 m
+    python -m bench.geometri --presisi 5,6,7 --limit 5000 --prefix bench_
+
+Parcels are read from the database (bench.seed data, or real data), encoded
+by PostGIS the way /api/petani/<id>/geometri and the old edit page do, and
+for every format the report lists raw and gzip bytes, PostGIS encode time
+and Python decode time. Decoding in Python stands in for the browser:
+json.loads for GeoJSON, geometri.decode_polyline for polylines, shapely
+for WKT when it is installed. TWKB is only base64-decoded here, since a
+browser needs a TWKB library to go further. bench.seed parcels have few
+vertices; --segmentize adds one every N metres to model hand-digitised
+boundaries.
+"""
+import argparse
+import base64
+import gzip
+import json
+import statistics
+import sys
+import time
+
+import psycopg2
+
+import db
+import geometri
+
+try:
+    from shapely import wkt as shapely_wkt
+except ImportError:
+    shapely_wkt = None
+
+
+def decode_polyline_document(text):
+    return geometri.polyline_to_geojson(json.loads(text))
+
+
+def formats(precisions):
+    """(name, SQL expression over ``g``, decoder) for every variant being compared."""
+    variants = [
+        ('wkt', "ST_AsText(g)", shapely_wkt.loads if shapely_wkt else None),
+        ('geojson_penuh', "ST_AsGeoJSON(g, 15)", json.loads),
+    ]
+    for p in precisions:
+        variants += [
+            (f'geojson_{p}', f"ST_AsGeoJSON(g, {p})", json.loads),
+            (f'twkb_{p}', f"replace(encode(ST_AsTWKB(g, {p}), 'base64'), E'\\n', '')", base64.b64decode),
+            (f'polyline_{p}', geometri.output_sql('g', 'polyline').replace('%(presisi)s', str(p)) + "::text",
+             decode_polyline_document),
+        ]
+    return variants
+
+
+def sample_sql(args):
+    geom = "p.lahan_geom"
+    if args.segmentize:
+        geom = f"ST_Segmentize(p.lahan_geom::geography, {float(args.segmentize)})::geometry"
+    return f"""
+        SELECT {geom} AS g
+        FROM petani p JOIN users u ON u.id = p.user_id
+        WHERE p.lahan_geom IS NOT NULL AND u.username LIKE %(prefix)s
+        ORDER BY ST_NPoints(p.lahan_geom) DESC, p.id
+        LIMIT %(limit)s
+    """
+
+
+def measure(cur, args, name, expression, decoder):
+    encode_ms = []
+    payloads = None
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        cur.execute(f"SELECT {expression} FROM bench_geometri")
+        rows = cur.fetchall()
+        encode_ms.append((time.perf_counter() - start) * 1000)
+        payloads = [row[0] for row in rows]
+    sizes = [len(text.encode()) for text in payloads]
+    result = {
+        'format': name,
+        'bytes_total': sum(sizes),
+        'bytes_mean': round(statistics.mean(sizes), 1),
+        'bytes_max': max(sizes),
+        'gzip_total': len(gzip.compress('\n'.join(payloads).encode())),
+        'encode_ms': round(statistics.median(encode_ms), 2),
+        'decode_ms': None,
+    }
+    if decoder is not None:
+        decode_ms = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for text in payloads:
+                decoder(text)
+            decode_ms.append((time.perf_counter() - start) * 1000)
+        result['decode_ms'] = round(statistics.median(decode_ms), 2)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--limit', type=int, default=1000, help='parcels in the sample (most vertices first)')
+    parser.add_argument('--prefix', default='', help='only parcels of users whose name starts with this')
+    parser.add_argument('--presisi', default='6', help='comma-separated decimal digits to compare')
+    parser.add_argument('--segmentize', type=float, default=None,
+                        help='add a vertex every N metres before encoding')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per format (median reported)')
+    parser.add_argument('--output', help='also write the report as JSON to this file')
+    args = parser.parse_args(argv)
+    precisions = [geometri.parse_precision(p) for p in args.presisi.split(',')]
+
+    conn = psycopg2.connect(**db.connection_kwargs())
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"CREATE TEMP TABLE bench_geometri AS {sample_sql(args)}",
+                        {'prefix': args.prefix + '%', 'limit': args.limit})
+            cur.execute("SELECT count(*), sum(ST_NPoints(g)) FROM bench_geometri")
+            parcels, vertices = cur.fetchone()
+            if not parcels:
+                raise SystemExit("Tidak ada lahan_geom untuk diukur; jalankan bench.seed dulu.")
+            results = [measure(cur, args, *variant) for variant in formats(precisions)]
+        conn.rollback()
+    finally:
+        conn.close()
+
+    baseline = results[0]['bytes_total']
+    print(f"{parcels} lahan, {vertices} titik (rata-rata {vertices / parcels:.0f} per lahan)")
+    print(f"{'format':<16}{'bytes':>12}{'vs wkt':>8}{'gzip':>12}{'maks/lahan':>12}{'encode ms':>11}{'decode ms':>11}")
+    for r in results:
+        decode = f"{r['decode_ms']:.1f}" if r['decode_ms'] is not None else '-'
+        print(f"{r['format']:<16}{r['bytes_total']:>12}{r['bytes_total'] / baseline:>8.2f}"
+              f"{r['gzip_total']:>12}{r['bytes_max']:>12}{r['encode_ms']:>11.1f}{decode:>11}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'parcels': parcels, 'vertices': vertices, 'segmentize': args.segmentize,
+                       'results': results}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,479 @@
+"""Drives every page of app.py at fixed concurrency levels and writes a JSON report.
+
+    python -m bench.run --base-url http://127.0.0.1:8000 --server-pid $(cat gunicorn.pid)
+    python -m bench.run --concurrency 1,8,32 --duration 20 --routes dashboard,riwayat_petani
+    python -m bench.run --compare bench/results/old.json bench/results/new.json
+
+Needs the dataset from bench.seed (same --prefix / --password) and direct
+database access, which is used only to pick realistic petani ids per user
+and to find the rows created by the form_petani phase so hapus_petani can
+delete exactly those. Each (route, concurrency) phase runs for --duration
+seconds after --warmup seconds that are not recorded; every worker thread
+logs in as its own bench user first (except in the login phase, where the
+login itself is measured). Redirects are not followed, so a timing covers
+one route only.
+
+With --server-pid (the gunicorn master, or the dev server) the resident
+memory of that process and its children is sampled during every phase.
+--compare prints p95 / throughput changes between two reports and exits 1
+when any phase's p95 regressed by more than --threshold percent.
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import urlencode, urlparse
+
+import psycopg2
+
+import db
+
+ROUTES = ['login', 'dashboard', 'riwayat_petani', 'riwayat_komoditas', 'riwayat_hasil_panen',
+          'form_petani', 'edit_petani_form', 'petani_geometri', 'edit_petani', 'hapus_petani']
+
+# Status that means the route did what it was asked to; anything else counts as an error.
+EXPECTED_STATUS = {
+    'login': 302,
+    'dashboard': 200,
+    'riwayat_petani': 200,
+    'riwayat_komoditas': 200,
+    'riwayat_hasil_panen': 200,
+    'form_petani': 302,
+    'edit_petani_form': 200,
+    'petani_geometri': 200,
+    'edit_petani': 302,
+    'hapus_petani': 302,
+}
+
+
+class Session:
+    """One keep-alive HTTP connection with a cookie jar, like one browser tab."""
+
+    def __init__(self, base_url, timeout=30.0):
+        url = urlparse(base_url)
+        self.host = url.hostname
+        self.port = url.port or (443 if url.scheme == 'https' else 80)
+        self.https = url.scheme == 'https'
+        self.timeout = timeout
+        self.cookies = {}
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            self._conn = cls(self.host, self.port, timeout=self.timeout)
+        return self._conn
+
+    def request(self, method, path, form=None):
+        """Returns (status, seconds); status 0 means a connection error."""
+        headers = {'Connection': 'keep-alive'}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f"{k}={v}" for k, v in self.cookies.items())
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        start = time.perf_counter()
+        try:
+            conn = self._connection()
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.close()
+            return 0, time.perf_counter() - start
+        seconds = time.perf_counter() - start
+        for header in response.msg.get_all('Set-Cookie') or []:
+            name, _, rest = header.partition('=')
+            value = rest.split(';', 1)[0]
+            if 'Max-Age=0' in header or 'expires=Thu, 01 Jan 1970' in header:
+                self.cookies.pop(name.strip(), None)
+            else:
+                self.cookies[name.strip()] = value
+        return status, seconds
+
+    def login(self, username, password, attempts=5):
+        # A saturated password-hash pool answers 503; back off instead of giving up.
+        for attempt in range(attempts):
+            status, _ = self.request('POST', '/login', {'username': username, 'password': password})
+            if status == 302:
+                return True
+            if status not in (0, 503):
+                return False
+            time.sleep(0.2 * 2 ** attempt)
+        return False
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class Fixtures:
+    """Bench users and their petani rows, read once from the database."""
+
+    def __init__(self, prefix, max_users, petani_per_user):
+        conn = psycopg2.connect(**db.connection_kwargs())
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT u.id, u.username FROM users u
+                    WHERE u.username LIKE %s AND EXISTS (SELECT 1 FROM petani p WHERE p.user_id = u.id)
+                    ORDER BY u.id LIMIT %s
+                """, (prefix + '%', max_users))
+                self.users = cur.fetchall()
+                self.petani = {}
+                for user_id, _ in self.users:
+                    cur.execute("""
+                        SELECT id, nama, nik, tanggal_lahir, no_telpon, alamat, ST_AsText(lahan_geom)
+                        FROM petani WHERE user_id = %s ORDER BY id LIMIT %s
+                    """, (user_id, petani_per_user))
+                    self.petani[user_id] = [{
+                        'id': row[0], 'nama': row[1], 'nik': row[2],
+                        'tanggal_lahir': row[3].isoformat() if row[3] else '',
+                        'no_telpon': row[4], 'alamat': row[5], 'lahan_geom': row[6],
+                    } for row in cur.fetchall()]
+        finally:
+            conn.close()
+        if not self.users:
+            raise SystemExit(f"Tidak ada user '{prefix}*' yang memiliki petani; jalankan bench.seed dulu.")
+        self.created = {}  # user_id -> ids made by form_petani, consumed by hapus_petani
+        self._lock = threading.Lock()
+
+    def load_created(self, marker):
+        conn = psycopg2.connect(**db.connection_kwargs())
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT user_id, id FROM petani WHERE nama = %s ORDER BY id", (marker,))
+                self.created = {}
+                for user_id, petani_id in cur.fetchall():
+                    self.created.setdefault(user_id, []).append(petani_id)
+        finally:
+            conn.close()
+
+    def pop_created(self, user_id):
+        with self._lock:
+            ids = self.created.get(user_id)
+            return ids.pop() if ids else None
+
+
+def random_parcel(rng):
+    """A small square parcel (about 50 m) and its centre, as form_petani receives them."""
+    lon = 105.5 + rng.random() * 8.9
+    lat = -8.4 + rng.random() * 2.2
+    d = 0.00025
+    ring = [(lon - d, lat - d), (lon + d, lat - d), (lon + d, lat + d), (lon - d, lat + d), (lon - d, lat - d)]
+    wkt = 'POLYGON((' + ', '.join(f"{x:.6f} {y:.6f}" for x, y in ring) + '))'
+    return lat, lon, wkt
+
+
+def build_request(route, rng, user_id, fixtures, marker):
+    """Returns (method, path, form) for one iteration, or None when the route has nothing left to do."""
+    if route in ('dashboard', 'riwayat_petani', 'riwayat_komoditas', 'riwayat_hasil_panen'):
+        return 'GET', '/' + route, None
+    if route == 'form_petani':
+        lat, lon, wkt = random_parcel(rng)
+        return 'POST', '/form_petani', {
+            'nama': marker, 'nik': f"{rng.randrange(10 ** 15, 10 ** 16)}", 'tanggal_lahir': '1980-01-01',
+            'no_telpon': f"08{rng.randrange(10 ** 9, 10 ** 10)}", 'alamat': 'Desa Benchmark',
+            'latitude': f"{lat:.6f}", 'longitude': f"{lon:.6f}", 'lahan_geom': wkt,
+        }
+    if route in ('edit_petani_form', 'petani_geometri', 'edit_petani'):
+        petani = rng.choice(fixtures.petani[user_id])
+        if route == 'edit_petani_form':
+            return 'GET', f"/edit_petani/{petani['id']}", None
+        if route == 'petani_geometri':
+            return 'GET', f"/api/petani/{petani['id']}/geometri", None
+        # Re-submitting the stored values keeps the dataset unchanged between runs.
+        form = {k: petani[k] for k in ('nama', 'nik', 'tanggal_lahir', 'no_telpon', 'alamat', 'lahan_geom')}
+        return 'POST', f"/edit_petani/{petani['id']}", form
+    if route == 'hapus_petani':
+        petani_id = fixtures.pop_created(user_id)
+        return None if petani_id is None else ('GET', f"/hapus_petani/{petani_id}", None)
+    raise ValueError(route)
+
+
+def process_tree(pid):
+    pids = [pid]
+    i = 0
+    while i < len(pids):
+        try:
+            for tid in os.listdir(f"/proc/{pids[i]}/task"):
+                with open(f"/proc/{pids[i]}/task/{tid}/children") as f:
+                    pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+        i += 1
+    return pids
+
+
+def rss_bytes(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class RssSampler(threading.Thread):
+    """Samples resident memory of the server process tree until stopped."""
+
+    def __init__(self, pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.peak_total = 0
+        self.peak_per_process = {}
+
+    def sample(self):
+        total = 0
+        for pid in process_tree(self.pid):
+            rss = rss_bytes(pid)
+            if rss is None:
+                continue
+            total += rss
+            self.peak_per_process[pid] = max(self.peak_per_process.get(pid, 0), rss)
+        self.peak_total = max(self.peak_total, total)
+
+    def run(self):
+        while not self.stop_event.is_set():
+            self.sample()
+            self.stop_event.wait(self.interval)
+
+    def result(self):
+        mib = 1024 * 1024
+        workers = {pid: rss for pid, rss in self.peak_per_process.items() if pid != self.pid}
+        return {
+            'peak_total_mib': round(self.peak_total / mib, 1),
+            'peak_master_mib': round(self.peak_per_process.get(self.pid, 0) / mib, 1),
+            'peak_worker_mib': round(max(workers.values()) / mib, 1) if workers else None,
+            'processes': len(self.peak_per_process),
+        }
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def run_phase(route, concurrency, args, fixtures, marker):
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    state = {'record_from': None, 'stop_at': None}
+
+    def start_clock():
+        # Runs once every worker has logged in, before any of them continues.
+        now = time.perf_counter()
+        state['record_from'] = now + args.warmup
+        state['stop_at'] = now + args.warmup + args.duration
+
+    ready = threading.Barrier(concurrency + 1, action=start_clock)
+
+    def worker(index):
+        rng = random.Random(f"{args.seed}:{route}:{concurrency}:{index}")
+        user_id, username = fixtures.users[index % len(fixtures.users)]
+        session = Session(args.base_url, timeout=args.timeout)
+        logged_in = route == 'login' or session.login(username, args.password)
+        local_latencies, local_statuses = [], {}
+        try:
+            ready.wait()
+            while logged_in and time.perf_counter() < state['stop_at']:
+                if route == 'login':
+                    session.cookies.clear()
+                    status, seconds = session.request(
+                        'POST', '/login', {'username': username, 'password': args.password})
+                else:
+                    spec = build_request(route, rng, user_id, fixtures, marker)
+                    if spec is None:
+                        break
+                    status, seconds = session.request(*spec)
+                if time.perf_counter() - seconds >= state['record_from']:
+                    local_latencies.append(seconds)
+                    local_statuses[status] = local_statuses.get(status, 0) + 1
+                if args.think_time:
+                    time.sleep(args.think_time)
+        finally:
+            session.close()
+            if not logged_in:
+                local_statuses['login_failed'] = local_statuses.get('login_failed', 0) + 1
+            with lock:
+                latencies.extend(local_latencies)
+                for key, count in local_statuses.items():
+                    statuses[key] = statuses.get(key, 0) + count
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    sampler = RssSampler(args.server_pid) if args.server_pid else None
+    ready.wait()
+    if sampler:
+        sampler.start()
+    for thread in threads:
+        thread.join()
+    elapsed = min(time.perf_counter(), state['stop_at']) - state['record_from']
+    if sampler:
+        sampler.stop_event.set()
+        sampler.join()
+
+    latencies.sort()
+    expected = EXPECTED_STATUS[route]
+    ok = statuses.get(expected, 0)
+    total = len(latencies)
+
+    def ms(seconds):
+        return None if seconds is None else round(seconds * 1000, 2)
+
+    return {
+        'route': route,
+        'concurrency': concurrency,
+        'requests': total,
+        'errors': sum(count for key, count in statuses.items() if key != expected),
+        'status': {str(k): v for k, v in sorted(statuses.items(), key=lambda kv: str(kv[0]))},
+        'duration_s': round(max(elapsed, 0.0), 3),
+        'throughput_rps': round(ok / elapsed, 2) if elapsed > 0 else None,
+        'latency_ms': {
+            'p50': ms(percentile(latencies, 50)),
+            'p95': ms(percentile(latencies, 95)),
+            'p99': ms(percentile(latencies, 99)),
+            'mean': ms(sum(latencies) / total) if total else None,
+            'max': ms(latencies[-1]) if latencies else None,
+        },
+        'rss': sampler.result() if sampler else None,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    routes = args.routes.split(',') if args.routes else ROUTES
+    unknown = set(routes) - set(ROUTES)
+    if unknown:
+        raise SystemExit(f"Rute tidak dikenal: {', '.join(sorted(unknown))}")
+    levels = [int(c) for c in args.concurrency.split(',')]
+    fixtures = Fixtures(args.prefix, max(levels), args.petani_per_user)
+    marker = f"bench-run {uuid.uuid4().hex[:12]}"
+
+    report = {
+        'meta': {
+            'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'base_url': args.base_url,
+            'host': platform.node(),
+            'cpu_count': os.cpu_count(),
+            'python': platform.python_version(),
+            'concurrency': levels,
+            'duration_s': args.duration,
+            'warmup_s': args.warmup,
+            'seed': args.seed,
+            'users': len(fixtures.users),
+            'label': args.label,
+        },
+        'results': [],
+    }
+    for concurrency in levels:
+        for route in routes:
+            if route == 'hapus_petani':
+                fixtures.load_created(marker)
+            result = run_phase(route, concurrency, args, fixtures, marker)
+            report['results'].append(result)
+            lat = result['latency_ms']
+            rss = result['rss'] or {}
+            print(f"{route:22} c={concurrency:<4} n={result['requests']:<7} err={result['errors']:<5} "
+                  f"rps={result['throughput_rps']!s:<8} p50={lat['p50']!s:<8} p95={lat['p95']!s:<8} "
+                  f"p99={lat['p99']!s:<8} rss={rss.get('peak_total_mib', '-')}MiB", flush=True)
+
+    output = args.output or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'results',
+        f"{datetime.now():%Y%m%d_%H%M%S}{'_' + args.label if args.label else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Laporan: {output}")
+    return 0
+
+
+def compare(old_path, new_path, threshold):
+    with open(old_path) as f:
+        old = {(r['route'], r['concurrency']): r for r in json.load(f)['results']}
+    with open(new_path) as f:
+        new = json.load(f)['results']
+
+    def change(before, after):
+        if not before or after is None:
+            return None
+        return (after - before) / before * 100.0
+
+    def fmt(value):
+        return '-' if value is None else f"{value:+.1f}%"
+
+    regressed = False
+    print(f"{'route':22} {'c':>4} {'p95 lama':>10} {'p95 baru':>10} {'Δp95':>8} {'rps lama':>9} {'rps baru':>9} {'Δrps':>8}")
+    for result in new:
+        before = old.get((result['route'], result['concurrency']))
+        if before is None:
+            continue
+        p95_change = change(before['latency_ms']['p95'], result['latency_ms']['p95'])
+        rps_change = change(before['throughput_rps'], result['throughput_rps'])
+        flag = ''
+        if p95_change is not None and p95_change > threshold:
+            regressed = True
+            flag = '  <-- regresi'
+        print(f"{result['route']:22} {result['concurrency']:>4} {before['latency_ms']['p95']!s:>10} "
+              f"{result['latency_ms']['p95']!s:>10} {fmt(p95_change):>8} {before['throughput_rps']!s:>9} "
+              f"{result['throughput_rps']!s:>9} {fmt(rps_change):>8}{flag}")
+    return 1 if regressed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base-url', default='http://127.0.0.1:5001')
+    parser.add_argument('--concurrency', default='1,8,32', help='comma separated levels')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds recorded per phase')
+    parser.add_argument('--warmup', type=float, default=5.0, help='seconds per phase before recording')
+    parser.add_argument('--routes', help=f"comma separated subset of: {', '.join(ROUTES)}")
+    parser.add_argument('--prefix', default='bench_')
+    parser.add_argument('--password', default='bench-password')
+    parser.add_argument('--petani-per-user', type=int, default=50,
+                        help='petani ids per user that edit_petani picks from')
+    parser.add_argument('--seed', default='42', help='seeds the per-thread request choices')
+    parser.add_argument('--think-time', type=float, default=0.0, help='pause between requests per thread')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--server-pid', type=int, help='pid whose process tree RSS is sampled')
+    parser.add_argument('--label', default='', help='stored in the report and its file name')
+    parser.add_argument('--output', help='report path (default bench/results/<timestamp>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='p95 regression in percent that makes --compare fail')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return compare(args.compare[0], args.compare[1], args.threshold)
+    return run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
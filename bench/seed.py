@@ -0,0 +1,255 @@
+"""Fills a local PostGIS database with a synthetic, reproducible dataset for benchmarks.
+
+    python -m bench.seed                                 # defaults below
+    python -m bench.seed --users 5000 --petani 300000 --komoditas 3000000 --hasil-panen 3000000
+    python -m bench.seed --reset --yes                   # drop earlier bench data first
+    python -m bench.seed --bulk                          # faster: child-table triggers off, rebuilt after
+
+Rows are generated inside PostgreSQL with generate_series; random() is
+seeded with setseed(), so the same arguments on an empty database give the
+same data. Every bench user is named ``<prefix><n>`` and shares one
+password (``--password``), which bench.run uses to log in. Parcels are
+small geodesic buffers (20-150 m radius) around random points on Java, so
+every polygon is valid and goes through the same petani_sync_lahan_geom
+trigger as form input.
+
+Run ``python migrate.py`` first; the schema must be current.
+"""
+import argparse
+import os
+import sys
+import time
+
+import psycopg2
+
+import analitik
+import db
+import hashing
+
+NAMA_DEPAN = ['Agus', 'Budi', 'Sri', 'Siti', 'Joko', 'Dewi', 'Wayan', 'Made', 'Asep', 'Ujang',
+              'Nur', 'Eko', 'Rina', 'Yanto', 'Slamet', 'Wati', 'Ahmad', 'Putu', 'Dedi', 'Lestari']
+NAMA_BELAKANG = ['Santoso', 'Wijaya', 'Saputra', 'Hidayat', 'Rahayu', 'Kurniawan', 'Setiawan',
+                 'Pratama', 'Susanto', 'Handayani', 'Nugroho', 'Lestari', 'Siregar', 'Purba']
+DESA = ['Sukamaju', 'Mekarsari', 'Tegalrejo', 'Sidomulyo', 'Karanganyar', 'Margahayu',
+        'Sumberejo', 'Cibodas', 'Tanjungsari', 'Wonosari', 'Jatisari', 'Bojongsari']
+KOMODITAS = ['Padi', 'Jagung', 'Kedelai', 'Cabai', 'Bawang Merah', 'Kopi', 'Kakao',
+             'Kelapa Sawit', 'Tebu', 'Singkong', 'Kacang Tanah', 'Tomat']
+
+# Java, roughly; every generated point falls on or near farmland latitudes.
+BBOX = (105.5, -8.4, 114.4, -6.2)
+
+CHILD_TRIGGERS = [
+    ('komoditas', 'sync_log_komoditas'),
+    ('hasil_panen', 'sync_log_hasil_panen'),
+    ('hasil_panen', 'hasil_panen_perbarui_rekap'),
+]
+
+
+def log(message):
+    print(f"[{time.strftime('%H:%M:%S')}] {message}", flush=True)
+
+
+def reset(conn, prefix):
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM users WHERE username LIKE %s", (prefix + '%',))
+        log(f"{cur.rowcount} bench user dihapus (beserta petani, komoditas, hasil_panen)")
+    conn.commit()
+
+
+def seed_users(conn, prefix, count, password):
+    pwhash = hashing.PasswordHasher(
+        method=os.environ.get('PASSWORD_HASH_METHOD', hashing.DEFAULT_METHOD), workers=0,
+    ).hash(password)
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO users (username, password)
+            SELECT %s || n, %s FROM generate_series(1, %s) AS n
+            ON CONFLICT (username) DO NOTHING
+        """, (prefix, pwhash, count))
+        log(f"{cur.rowcount} user baru")
+        cur.execute("""
+            CREATE TEMP TABLE bench_users ON COMMIT PRESERVE ROWS AS
+            SELECT row_number() OVER (ORDER BY id)::int AS n, id FROM users WHERE username LIKE %s
+        """, (prefix + '%',))
+        cur.execute("CREATE INDEX ON bench_users (n)")
+        cur.execute("SELECT count(*) FROM bench_users")
+        total = cur.fetchone()[0]
+    conn.commit()
+    return total
+
+
+def seed_petani(conn, count, users, chunk):
+    """Farmers are spread over users with a skew (random()^2): a few users own many rows."""
+    min_lon, min_lat, max_lon, max_lat = BBOX
+    done = 0
+    while done < count:
+        size = min(chunk, count - done)
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO petani (user_id, nama, nik, tanggal_lahir, no_telpon, alamat,
+                                    lokasi_point, lahan_geom)
+                SELECT u.id,
+                       (%(depan)s::text[])[1 + floor(g.r1 * array_length(%(depan)s::text[], 1))::int] || ' ' ||
+                       (%(belakang)s::text[])[1 + floor(g.r2 * array_length(%(belakang)s::text[], 1))::int],
+                       lpad(floor(g.r3 * 1e16)::bigint::text, 16, '3'),
+                       date '1950-01-01' + floor(g.r4 * 18000)::int,
+                       '08' || lpad(floor(g.r5 * 1e10)::bigint::text, 10, '1'),
+                       'Desa ' || (%(desa)s::text[])[1 + floor(g.r6 * array_length(%(desa)s::text[], 1))::int]
+                           || ' RT ' || (1 + floor(g.r1 * 15))::int || ' RW ' || (1 + floor(g.r2 * 9))::int,
+                       g.pt,
+                       ST_Buffer(g.pt::geography, 20 + g.r7 * 130, 'quad_segs=2')::geometry
+                FROM (
+                    SELECT 1 + floor(random() ^ 2 * %(users)s)::int AS n,
+                           random() AS r1, random() AS r2, random() AS r3, random() AS r4,
+                           random() AS r5, random() AS r6, random() AS r7,
+                           ST_SetSRID(ST_MakePoint(%(min_lon)s + random() * %(dlon)s,
+                                                   %(min_lat)s + random() * %(dlat)s), 4326) AS pt
+                    FROM generate_series(1, %(size)s)
+                ) g
+                JOIN bench_users u USING (n)
+            """, {'depan': NAMA_DEPAN, 'belakang': NAMA_BELAKANG, 'desa': DESA, 'users': users,
+                  'min_lon': min_lon, 'min_lat': min_lat, 'dlon': max_lon - min_lon,
+                  'dlat': max_lat - min_lat, 'size': size})
+        conn.commit()
+        done += size
+        log(f"petani {done}/{count}")
+
+
+def bench_petani(conn, prefix):
+    with conn.cursor() as cur:
+        cur.execute("DROP TABLE IF EXISTS bench_petani")
+        cur.execute("""
+            CREATE TEMP TABLE bench_petani ON COMMIT PRESERVE ROWS AS
+            SELECT row_number() OVER (ORDER BY p.id)::int AS n, p.id
+            FROM petani p JOIN users u ON u.id = p.user_id
+            WHERE u.username LIKE %s
+        """, (prefix + '%',))
+        cur.execute("CREATE INDEX ON bench_petani (n)")
+        cur.execute("SELECT count(*) FROM bench_petani")
+        total = cur.fetchone()[0]
+    conn.commit()
+    return total
+
+
+def seed_children(conn, table, count, petani, chunk, until):
+    angka, tanggal = ('luas_lahan', 'tanggal_tanam') if table == 'komoditas' else ('jumlah', 'tanggal_panen')
+    # komoditas.luas_lahan in hectares (0.1-5), hasil_panen.jumlah in kg (100-10000).
+    angka_sql = "round((0.1 + g.r2 * 4.9)::numeric, 2)" if table == 'komoditas' \
+        else "round((100 + g.r2 * 9900)::numeric, 1)"
+    done = 0
+    while done < count:
+        size = min(chunk, count - done)
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                INSERT INTO {table} (petani_id, nama_komoditas, {angka}, {tanggal})
+                SELECT p.id,
+                       (%(komoditas)s::text[])[1 + floor(g.r1 * array_length(%(komoditas)s::text[], 1))::int],
+                       {angka_sql},
+                       %(until)s::date - floor(g.r3 * 1095)::int
+                FROM (
+                    SELECT 1 + floor(random() * %(petani)s)::int AS n,
+                           random() AS r1, random() AS r2, random() AS r3
+                    FROM generate_series(1, %(size)s)
+                ) g
+                JOIN bench_petani p USING (n)
+            """, {'komoditas': KOMODITAS, 'petani': petani, 'size': size, 'until': until})
+        conn.commit()
+        done += size
+        log(f"{table} {done}/{count}")
+
+
+def set_child_triggers(conn, enabled):
+    with conn.cursor() as cur:
+        for table, trigger in CHILD_TRIGGERS:
+            cur.execute(f"ALTER TABLE {table} {'ENABLE' if enabled else 'DISABLE'} TRIGGER {trigger}")
+    conn.commit()
+
+
+def backfill_after_bulk(conn, first_ids):
+    """Writes what the disabled triggers would have: sync_log entries and the harvest rollup."""
+    with conn.cursor() as cur:
+        for table in ('komoditas', 'hasil_panen'):
+            cur.execute(f"""
+                INSERT INTO sync_log (user_id, table_name, row_id, op)
+                SELECT p.user_id, %s, t.id, 'u'
+                FROM {table} t JOIN petani p ON p.id = t.petani_id
+                WHERE t.id >= %s AND p.user_id IS NOT NULL
+            """, (table, first_ids[table]))
+            log(f"sync_log {table}: {cur.rowcount} entri")
+        cur.execute("SELECT id FROM bench_users")
+        user_ids = [row[0] for row in cur.fetchall()]
+    for user_id in user_ids:
+        analitik.rebuild_rollups(conn, user_id)
+    conn.commit()
+    log(f"rekap_panen_bulanan dibangun ulang untuk {len(user_ids)} user")
+
+
+def next_ids(conn):
+    with conn.cursor() as cur:
+        result = {}
+        for table in ('komoditas', 'hasil_panen'):
+            cur.execute(f"SELECT COALESCE(max(id), 0) + 1 FROM {table}")
+            result[table] = cur.fetchone()[0]
+        return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--petani', type=int, default=200000)
+    parser.add_argument('--komoditas', type=int, default=2000000)
+    parser.add_argument('--hasil-panen', type=int, default=2000000)
+    parser.add_argument('--seed', type=float, default=0.42, help='setseed() value, between -1 and 1')
+    parser.add_argument('--until', default='2026-06-30',
+                        help='latest tanggal_tanam / tanggal_panen; dates span the three years before it')
+    parser.add_argument('--chunk', type=int, default=50000, help='rows per transaction')
+    parser.add_argument('--prefix', default='bench_')
+    parser.add_argument('--password', default='bench-password')
+    parser.add_argument('--reset', action='store_true', help='delete existing bench users first')
+    parser.add_argument('--bulk', action='store_true',
+                        help='disable row triggers on komoditas/hasil_panen while loading, then backfill')
+    parser.add_argument('--yes', action='store_true', help='do not ask before --reset')
+    args = parser.parse_args(argv)
+
+    params = db.connection_kwargs()
+    log(f"target: {params.get('user')}@{params.get('host')}:{params.get('port')}/{params.get('database')}")
+    if args.reset and not args.yes:
+        if input(f"Hapus semua user '{args.prefix}*' dan datanya? [y/N] ").strip().lower() != 'y':
+            return 1
+
+    conn = psycopg2.connect(**params)
+    try:
+        if args.reset:
+            reset(conn, args.prefix)
+        with conn.cursor() as cur:
+            cur.execute("SELECT setseed(%s)", (args.seed,))
+
+        users = seed_users(conn, args.prefix, args.users, args.password)
+        seed_petani(conn, args.petani, users, args.chunk)
+        petani = bench_petani(conn, args.prefix)
+
+        first_ids = next_ids(conn)
+        if args.bulk:
+            set_child_triggers(conn, False)
+        try:
+            seed_children(conn, 'komoditas', args.komoditas, petani, args.chunk, args.until)
+            seed_children(conn, 'hasil_panen', args.hasil_panen, petani, args.chunk, args.until)
+        finally:
+            if args.bulk:
+                conn.rollback()
+                set_child_triggers(conn, True)
+        if args.bulk:
+            backfill_after_bulk(conn, first_ids)
+
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            for table in ('users', 'petani', 'komoditas', 'hasil_panen', 'rekap_panen_bulanan', 'sync_log'):
+                cur.execute(f"ANALYZE {table}")
+        log("selesai")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""Measures cold start and per-worker memory of the application.
+
+    python -m bench.startup                              # `import app` in fresh interpreters
+    python -m bench.startup --gunicorn                   # plus gunicorn, preload on and off
+    python -m bench.startup --gunicorn --output bench/results/startup-baru.json
+    python -m bench.startup --compare bench/results/startup-lama.json bench/results/startup-baru.json
+
+Run it on two checkouts to compare before and after a change. For a tree
+without gunicorn.conf.py, pass the command line that tree deploys with, e.g.
+``--gunicorn-args "-w 4 app:app"``.
+
+The import phase starts ``--runs`` interpreters that each import app.py and
+report the import time, the wall time from spawn to exit, their resident
+memory and which heavy geo/ORM modules got imported on the way. The gunicorn
+phase starts the server on a free port, times how long it takes to answer
+/health/cache, and reads RSS and PSS of the master and every worker. PSS
+divides shared pages between the processes sharing them, so its sum is the
+memory the whole server really uses; with preload the workers share what
+the master imported. Needs no database: nothing connects until a request
+asks for a connection.
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from datetime import datetime, timezone
+
+from bench.run import process_tree, rss_bytes
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('shapely', 'fiona', 'osgeo', 'sqlalchemy', 'geoalchemy2', 'flask_login')
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app
+seconds = time.perf_counter() - start
+rss = 0
+with open('/proc/self/status') as f:
+    for line in f:
+        if line.startswith('VmRSS:'):
+            rss = int(line.split()[1]) * 1024
+print(json.dumps({'import_s': seconds, 'rss_bytes': rss, 'modules': len(sys.modules),
+                  'heavy': sorted(m for m in %r if m in sys.modules)}))
+""" % (HEAVY_MODULES,)
+
+
+def pss_bytes(pid):
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def measure_import(runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, '-c', IMPORT_PROBE], cwd=ROOT, capture_output=True,
+                             text=True, check=True)
+        wall = time.perf_counter() - start
+        sample = json.loads(out.stdout.strip().splitlines()[-1])
+        sample['wall_s'] = wall
+        samples.append(sample)
+    return {
+        'runs': runs,
+        'import_s': round(statistics.median(s['import_s'] for s in samples), 4),
+        'wall_s': round(statistics.median(s['wall_s'] for s in samples), 4),
+        'rss_mb': round(statistics.median(s['rss_bytes'] for s in samples) / 2 ** 20, 1),
+        'modules': samples[-1]['modules'],
+        'heavy': samples[-1]['heavy'],
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def measure_gunicorn(args, preload):
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(args.workers),
+               GUNICORN_PRELOAD='1' if preload else '0')
+    env.pop('METRICS_TOKEN', None)  # /health/cache is polled without a token
+    cmd = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}'] + args.gunicorn_args.split()
+    if preload:
+        cmd.insert(3, '--preload')
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        ready = None
+        deadline = start + args.timeout
+        while time.perf_counter() < deadline and proc.poll() is None:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health/cache", timeout=1) as r:
+                    if r.status == 200:
+                        ready = time.perf_counter() - start
+                        break
+            except OSError:
+                time.sleep(0.05)
+        if ready is None:
+            raise SystemExit(f"gunicorn tidak siap dalam {args.timeout} detik: {' '.join(cmd)}")
+        # Let every worker boot and serve a few requests before reading memory.
+        for _ in range(args.workers * 10):
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/health/cache", timeout=5):
+                pass
+        time.sleep(1.0)
+        pids = process_tree(proc.pid)
+        processes = [{'pid': pid, 'role': 'master' if pid == proc.pid else 'worker',
+                      'rss_mb': round((rss_bytes(pid) or 0) / 2 ** 20, 1),
+                      'pss_mb': round((pss_bytes(pid) or 0) / 2 ** 20, 1)} for pid in pids]
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    workers = [p for p in processes if p['role'] == 'worker']
+    return {
+        'preload': preload,
+        'command': ' '.join(cmd),
+        'ready_s': round(ready, 3),
+        'workers': len(workers),
+        'worker_rss_mb': round(statistics.mean(p['rss_mb'] for p in workers), 1) if workers else None,
+        'worker_pss_mb': round(statistics.mean(p['pss_mb'] for p in workers), 1) if workers else None,
+        'total_pss_mb': round(sum(p['pss_mb'] for p in processes), 1),
+        'processes': processes,
+    }
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    def row(label, before, after, unit):
+        if before is None or after is None:
+            return
+        change = (after - before) / before * 100.0 if before else 0.0
+        print(f"{label:34} {before:>10}{unit} {after:>10}{unit} {change:+7.1f}%")
+
+    print(f"{'':34} {'lama':>11} {'baru':>11}")
+    for key, unit in (('import_s', 's'), ('wall_s', 's'), ('rss_mb', 'M')):
+        row(f"import app: {key}", old['import'][key], new['import'][key], unit)
+    print(f"{'modul berat (lama -> baru)':34} {','.join(old['import']['heavy']) or '-'} -> "
+          f"{','.join(new['import']['heavy']) or '-'}")
+    old_runs = {r['preload']: r for r in old.get('gunicorn', [])}
+    for run in new.get('gunicorn', []):
+        before = old_runs.get(run['preload'])
+        if before is None:
+            continue
+        mode = 'preload' if run['preload'] else 'tanpa preload'
+        for key, unit in (('ready_s', 's'), ('worker_rss_mb', 'M'), ('worker_pss_mb', 'M'),
+                          ('total_pss_mb', 'M')):
+            row(f"gunicorn {mode}: {key}", before[key], run[key], unit)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters for the import phase')
+    parser.add_argument('--gunicorn', action='store_true', help='also start gunicorn, with and without preload')
+    parser.add_argument('--gunicorn-args', default='-c gunicorn.conf.py app:app',
+                        help='gunicorn arguments after the bind address')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--timeout', type=float, default=60.0, help='seconds to wait for gunicorn')
+    parser.add_argument('--output', help='report path (default bench/results/startup-<timestamp>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return compare(*args.compare)
+
+    report = {
+        'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'import': measure_import(args.runs),
+    }
+    print(f"import app: {report['import']['import_s']} s (proses {report['import']['wall_s']} s), "
+          f"RSS {report['import']['rss_mb']} MB, modul berat: {', '.join(report['import']['heavy']) or '-'}")
+    if args.gunicorn:
+        report['gunicorn'] = []
+        for preload in (True, False):
+            run = measure_gunicorn(args, preload)
+            report['gunicorn'].append(run)
+            print(f"gunicorn {'preload' if preload else 'tanpa preload'}: siap {run['ready_s']} s, "
+                  f"{run['workers']} worker, per worker RSS {run['worker_rss_mb']} MB / "
+                  f"PSS {run['worker_pss_mb']} MB, total PSS {run['total_pss_mb']} MB")
+
+    output = args.output or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'results',
+        f"startup-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"laporan: {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
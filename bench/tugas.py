@@ -0,0 +1,145 @@
+"""Measures the background job queue: queue wait, run time, throughput and concurrency limits.
+
+    python -m bench.tugas                                   # 100 CSV exports, 4 worker threads
+    python -m bench.tugas --jobs 500 --threads 8 --dataset petani --format gpkg
+
+Export jobs are enqueued for bench.seed users (--prefix) and run by
+worker.Worker threads inside this process against the real database, the
+way worker.py runs them. While they run, the jobs table is sampled to check
+that no more than KINDS['export']['max_running'] exports ever run at once
+and that no user has two running. The report lists queue wait (created ->
+started) and run time (started -> finished) percentiles and jobs per
+second. All bench jobs are deleted afterwards.
+"""
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+
+import psycopg2
+
+import db
+import export
+import jobs
+import worker
+from bench.run import percentile
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--jobs', type=int, default=100)
+    parser.add_argument('--threads', type=int, default=4, help='worker threads (JOB_CONCURRENCY)')
+    parser.add_argument('--users', type=int, default=20, help='bench users the jobs are spread over')
+    parser.add_argument('--prefix', default='bench_')
+    parser.add_argument('--dataset', default='hasil_panen', choices=sorted(export.DATASETS))
+    parser.add_argument('--format', default='csv', choices=sorted(export.FORMATS))
+    parser.add_argument('--timeout', type=float, default=600.0, help='seconds to wait for every job')
+    parser.add_argument('--output', help='also write the report as JSON to this file')
+    args = parser.parse_args(argv)
+
+    conn = psycopg2.connect(**db.connection_kwargs())
+    job_ids = []
+    runner = None
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT u.id FROM users u
+                WHERE u.username LIKE %s AND EXISTS (SELECT 1 FROM petani p WHERE p.user_id = u.id)
+                ORDER BY u.id
+                LIMIT %s
+            """, (args.prefix + '%', args.users))
+            users = [row[0] for row in cur.fetchall()]
+        if not users:
+            raise SystemExit(f"Tidak ada user '{args.prefix}*' yang memiliki petani; jalankan bench.seed dulu.")
+        for n in range(args.jobs):
+            job_ids.append(jobs.enqueue(conn, users[n % len(users)], 'export',
+                                        {'dataset': args.dataset, 'format': args.format,
+                                         'filename': f"bench_{n}.{args.format}"}))
+        conn.commit()
+        conn.autocommit = True
+
+        runner = worker.Worker(['export'], concurrency=args.threads, poll_interval=0.1)
+        thread = threading.Thread(target=runner.run, name='bench-worker', daemon=True)
+        start = time.perf_counter()
+        thread.start()
+        max_running = max_per_user = 0
+        with conn.cursor() as cur:
+            while True:
+                cur.execute("""
+                    SELECT COALESCE(sum(n), 0), COALESCE(max(n), 0),
+                           (SELECT count(*) FROM jobs WHERE id = ANY(%(ids)s) AND status IN ('queued', 'running'))
+                    FROM (SELECT user_id, count(*) AS n FROM jobs
+                          WHERE id = ANY(%(ids)s) AND status = 'running' GROUP BY user_id) t
+                """, {'ids': job_ids})
+                running, per_user, remaining = cur.fetchone()
+                max_running = max(max_running, running)
+                max_per_user = max(max_per_user, per_user)
+                if not remaining:
+                    break
+                if time.perf_counter() - start > args.timeout:
+                    raise SystemExit(f"{remaining} tugas belum selesai setelah {args.timeout} detik")
+                time.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        runner.stop()
+        thread.join(30)
+
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT status, attempts, EXTRACT(EPOCH FROM started_at - created_at),
+                       EXTRACT(EPOCH FROM finished_at - started_at)
+                FROM jobs WHERE id = ANY(%s)
+            """, (job_ids,))
+            rows = cur.fetchall()
+    finally:
+        if runner is not None:
+            runner.stop()
+        if job_ids:
+            conn.rollback()
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM jobs WHERE id = ANY(%s)", (job_ids,))
+        conn.close()
+
+    def pct(values, q):
+        value = percentile(values, q)
+        return round(value, 3) if value is not None else None
+
+    waits = sorted(float(r[2]) for r in rows if r[2] is not None)
+    runs = sorted(float(r[3]) for r in rows if r[3] is not None)
+    statuses = {}
+    for status, *_ in rows:
+        statuses[status] = statuses.get(status, 0) + 1
+    limit = jobs.KINDS['export']['max_running']
+    report = {
+        'jobs': len(rows),
+        'threads': args.threads,
+        'users': len(users),
+        'dataset': args.dataset,
+        'format': args.format,
+        'statuses': statuses,
+        'retried': sum(1 for r in rows if r[1] > 1),
+        'seconds': round(elapsed, 2),
+        'jobs_per_second': round(len(rows) / elapsed, 2),
+        'wait_s': {'p50': pct(waits, 50), 'p95': pct(waits, 95)},
+        'run_s': {'p50': pct(runs, 50), 'p95': pct(runs, 95),
+                  'mean': round(statistics.mean(runs), 3) if runs else None},
+        'max_running': max_running,
+        'max_running_limit': limit,
+        'max_running_per_user': max_per_user,
+    }
+    print(f"{report['jobs']} tugas ekspor {args.dataset}.{args.format}, {args.threads} thread, "
+          f"{len(users)} user: {report['seconds']} s ({report['jobs_per_second']} tugas/s)")
+    print(f"status: {', '.join(f'{k}={v}' for k, v in sorted(statuses.items()))}, dicoba ulang: {report['retried']}")
+    print(f"tunggu antrian p50 {report['wait_s']['p50']} s, p95 {report['wait_s']['p95']} s; "
+          f"durasi p50 {report['run_s']['p50']} s, p95 {report['run_s']['p95']} s")
+    print(f"paling banyak berjalan bersamaan: {max_running} (batas {limit}), per user: {max_per_user} (batas 1)")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return 0 if max_running <= limit and max_per_user <= 1 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
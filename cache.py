@@ -0,0 +1,219 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def _size(value):
+    return len(value) if isinstance(value, (str, bytes)) else 0
+
+
+class MemoryBackend:
+    """Per-process LRU with expiry. Fast, but each gunicorn worker has its own copy.
+
+    With ``max_bytes`` the total length of str/bytes values is bounded too;
+    larger values (rendered pages) then evict by size as well as by count.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.time():
+                del self._data[key]
+                self._bytes -= _size(value)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        size = _size(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            self.delete(key)
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= _size(old[1])
+            self._data[key] = (time.time() + ttl, value)
+            self._bytes += size
+            while len(self._data) > self.max_entries or (
+                    self.max_bytes is not None and self._bytes > self.max_bytes):
+                _, (_, evicted) = self._data.popitem(last=False)
+                self._bytes -= _size(evicted)
+
+    def delete(self, key):
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is not None:
+                self._bytes -= _size(item[1])
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteBackend:
+    """LRU with expiry in a local SQLite file, shared by every worker on the host.
+
+    Values are stored as JSON. Each thread of each process opens its own
+    connection; WAL mode lets readers proceed while another worker writes.
+    A hit refreshes the entry's access time only when it is older than
+    ``touch_interval`` seconds, so hot keys do not turn every read into a
+    write; eviction order is exact to within that interval.
+    """
+
+    def __init__(self, path, max_entries=10000, table='cache', touch_interval=60.0):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid cache table name: {table!r}")
+        self.path = path
+        self.max_entries = max_entries
+        self.table = table
+        self.touch_interval = touch_interval
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_accessed_at ON {self.table} (accessed_at)")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        conn = self._conn()
+        now = time.time()
+        row = conn.execute(f"SELECT value, expires_at, accessed_at FROM {self.table} WHERE key = ?",
+                           (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] < now:
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            return None
+        if now - row[2] > self.touch_interval:
+            conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl):
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value, separators=(',', ':')), now + ttl, now),
+        )
+        conn.execute(f"""
+            DELETE FROM {self.table} WHERE key IN (
+                SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+
+    def delete(self, key):
+        self._conn().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def clear(self):
+        self._conn().execute(f"DELETE FROM {self.table}")
+
+    def __len__(self):
+        return self._conn().execute(f"SELECT count(*) FROM {self.table}").fetchone()[0]
+
+
+class Cache:
+    """Key/value cache with TTL over a pluggable backend, counting hits and misses."""
+
+    def __init__(self, backend, default_ttl=300):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(key, value, self.default_ttl if ttl is None else ttl)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.backend.delete(key)
+
+    def get_or_set(self, key, loader, ttl=None):
+        """Returns the cached value for ``key``, calling ``loader()`` and caching its result on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            self.set(key, value, ttl)
+        return value
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        stats = {
+            'backend': type(self.backend).__name__,
+            'entries': len(self.backend),
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 4) if total else None,
+        }
+        if getattr(self.backend, 'max_bytes', None) is not None:
+            stats['bytes'] = self.backend._bytes
+        return stats
+
+
+def make_cache(spec=None, default_ttl=300, max_entries=1024, namespace='cache'):
+    """Builds a Cache from a spec string: ``memory`` (default) or ``sqlite:///path/to/cache.db``.
+
+    Caches with different ``namespace`` values can share one SQLite file
+    without evicting each other's entries.
+    """
+    spec = spec or 'memory'
+    if spec.startswith('sqlite:///'):
+        backend = SQLiteBackend(spec[len('sqlite:///'):], max_entries=max_entries, table=namespace)
+    elif spec == 'memory':
+        backend = MemoryBackend(max_entries=max_entries)
+    else:
+        raise ValueError(f"Unknown cache backend: {spec!r}")
+    return Cache(backend, default_ttl=default_ttl)
@@ -0,0 +1,268 @@
+import os
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+from flask import g
+
+import config
+import metrics
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """Raised when no connection could be checked out within the timeout."""
+
+
+def connection_kwargs():
+    """psycopg2.connect() arguments from DATABASE_URL or config.DB_CONFIG (parsed once, see config.py)."""
+    return config.database_kwargs()
+
+
+class ConnectionPool:
+    """A small blocking pool of psycopg2 connections.
+
+    Connections are created lazily up to ``maxconn``. Checkout blocks for at
+    most ``timeout`` seconds before raising PoolTimeout. Idle connections are
+    pinged with ``SELECT 1`` before reuse once they have been idle longer than
+    ``health_check_interval`` seconds, and are replaced when the ping fails.
+
+    The pool remembers the pid that created it. A forked child (gunicorn
+    worker) never reuses the parent's sockets: inherited connections are
+    dropped without being closed so the parent's sessions stay intact.
+    """
+
+    def __init__(self, connect_kwargs, minconn=0, maxconn=5, timeout=10.0,
+                 health_check_interval=30.0, max_lifetime=3600.0):
+        self.connect_kwargs = connect_kwargs
+        self.minconn = max(0, minconn)
+        self.maxconn = max(1, maxconn)
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.max_lifetime = max_lifetime
+        self._cond = threading.Condition()
+        self._reset_state()
+
+    def _reset_state(self):
+        self._pid = os.getpid()
+        self._idle = []  # list of (conn, created_at, last_used)
+        self._in_use = {}  # id(conn) -> created_at
+        self._waiting = 0
+        self._created = 0
+        self._closed_count = 0
+        self._timeouts = 0
+        self._failed_checks = 0
+        self._checkouts = 0
+        self._wait_time_total = 0.0
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            # Keep references to the inherited connections so they are not
+            # garbage collected (which would close the parent's sockets).
+            inherited = getattr(self, '_inherited', [])
+            inherited.extend(conn for conn, _, _ in self._idle)
+            self._reset_state()
+            self._inherited = inherited
+
+    def _new_connection(self):
+        conn = psycopg2.connect(**self.connect_kwargs)
+        self._created += 1
+        return conn
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        self._closed_count += 1
+
+    def _is_healthy(self, conn, created_at, last_used):
+        now = time.monotonic()
+        if conn.closed:
+            return False
+        if self.max_lifetime and now - created_at > self.max_lifetime:
+            return False
+        if now - last_used < self.health_check_interval:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            self._failed_checks += 1
+            return False
+
+    def prefill(self):
+        with self._cond:
+            self._check_pid()
+            while len(self._idle) + len(self._in_use) < self.minconn:
+                conn = self._new_connection()
+                now = time.monotonic()
+                self._idle.append((conn, now, now))
+
+    def getconn(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        with self._cond:
+            self._check_pid()
+            while True:
+                while self._idle:
+                    conn, created_at, last_used = self._idle.pop()
+                    if self._is_healthy(conn, created_at, last_used):
+                        self._checked_out(conn, created_at, start)
+                        return conn
+                    self._discard(conn)
+
+                if len(self._in_use) < self.maxconn:
+                    # Reserve the slot before connecting outside of the lock.
+                    placeholder = object()
+                    self._in_use[id(placeholder)] = None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f"Timed out after {self.timeout}s waiting for a database connection "
+                        f"({len(self._in_use)}/{self.maxconn} in use)"
+                    )
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+        try:
+            conn = psycopg2.connect(**self.connect_kwargs)
+        except Exception:
+            with self._cond:
+                self._in_use.pop(id(placeholder), None)
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._in_use.pop(id(placeholder), None)
+            self._created += 1
+            self._checked_out(conn, time.monotonic(), start)
+        return conn
+
+    def _checked_out(self, conn, created_at, start):
+        self._in_use[id(conn)] = created_at
+        self._checkouts += 1
+        self._wait_time_total += time.monotonic() - start
+
+    def putconn(self, conn, discard=False):
+        with self._cond:
+            if self._pid != os.getpid():
+                return
+            created_at = self._in_use.pop(id(conn), None)
+            if created_at is None:
+                return
+            if not discard and not conn.closed:
+                status = conn.info.transaction_status
+                if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    try:
+                        conn.rollback()
+                    except psycopg2.Error:
+                        discard = True
+            if discard or conn.closed:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, created_at, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            for conn, _, _ in self._idle:
+                self._discard(conn)
+            self._idle = []
+
+    def stats(self):
+        with self._cond:
+            return {
+                'pid': self._pid,
+                'min': self.minconn,
+                'max': self.maxconn,
+                'in_use': len(self._in_use),
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'created': self._created,
+                'closed': self._closed_count,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'failed_health_checks': self._failed_checks,
+                'wait_seconds_total': round(self._wait_time_total, 6),
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_options = {'workers': 1, 'max_connections': 0, 'minconn': 0, 'maxconn': None,
+                 'timeout': 10.0, 'health_check_interval': 30.0, 'max_lifetime': 3600.0}
+
+
+def configure(**options):
+    """Sets the pool options get_pool() uses (the DB_POOL_* settings); call before the first checkout."""
+    unknown = set(options) - set(_pool_options)
+    if unknown:
+        raise TypeError(f"unknown pool options: {', '.join(sorted(unknown))}")
+    _pool_options.update(options)
+
+
+def get_pool():
+    """Returns the process-wide pool, creating it on first use (after fork)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                options = _pool_options
+                workers = max(1, options['workers'])
+                # DB_MAX_CONNECTIONS is the budget for the whole deployment;
+                # each worker gets an even share unless DB_POOL_MAX is set.
+                budget = options['max_connections']
+                default_max = max(1, budget // workers) if budget else 5
+                # TimedCursor feeds per-query timings into metrics.
+                connect_kwargs = dict(connection_kwargs(), cursor_factory=metrics.TimedCursor)
+                _pool = ConnectionPool(
+                    connect_kwargs,
+                    minconn=options['minconn'],
+                    maxconn=options['maxconn'] or default_max,
+                    timeout=options['timeout'],
+                    health_check_interval=options['health_check_interval'],
+                    max_lifetime=options['max_lifetime'],
+                )
+                _pool.prefill()
+    return _pool
+
+
+def pool_stats():
+    if _pool is None:
+        return {'in_use': 0, 'idle': 0, 'waiting': 0, 'created': 0}
+    return _pool.stats()
+
+
+def init_app(app):
+    """Registers the teardown that hands the request's connection back to the pool."""
+
+    @app.teardown_appcontext
+    def release_db_conn(exc):
+        conn = g.pop('db_conn', None)
+        if conn is not None:
+            get_pool().putconn(conn, discard=conn.closed != 0)
+
+
+def request_conn():
+    """Returns the connection bound to the current app context, checking one out if needed."""
+    conn = g.get('db_conn')
+    if conn is None or conn.closed:
+        if conn is not None:
+            get_pool().putconn(conn, discard=True)
+        start = time.perf_counter()
+        try:
+            conn = get_pool().getconn()
+        finally:
+            metrics.observe_acquire(time.perf_counter() - start)
+        g.db_conn = conn
+    return conn
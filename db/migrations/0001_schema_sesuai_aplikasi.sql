@@ -0,0 +1,67 @@
+-- Menyamakan skema dengan kolom dan tabel yang dipakai app.py.
+-- Aman dijalankan pada basis data baru maupun yang dibuat dari db/init.sql
+-- (kolom lama petani.geom / petani.id_user dan tabel lahan disalin lalu dibiarkan).
+
+CREATE EXTENSION IF NOT EXISTS postgis;
+
+CREATE TABLE IF NOT EXISTS users (
+    id SERIAL PRIMARY KEY,
+    username TEXT UNIQUE,
+    password TEXT
+);
+
+CREATE TABLE IF NOT EXISTS petani (
+    id SERIAL PRIMARY KEY,
+    nama TEXT,
+    nik VARCHAR(20),
+    tanggal_lahir DATE,
+    no_telpon VARCHAR(15),
+    alamat TEXT
+);
+
+ALTER TABLE petani ADD COLUMN IF NOT EXISTS user_id INTEGER REFERENCES users(id) ON DELETE CASCADE;
+ALTER TABLE petani ADD COLUMN IF NOT EXISTS lokasi_point GEOMETRY(POINT, 4326);
+ALTER TABLE petani ADD COLUMN IF NOT EXISTS lahan_geom GEOMETRY(GEOMETRY, 4326);
+ALTER TABLE petani ADD COLUMN IF NOT EXISTS luas_lahan DOUBLE PRECISION;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_name = 'petani' AND column_name = 'id_user') THEN
+        UPDATE petani SET user_id = id_user WHERE user_id IS NULL;
+    END IF;
+
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_name = 'petani' AND column_name = 'geom') THEN
+        UPDATE petani SET lokasi_point = geom WHERE lokasi_point IS NULL;
+    END IF;
+
+    IF to_regclass('lahan') IS NOT NULL THEN
+        UPDATE petani p
+        SET lahan_geom = l.geom,
+            luas_lahan = COALESCE(p.luas_lahan, l.luas_lahan)
+        FROM (
+            SELECT DISTINCT ON (id_petani) id_petani, geom, luas_lahan
+            FROM lahan
+            ORDER BY id_petani, id
+        ) l
+        WHERE l.id_petani = p.id AND p.lahan_geom IS NULL;
+    END IF;
+END
+$$;
+
+CREATE TABLE IF NOT EXISTS komoditas (
+    id SERIAL PRIMARY KEY,
+    petani_id INTEGER NOT NULL REFERENCES petani(id) ON DELETE CASCADE,
+    nama_komoditas TEXT NOT NULL,
+    luas_lahan DOUBLE PRECISION,
+    tanggal_tanam DATE
+);
+
+CREATE TABLE IF NOT EXISTS hasil_panen (
+    id SERIAL PRIMARY KEY,
+    petani_id INTEGER NOT NULL REFERENCES petani(id) ON DELETE CASCADE,
+    nama_komoditas TEXT NOT NULL,
+    jumlah DOUBLE PRECISION,
+    tanggal_panen DATE
+);
@@ -0,0 +1,13 @@
+-- migrate: no-transaction
+-- Indeks untuk filter user_id, JOIN petani_id dan kueri spasial.
+-- Dibuat CONCURRENTLY agar tabel tetap bisa ditulis selama migrasi.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS petani_user_id_idx ON petani (user_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS komoditas_petani_id_tanggal_tanam_idx ON komoditas (petani_id, tanggal_tanam);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS hasil_panen_petani_id_tanggal_panen_idx ON hasil_panen (petani_id, tanggal_panen);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS petani_lahan_geom_gist ON petani USING GIST (lahan_geom);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS petani_lokasi_point_gist ON petani USING GIST (lokasi_point);
+
+ANALYZE petani;
+ANALYZE komoditas;
+ANALYZE hasil_panen;
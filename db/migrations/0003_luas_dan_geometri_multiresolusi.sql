@@ -0,0 +1,56 @@
+-- Luas lahan dihitung di server (geodesik, m²) dan geometri lahan disimpan
+-- dalam beberapa tingkat penyederhanaan untuk peta pada zoom rendah.
+-- Trigger memperbaiki poligon (ST_MakeValid) sebelum semuanya dihitung,
+-- sehingga form, edit, dan impor massal mendapat perlakuan yang sama.
+
+ALTER TABLE petani ADD COLUMN IF NOT EXISTS lahan_geom_1m GEOMETRY(GEOMETRY, 4326);
+ALTER TABLE petani ADD COLUMN IF NOT EXISTS lahan_geom_10m GEOMETRY(GEOMETRY, 4326);
+ALTER TABLE petani ADD COLUMN IF NOT EXISTS lahan_geom_100m GEOMETRY(GEOMETRY, 4326);
+
+CREATE OR REPLACE FUNCTION petani_sync_lahan_geom() RETURNS trigger AS $$
+BEGIN
+    IF NEW.lahan_geom IS NULL THEN
+        NEW.luas_lahan := NULL;
+        NEW.lahan_geom_1m := NULL;
+        NEW.lahan_geom_10m := NULL;
+        NEW.lahan_geom_100m := NULL;
+        RETURN NEW;
+    END IF;
+
+    IF NOT ST_IsValid(NEW.lahan_geom) THEN
+        NEW.lahan_geom := ST_CollectionExtract(ST_MakeValid(NEW.lahan_geom), 3);
+    END IF;
+    IF ST_IsEmpty(NEW.lahan_geom)
+       OR GeometryType(NEW.lahan_geom) NOT IN ('POLYGON', 'MULTIPOLYGON') THEN
+        RAISE EXCEPTION 'Geometri lahan harus berupa poligon yang valid'
+            USING ERRCODE = 'invalid_parameter_value';
+    END IF;
+
+    NEW.luas_lahan := ST_Area(NEW.lahan_geom::geography);
+    -- Toleransi dalam derajat: ~1 m, ~10 m dan ~100 m di khatulistiwa.
+    NEW.lahan_geom_1m := ST_SimplifyPreserveTopology(NEW.lahan_geom, 0.00001);
+    NEW.lahan_geom_10m := ST_SimplifyPreserveTopology(NEW.lahan_geom, 0.0001);
+    NEW.lahan_geom_100m := ST_SimplifyPreserveTopology(NEW.lahan_geom, 0.001);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS petani_sync_lahan_geom ON petani;
+CREATE TRIGGER petani_sync_lahan_geom
+    BEFORE INSERT OR UPDATE OF lahan_geom ON petani
+    FOR EACH ROW EXECUTE FUNCTION petani_sync_lahan_geom();
+
+-- Isi ulang baris lama; poligon yang tidak bisa diperbaiki dibiarkan apa adanya.
+DO $$
+DECLARE
+    r RECORD;
+BEGIN
+    FOR r IN SELECT id FROM petani WHERE lahan_geom IS NOT NULL AND lahan_geom_1m IS NULL LOOP
+        BEGIN
+            UPDATE petani SET lahan_geom = lahan_geom WHERE id = r.id;
+        EXCEPTION WHEN invalid_parameter_value THEN
+            RAISE NOTICE 'petani % memiliki geometri lahan yang tidak valid', r.id;
+        END;
+    END LOOP;
+END
+$$;
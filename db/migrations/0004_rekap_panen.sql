@@ -0,0 +1,65 @@
+-- Rekap hasil panen per petani, komoditas dan bulan.
+-- Diperbarui secara inkremental oleh trigger pada hasil_panen sehingga
+-- analitik tidak perlu memindai seluruh riwayat panen.
+
+CREATE TABLE IF NOT EXISTS rekap_panen_bulanan (
+    user_id INTEGER NOT NULL,
+    petani_id INTEGER NOT NULL REFERENCES petani(id) ON DELETE CASCADE,
+    nama_komoditas TEXT NOT NULL,
+    bulan DATE NOT NULL,
+    total_jumlah DOUBLE PRECISION NOT NULL DEFAULT 0,
+    jumlah_catatan INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (petani_id, nama_komoditas, bulan)
+);
+
+CREATE INDEX IF NOT EXISTS rekap_panen_bulanan_user_bulan_idx
+    ON rekap_panen_bulanan (user_id, bulan);
+
+CREATE OR REPLACE FUNCTION rekap_panen_tambah(p_petani_id INTEGER, p_komoditas TEXT,
+                                              p_tanggal DATE, p_jumlah DOUBLE PRECISION,
+                                              p_catatan INTEGER) RETURNS void AS $$
+BEGIN
+    IF p_tanggal IS NULL THEN
+        RETURN;
+    END IF;
+    INSERT INTO rekap_panen_bulanan AS r (user_id, petani_id, nama_komoditas, bulan, total_jumlah, jumlah_catatan)
+    SELECT p.user_id, p.id, p_komoditas, date_trunc('month', p_tanggal)::date,
+           COALESCE(p_jumlah, 0), p_catatan
+    FROM petani p
+    WHERE p.id = p_petani_id AND p.user_id IS NOT NULL
+    ON CONFLICT (petani_id, nama_komoditas, bulan) DO UPDATE
+        SET total_jumlah = r.total_jumlah + EXCLUDED.total_jumlah,
+            jumlah_catatan = r.jumlah_catatan + EXCLUDED.jumlah_catatan;
+
+    DELETE FROM rekap_panen_bulanan
+    WHERE petani_id = p_petani_id AND nama_komoditas = p_komoditas
+      AND bulan = date_trunc('month', p_tanggal)::date AND jumlah_catatan <= 0;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION hasil_panen_perbarui_rekap() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM rekap_panen_tambah(OLD.petani_id, OLD.nama_komoditas, OLD.tanggal_panen, -OLD.jumlah, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM rekap_panen_tambah(NEW.petani_id, NEW.nama_komoditas, NEW.tanggal_panen, NEW.jumlah, 1);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS hasil_panen_perbarui_rekap ON hasil_panen;
+CREATE TRIGGER hasil_panen_perbarui_rekap
+    AFTER INSERT OR UPDATE OR DELETE ON hasil_panen
+    FOR EACH ROW EXECUTE FUNCTION hasil_panen_perbarui_rekap();
+
+-- Isi awal dari data yang sudah ada (sekali saja, saat migrasi).
+TRUNCATE rekap_panen_bulanan;
+INSERT INTO rekap_panen_bulanan (user_id, petani_id, nama_komoditas, bulan, total_jumlah, jumlah_catatan)
+SELECT p.user_id, h.petani_id, h.nama_komoditas, date_trunc('month', h.tanggal_panen)::date,
+       COALESCE(sum(h.jumlah), 0), count(*)
+FROM hasil_panen h
+JOIN petani p ON p.id = h.petani_id
+WHERE h.tanggal_panen IS NOT NULL AND p.user_id IS NOT NULL
+GROUP BY p.user_id, h.petani_id, h.nama_komoditas, date_trunc('month', h.tanggal_panen);
@@ -0,0 +1,10 @@
+-- Kunci idempotensi dari klien (aplikasi lapangan) agar pengiriman ulang
+-- batch tidak menggandakan baris. Unik per petani; NULL untuk input form.
+
+ALTER TABLE komoditas ADD COLUMN IF NOT EXISTS client_key TEXT;
+ALTER TABLE hasil_panen ADD COLUMN IF NOT EXISTS client_key TEXT;
+
+CREATE UNIQUE INDEX IF NOT EXISTS komoditas_petani_id_client_key_key
+    ON komoditas (petani_id, client_key);
+CREATE UNIQUE INDEX IF NOT EXISTS hasil_panen_petani_id_client_key_key
+    ON hasil_panen (petani_id, client_key);
@@ -0,0 +1,105 @@
+-- Pelacakan perubahan untuk sinkronisasi delta klien offline.
+-- Setiap insert/update/delete pada petani, komoditas dan hasil_panen dicatat
+-- di sync_log beserta ID transaksinya. Penghapusan (termasuk oleh
+-- hapus_petani dan cascade ke tabel anak) meninggalkan tombstone op = 'd'.
+-- Membutuhkan PostgreSQL 13+ (xid8 / pg_current_xact_id).
+
+ALTER TABLE petani ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
+ALTER TABLE komoditas ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
+ALTER TABLE hasil_panen ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
+
+CREATE TABLE IF NOT EXISTS sync_log (
+    change_id BIGSERIAL PRIMARY KEY,
+    txid XID8 NOT NULL DEFAULT pg_current_xact_id(),
+    user_id INTEGER NOT NULL,
+    table_name TEXT NOT NULL,
+    row_id INTEGER NOT NULL,
+    op CHAR(1) NOT NULL CHECK (op IN ('u', 'd')),
+    changed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS sync_log_user_txid_idx ON sync_log (user_id, txid, change_id);
+CREATE INDEX IF NOT EXISTS sync_log_row_idx ON sync_log (table_name, row_id, change_id);
+
+-- Batas bawah log setelah pemangkasan; kursor yang lebih tua harus sinkron ulang penuh.
+CREATE TABLE IF NOT EXISTS sync_log_watermark (
+    id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+    pruned_before XID8 NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION sync_log_petani() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        IF OLD.user_id IS NOT NULL THEN
+            INSERT INTO sync_log (user_id, table_name, row_id, op)
+            SELECT OLD.user_id, 'komoditas', id, 'd' FROM komoditas WHERE petani_id = OLD.id;
+            INSERT INTO sync_log (user_id, table_name, row_id, op)
+            SELECT OLD.user_id, 'hasil_panen', id, 'd' FROM hasil_panen WHERE petani_id = OLD.id;
+            INSERT INTO sync_log (user_id, table_name, row_id, op)
+            VALUES (OLD.user_id, 'petani', OLD.id, 'd');
+        END IF;
+        RETURN OLD;
+    END IF;
+
+    NEW.updated_at := now();
+    IF NEW.user_id IS NOT NULL THEN
+        INSERT INTO sync_log (user_id, table_name, row_id, op) VALUES (NEW.user_id, 'petani', NEW.id, 'u');
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+-- Untuk komoditas dan hasil_panen: user_id diambil dari petani pemilik. Saat
+-- baris anak terhapus lewat cascade, petani sudah tidak ada dan tombstone-nya
+-- sudah ditulis oleh sync_log_petani.
+CREATE OR REPLACE FUNCTION sync_log_anak_petani() RETURNS trigger AS $$
+DECLARE
+    v_user_id INTEGER;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        SELECT user_id INTO v_user_id FROM petani WHERE id = OLD.petani_id;
+        IF v_user_id IS NOT NULL THEN
+            INSERT INTO sync_log (user_id, table_name, row_id, op) VALUES (v_user_id, TG_TABLE_NAME, OLD.id, 'd');
+        END IF;
+        RETURN OLD;
+    END IF;
+
+    NEW.updated_at := now();
+    SELECT user_id INTO v_user_id FROM petani WHERE id = NEW.petani_id;
+    IF v_user_id IS NOT NULL THEN
+        INSERT INTO sync_log (user_id, table_name, row_id, op) VALUES (v_user_id, TG_TABLE_NAME, NEW.id, 'u');
+    END IF;
+    IF TG_OP = 'UPDATE' AND OLD.petani_id IS DISTINCT FROM NEW.petani_id THEN
+        SELECT user_id INTO v_user_id FROM petani WHERE id = OLD.petani_id;
+        IF v_user_id IS NOT NULL THEN
+            INSERT INTO sync_log (user_id, table_name, row_id, op) VALUES (v_user_id, TG_TABLE_NAME, OLD.id, 'd');
+        END IF;
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS sync_log_petani ON petani;
+CREATE TRIGGER sync_log_petani
+    BEFORE INSERT OR UPDATE OR DELETE ON petani
+    FOR EACH ROW EXECUTE FUNCTION sync_log_petani();
+
+DROP TRIGGER IF EXISTS sync_log_komoditas ON komoditas;
+CREATE TRIGGER sync_log_komoditas
+    BEFORE INSERT OR UPDATE OR DELETE ON komoditas
+    FOR EACH ROW EXECUTE FUNCTION sync_log_anak_petani();
+
+DROP TRIGGER IF EXISTS sync_log_hasil_panen ON hasil_panen;
+CREATE TRIGGER sync_log_hasil_panen
+    BEFORE INSERT OR UPDATE OR DELETE ON hasil_panen
+    FOR EACH ROW EXECUTE FUNCTION sync_log_anak_petani();
+
+-- Baris yang sudah ada masuk log sebagai 'u' agar sinkronisasi pertama lengkap.
+INSERT INTO sync_log (user_id, table_name, row_id, op)
+SELECT user_id, 'petani', id, 'u' FROM petani WHERE user_id IS NOT NULL;
+INSERT INTO sync_log (user_id, table_name, row_id, op)
+SELECT p.user_id, 'komoditas', k.id, 'u' FROM komoditas k JOIN petani p ON p.id = k.petani_id
+WHERE p.user_id IS NOT NULL;
+INSERT INTO sync_log (user_id, table_name, row_id, op)
+SELECT p.user_id, 'hasil_panen', h.id, 'u' FROM hasil_panen h JOIN petani p ON p.id = h.petani_id
+WHERE p.user_id IS NOT NULL;
@@ -0,0 +1,11 @@
+-- migrate: no-transaction
+-- Indeks GiST gabungan (user_id, geometri) untuk pencarian spasial per pengguna:
+-- petani terdekat (KNN <->), radius dan poligon. btree_gist menyediakan
+-- operator = untuk kolom integer di dalam indeks GiST.
+
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS petani_user_lokasi_point_gist ON petani USING GIST (user_id, lokasi_point);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS petani_user_lahan_geom_gist ON petani USING GIST (user_id, lahan_geom);
+
+ANALYZE petani;
@@ -0,0 +1,13 @@
+-- migrate: no-transaction
+-- Indeks trigram untuk pencarian petani (typeahead /petani/search) pada nama,
+-- nik dan alamat. user_id ikut di dalam indeks GIN (btree_gin) sehingga satu
+-- indeks menyaring pengguna dan pola ILIKE '%...%' / kemiripan kata sekaligus.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS btree_gin;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS petani_nama_trgm ON petani USING GIN (user_id, nama gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS petani_nik_trgm ON petani USING GIN (user_id, nik gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS petani_alamat_trgm ON petani USING GIN (user_id, alamat gin_trgm_ops);
+
+ANALYZE petani;
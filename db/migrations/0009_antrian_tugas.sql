@@ -0,0 +1,45 @@
+-- Antrian tugas latar belakang (impor, ekspor, bangun ulang rekap) yang
+-- dijalankan oleh worker.py. Worker mengambil tugas dengan
+-- SELECT ... FOR UPDATE SKIP LOCKED, jadi tidak perlu broker terpisah.
+-- Berkas unggahan dan hasil ekspor disimpan di job_files dalam potongan
+-- bytea, sehingga proses web dan worker tidak harus berbagi disk.
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'queued'
+        CHECK (status IN ('queued', 'running', 'succeeded', 'failed', 'cancelled')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    run_after TIMESTAMPTZ NOT NULL DEFAULT now(),
+    cancel_requested BOOLEAN NOT NULL DEFAULT false,
+    locked_by TEXT,
+    heartbeat_at TIMESTAMPTZ,
+    progress_done BIGINT,
+    progress_total BIGINT,
+    message TEXT,
+    result JSONB,
+    error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    started_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ
+);
+
+-- Tugas yang siap diambil, urut menurut waktu jalan.
+CREATE INDEX IF NOT EXISTS jobs_antrian_idx ON jobs (run_after, id) WHERE status = 'queued';
+-- Batas tugas berjalan per jenis dan per pengguna, serta pencarian tugas macet.
+CREATE INDEX IF NOT EXISTS jobs_berjalan_idx ON jobs (kind, user_id) WHERE status = 'running';
+-- Daftar tugas terbaru seorang pengguna.
+CREATE INDEX IF NOT EXISTS jobs_user_idx ON jobs (user_id, id DESC);
+-- Pembersihan tugas lama yang sudah selesai.
+CREATE INDEX IF NOT EXISTS jobs_selesai_idx ON jobs (finished_at) WHERE finished_at IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS job_files (
+    job_id BIGINT NOT NULL REFERENCES jobs(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data BYTEA NOT NULL,
+    PRIMARY KEY (job_id, name, seq)
+);
@@ -0,0 +1,13 @@
+-- Versi data per pengguna, dibaca bersama oleh semua proses web dan worker.py.
+-- Setiap penulisan petani/komoditas/hasil_panen (dan bangun ulang rekap)
+-- menaikkan version di transaksi yang sama (versions.bump), sehingga ETag,
+-- halaman yang di-cache dan daftar petani tidak pernah lebih tua dari
+-- datanya, di host mana pun. tile_version hanya naik saat petani berubah dan
+-- menjadi bagian dari path cache tile.
+
+CREATE TABLE IF NOT EXISTS data_versions (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    version BIGINT NOT NULL DEFAULT 0,
+    tile_version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
@@ -0,0 +1,7 @@
+-- migrate: no-transaction
+-- Indeks updated_at (kolom dari migrasi 0006) untuk kueri "berubah sejak"
+-- (ekspor inkremental, pemeriksaan sinkronisasi) tanpa memindai seluruh tabel.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS petani_updated_at_idx ON petani (updated_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS komoditas_updated_at_idx ON komoditas (updated_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS hasil_panen_updated_at_idx ON hasil_panen (updated_at);
@@ -0,0 +1,214 @@
+import csv
+import io
+import json
+import os
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+
+BATCH_SIZE = 2000
+FILE_CHUNK_SIZE = 64 * 1024
+
+# Every dataset is scoped to the logged-in user through petani.user_id and
+# ordered by id so exports are deterministic. ``{geom}`` is replaced with the
+# geometry expression for the requested format.
+DATASETS = {
+    'petani': {
+        'sql': """
+            SELECT id, nama, nik, tanggal_lahir, no_telpon, alamat, luas_lahan,
+                   ST_X(lokasi_point), ST_Y(lokasi_point), {geom}
+            FROM petani
+            WHERE user_id = %s
+            ORDER BY id
+        """,
+        'geometry_column': 'lahan_geom',
+        'properties': [
+            ('id', 'int'), ('nama', 'str'), ('nik', 'str'), ('tanggal_lahir', 'date'),
+            ('no_telpon', 'str'), ('alamat', 'str'), ('luas_lahan', 'float'),
+            ('lokasi_lon', 'float'), ('lokasi_lat', 'float'),
+        ],
+    },
+    'komoditas': {
+        'sql': """
+            SELECT k.id, k.petani_id, p.nama, k.nama_komoditas, k.luas_lahan, k.tanggal_tanam
+            FROM komoditas k
+            JOIN petani p ON k.petani_id = p.id
+            WHERE p.user_id = %s
+            ORDER BY k.id
+        """,
+        'geometry_column': None,
+        'properties': [
+            ('id', 'int'), ('petani_id', 'int'), ('nama_petani', 'str'),
+            ('nama_komoditas', 'str'), ('luas_lahan', 'float'), ('tanggal_tanam', 'date'),
+        ],
+    },
+    'hasil_panen': {
+        'sql': """
+            SELECT h.id, h.petani_id, p.nama, h.nama_komoditas, h.jumlah, h.tanggal_panen
+            FROM hasil_panen h
+            JOIN petani p ON h.petani_id = p.id
+            WHERE p.user_id = %s
+            ORDER BY h.id
+        """,
+        'geometry_column': None,
+        'properties': [
+            ('id', 'int'), ('petani_id', 'int'), ('nama_petani', 'str'),
+            ('nama_komoditas', 'str'), ('jumlah', 'float'), ('tanggal_panen', 'date'),
+        ],
+    },
+}
+
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'geojsonl': ('application/geo+json-seq', 'geojsonl'),
+    'gpkg': ('application/geopackage+sqlite3', 'gpkg'),
+}
+
+
+def _plain(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _query(dataset, geom_expr):
+    spec = DATASETS[dataset]
+    if spec['geometry_column']:
+        return spec['sql'].format(geom=geom_expr.format(col=spec['geometry_column']))
+    return spec['sql']
+
+
+def count_rows(conn, dataset, user_id):
+    """Number of rows an export of ``dataset`` will contain (geometry is not computed)."""
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT count(*) FROM ({_query(dataset, 'NULL')}) t", (user_id,))
+        return cur.fetchone()[0]
+
+
+def iter_batches(conn, name, sql, params, batch_size=BATCH_SIZE, progress=None):
+    """Yields lists of rows from a server-side cursor, ``batch_size`` at a time.
+
+    ``progress``, when given, is called with the number of rows fetched so far.
+    """
+    cur = conn.cursor(name=name)
+    cur.itersize = batch_size
+    fetched = 0
+    try:
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            fetched += len(rows)
+            if progress:
+                progress(fetched)
+            yield rows
+    finally:
+        cur.close()
+
+
+def iter_csv(conn, dataset, user_id, progress=None):
+    """Yields CSV text one batch at a time; geometry is written as WKT."""
+    spec = DATASETS[dataset]
+    header = [name for name, _ in spec['properties']]
+    if spec['geometry_column']:
+        header.append(spec['geometry_column'] + '_wkt')
+
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    yield buf.getvalue()
+
+    sql = _query(dataset, "ST_AsText({col})")
+    for rows in iter_batches(conn, f'export_{dataset}_csv', sql, (user_id,), progress=progress):
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows([[_plain(v) for v in row] for row in rows])
+        yield buf.getvalue()
+
+
+def _features(conn, dataset, user_id, precision=7, progress=None):
+    spec = DATASETS[dataset]
+    names = [name for name, _ in spec['properties']]
+    sql = _query(dataset, f"ST_AsGeoJSON({{col}}, {int(precision)})")
+    for rows in iter_batches(conn, f'export_{dataset}_geojson', sql, (user_id,), progress=progress):
+        batch = []
+        for row in rows:
+            geometry = None
+            values = row
+            if spec['geometry_column']:
+                geometry = json.loads(row[-1]) if row[-1] else None
+                values = row[:-1]
+            batch.append({
+                'type': 'Feature',
+                'id': row[0],
+                'geometry': geometry,
+                'properties': {name: _plain(v) for name, v in zip(names, values)},
+            })
+        yield batch
+
+
+def iter_geojsonl(conn, dataset, user_id, progress=None):
+    """Yields newline-delimited GeoJSON features, one batch per chunk."""
+    for batch in _features(conn, dataset, user_id, progress=progress):
+        yield ''.join(json.dumps(f, separators=(',', ':')) + '\n' for f in batch)
+
+
+def write_gpkg(conn, dataset, user_id, path, progress=None):
+    """Writes ``dataset`` to a GeoPackage at ``path`` in batches through fiona."""
+    import fiona
+
+    spec = DATASETS[dataset]
+    schema = {
+        'geometry': 'Unknown' if spec['geometry_column'] else 'None',
+        'properties': dict(spec['properties']),
+    }
+    with fiona.open(path, 'w', driver='GPKG', layer=dataset, schema=schema, crs='EPSG:4326') as dst:
+        for batch in _features(conn, dataset, user_id, progress=progress):
+            dst.writerecords(batch)
+
+
+def iter_gpkg(conn, dataset, user_id):
+    """Builds the GeoPackage in a temp file, then yields it in fixed-size chunks.
+
+    GeoPackage is SQLite and cannot be produced as a forward-only stream, so
+    the file is staged on disk; memory use stays bounded by one batch.
+    """
+    fd, path = tempfile.mkstemp(suffix='.gpkg')
+    os.close(fd)
+    os.unlink(path)  # fiona refuses to create a layer over an empty non-GPKG file
+    try:
+        write_gpkg(conn, dataset, user_id, path)
+        with open(path, 'rb') as fh:
+            while True:
+                chunk = fh.read(FILE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+WRITERS = {
+    'csv': iter_csv,
+    'geojsonl': iter_geojsonl,
+    'gpkg': iter_gpkg,
+}
+
+
+def write_file(conn, dataset, fmt, user_id, path, progress=None):
+    """Writes the export to ``path`` instead of streaming it (used by background jobs).
+
+    ``progress`` is called with the number of rows written so far. Returns
+    the file size in bytes.
+    """
+    if fmt == 'gpkg':
+        write_gpkg(conn, dataset, user_id, path, progress=progress)
+    else:
+        with open(path, 'w', encoding='utf-8', newline='') as fh:
+            for chunk in WRITERS[fmt](conn, dataset, user_id, progress=progress):
+                fh.write(chunk)
+    return os.path.getsize(path)
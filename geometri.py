@@ -0,0 +1,200 @@
+"""Compact transport encodings for parcel geometries (petani.lahan_geom).
+
+    geojson   GeoJSON geometry, coordinates rounded to ``presisi`` decimals
+              (ST_AsGeoJSON maxdecimaldigits)
+    twkb      ST_AsTWKB as base64: varint deltas quantized to ``presisi``
+              decimals, usually a fifth of the GeoJSON size
+    polyline  Google encoded polyline per ring (ST_AsEncodedPolyline), as
+              ``{"presisi": p, "poligon": [[outer, hole, ...], ...]}``
+    wkt       accepted on input only, for older clients
+
+Six decimals of a degree is about 0.1 m on the ground, finer than any
+boundary drawn on a web map, and is the default. Inputs are accepted in
+the same forms the API returns.
+"""
+import base64
+import binascii
+import json
+
+FORMATS = ('geojson', 'twkb', 'polyline')
+INPUT_FORMATS = FORMATS + ('wkt',)
+DEFAULT_PRECISION = 6
+MAX_PRECISION = 8
+# TWKB header: the low nibble of the first byte is the geometry type.
+TWKB_POLYGON_TYPES = (3, 6)
+
+
+class GeometryInputError(ValueError):
+    """A geometry, format or precision parameter cannot be used."""
+
+
+def parse_precision(value, default=DEFAULT_PRECISION):
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise GeometryInputError("presisi wajib berupa bilangan bulat")
+    if not 0 <= value <= MAX_PRECISION:
+        raise GeometryInputError(f"presisi harus antara 0 dan {MAX_PRECISION}")
+    return value
+
+
+def parse_format(value, allowed=FORMATS):
+    value = (value or 'geojson').lower()
+    if value not in allowed:
+        raise GeometryInputError(f"format harus salah satu dari: {', '.join(allowed)}")
+    return value
+
+
+# Column expressions per output format; %(presisi)s is bound by the caller.
+OUTPUT_SQL = {
+    'geojson': "ST_AsGeoJSON({column}, %(presisi)s)::json",
+    # encode(..., 'base64') wraps every 76 characters.
+    'twkb': "to_json(replace(encode(ST_AsTWKB({column}, %(presisi)s), 'base64'), E'\\n', ''))",
+    'polyline': """(
+        SELECT json_build_object('presisi', %(presisi)s, 'poligon', json_agg(x.cincin ORDER BY x.path))
+        FROM (
+            SELECT d.path, json_agg(ST_AsEncodedPolyline(ST_ExteriorRing(r.geom), %(presisi)s)
+                                    ORDER BY r.path) AS cincin
+            FROM ST_Dump({column}) d, ST_DumpRings(d.geom) r
+            GROUP BY d.path
+        ) x
+    )""",
+}
+
+
+def output_sql(column, fmt):
+    """SQL expression that renders ``column`` as JSON in format ``fmt``."""
+    return OUTPUT_SQL[fmt].format(column=column)
+
+
+def parcel(conn, user_id, petani_id, fmt='geojson', precision=DEFAULT_PRECISION):
+    """One farmer's parcel as a JSON document (text), or None when not found.
+
+    The document is assembled by PostgreSQL so a large polygon is never
+    parsed and re-serialised in Python: ``{"id", "format", "presisi",
+    "bbox": [minx, miny, maxx, maxy], "luas_lahan", "geometri"}``.
+    """
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT json_build_object(
+                'id', p.id,
+                'format', %(format)s,
+                'presisi', %(presisi)s,
+                'bbox', CASE WHEN p.lahan_geom IS NOT NULL THEN json_build_array(
+                            ST_XMin(p.lahan_geom), ST_YMin(p.lahan_geom),
+                            ST_XMax(p.lahan_geom), ST_YMax(p.lahan_geom)) END,
+                'luas_lahan', p.luas_lahan,
+                'geometri', CASE WHEN p.lahan_geom IS NOT NULL THEN {output_sql('p.lahan_geom', fmt)} END
+            )::text
+            FROM petani p
+            WHERE p.id = %(id)s AND p.user_id = %(user_id)s
+        """, {'format': fmt, 'presisi': precision, 'id': petani_id, 'user_id': user_id})
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+def decode_polyline(text, precision):
+    """Decodes one Google encoded polyline into GeoJSON [lon, lat] positions."""
+    factor = 10 ** precision
+    coords, index, lat, lon = [], 0, 0, 0
+    while index < len(text):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                if index >= len(text):
+                    raise GeometryInputError("polyline terpotong")
+                byte = ord(text[index]) - 63
+                index += 1
+                if not 0 <= byte < 64:
+                    raise GeometryInputError("karakter polyline tidak valid")
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        coords.append([lon / factor, lat / factor])
+    return coords
+
+
+def polyline_to_geojson(payload):
+    """``{"presisi", "poligon": [[ring, ...], ...]}`` to a GeoJSON Polygon/MultiPolygon."""
+    precision = parse_precision(payload.get('presisi'))
+    polygons = payload.get('poligon')
+    if not isinstance(polygons, list) or not polygons:
+        raise GeometryInputError("poligon wajib berupa daftar cincin polyline")
+    result = []
+    for rings in polygons:
+        if not isinstance(rings, list) or not rings or not all(isinstance(r, str) for r in rings):
+            raise GeometryInputError("setiap poligon wajib berupa daftar polyline")
+        decoded = []
+        for ring in rings:
+            coords = decode_polyline(ring, precision)
+            if coords and coords[0] != coords[-1]:
+                coords.append(coords[0])
+            if len(coords) < 4:
+                raise GeometryInputError("cincin poligon minimal 3 titik")
+            decoded.append(coords)
+        result.append(decoded)
+    if len(result) == 1:
+        return {'type': 'Polygon', 'coordinates': result[0]}
+    return {'type': 'MultiPolygon', 'coordinates': result}
+
+
+def _detect(payload):
+    if isinstance(payload, dict):
+        return 'polyline' if 'poligon' in payload else 'geojson'
+    if isinstance(payload, str) and payload.lstrip().upper().startswith(('POLYGON', 'MULTIPOLYGON')):
+        return 'wkt'
+    raise GeometryInputError("geometri wajib diisi (GeoJSON, polyline, TWKB atau WKT POLYGON)")
+
+
+def parse(payload, fmt=None, placeholder='%(geom)s'):
+    """Returns (sql_fragment, param) building an SRID 4326 polygon from ``payload``.
+
+    ``payload`` is a dict or string in any of INPUT_FORMATS; without ``fmt``
+    GeoJSON, polyline and WKT are told apart by shape (TWKB must be named).
+    The fragment binds its single parameter through ``placeholder``.
+    """
+    fmt = parse_format(fmt, INPUT_FORMATS) if fmt else None
+    if fmt in (None, 'geojson', 'polyline') and isinstance(payload, str) and payload.lstrip().startswith('{'):
+        try:
+            payload = json.loads(payload)
+        except ValueError:
+            raise GeometryInputError("geometri bukan JSON yang valid")
+    fmt = fmt or _detect(payload)
+
+    if fmt == 'polyline':
+        if not isinstance(payload, dict):
+            raise GeometryInputError("polyline wajib berupa objek {presisi, poligon}")
+        payload = polyline_to_geojson(payload)
+        fmt = 'geojson'
+
+    if fmt == 'geojson':
+        if not isinstance(payload, dict):
+            raise GeometryInputError("GeoJSON wajib berupa objek")
+        if payload.get('type') == 'Feature':
+            payload = payload.get('geometry') or {}
+        if payload.get('type') not in ('Polygon', 'MultiPolygon'):
+            raise GeometryInputError("geometri harus berupa Polygon atau MultiPolygon")
+        return f"ST_SetSRID(ST_GeomFromGeoJSON({placeholder}), 4326)", json.dumps(payload)
+
+    if not isinstance(payload, str) or not payload.strip():
+        raise GeometryInputError(f"geometri {fmt} wajib berupa teks")
+
+    if fmt == 'twkb':
+        try:
+            raw = base64.b64decode(payload.strip(), validate=True)
+        except (binascii.Error, ValueError):
+            raise GeometryInputError("TWKB bukan base64 yang valid")
+        if not raw or raw[0] & 0x0f not in TWKB_POLYGON_TYPES:
+            raise GeometryInputError("geometri harus berupa Polygon atau MultiPolygon")
+        return f"ST_SetSRID(ST_GeomFromTWKB({placeholder}), 4326)", raw
+
+    if not payload.strip().upper().startswith(('POLYGON', 'MULTIPOLYGON')):
+        raise GeometryInputError("geometri harus berupa Polygon atau MultiPolygon")
+    return f"ST_GeomFromText({placeholder}, 4326)", payload.strip()
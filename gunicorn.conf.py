@@ -0,0 +1,53 @@
+"""Gunicorn settings shared by every deployment entry point (Procfile, Dockerfile, railway.json).
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Each value can be overridden through the environment:
+
+    PORT                    listen port (5000)
+    WEB_CONCURRENCY         worker processes (2 x CPUs + 1, at most 4)
+    GUNICORN_THREADS        threads per worker (4); requests mostly wait on PostgreSQL
+    GUNICORN_PRELOAD        1 (default) imports app.py once in the master and forks
+                            the workers from it, sharing its memory copy-on-write;
+                            0 imports it in every worker
+    GUNICORN_MAX_REQUESTS   recycle a worker after this many requests (1000, 0 = never)
+    GUNICORN_TIMEOUT        seconds before a silent worker is killed (60)
+"""
+import multiprocessing
+import os
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+bind = f"0.0.0.0:{_env_int('PORT', 5000)}"
+
+workers = _env_int('WEB_CONCURRENCY', min(2 * multiprocessing.cpu_count() + 1, 4))
+# The pool splits DB_MAX_CONNECTIONS over WEB_CONCURRENCY workers (read by
+# config.load() for db.configure()); make sure it sees the count actually used.
+os.environ['WEB_CONCURRENCY'] = str(workers)
+
+worker_class = 'gthread'
+threads = _env_int('GUNICORN_THREADS', 4)
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = max_requests // 10
+
+timeout = _env_int('GUNICORN_TIMEOUT', 60)
+graceful_timeout = 30
+keepalive = 5
+
+# Heartbeat files on tmpfs: a worker blocked on a slow disk is not killed for it.
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+# logs.py writes the access log (sampled, with request ids); gunicorn's own
+# access log would duplicate it.
+accesslog = None
+errorlog = '-'
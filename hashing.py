@@ -0,0 +1,198 @@
+"""Password hashing off the request thread.
+
+Hashes are computed in a small process pool so that a burst of logins cannot
+occupy every gunicorn worker with scrypt/PBKDF2 work. This module must not
+import app.py: pool children are started with ``spawn`` and import only
+this file.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class HashingBusy(Exception):
+    """The hashing pool is saturated; the request should be rejected, not queued."""
+
+
+def _generate(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _verify(pwhash, password):
+    return check_password_hash(pwhash, password)
+
+
+class LatencyStats:
+    """Cumulative histogram of hash durations per operation (Prometheus-style buckets)."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def observe(self, operation, seconds):
+        with self._lock:
+            entry = self._data.setdefault(operation, {
+                'count': 0, 'sum': 0.0, 'max': 0.0, 'buckets': [0] * len(self.buckets),
+            })
+            entry['count'] += 1
+            entry['sum'] += seconds
+            entry['max'] = max(entry['max'], seconds)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    entry['buckets'][i] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                op: {
+                    'count': e['count'],
+                    'sum_seconds': round(e['sum'], 6),
+                    'max_seconds': round(e['max'], 6),
+                    'buckets': dict(zip(self.buckets, e['buckets'])),
+                }
+                for op, e in self._data.items()
+            }
+
+
+class PasswordHasher:
+    """Runs werkzeug hashing in a bounded process pool.
+
+    ``workers`` processes do the work; at most ``max_pending`` calls may be
+    queued or running per gunicorn worker, beyond that HashingBusy is raised
+    immediately. ``workers=0`` hashes inline (development, tests).
+    """
+
+    def __init__(self, method=DEFAULT_METHOD, workers=2, max_pending=8, timeout=10.0,
+                 mp_context='spawn'):
+        self.method = method
+        self.workers = workers
+        self.timeout = timeout
+        self.mp_context = mp_context
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+        # Made once here (inline, at startup) rather than on a request thread.
+        self._prefix = generate_password_hash('', method=method).split('$', 1)[0]
+        self.stats = LatencyStats()
+        self.rejected = 0
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                # A pool inherited through fork belongs to the parent; start our own.
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(self.mp_context),
+                )
+                self._pid = os.getpid()
+            return self._pool
+
+    def _run(self, operation, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashingBusy(operation)
+        start = time.perf_counter()
+        try:
+            if self.workers <= 0:
+                try:
+                    return fn(*args)
+                finally:
+                    self._slots.release()
+            try:
+                future = self._executor().submit(fn, *args)
+            except BaseException:
+                self._slots.release()
+                raise
+            # A running job cannot be cancelled, so its slot is freed only
+            # when it finishes: max_pending keeps bounding the pool's work
+            # even when callers give up after ``timeout``.
+            future.add_done_callback(lambda _: self._slots.release())
+            try:
+                return future.result(timeout=self.timeout)
+            except FutureTimeout:
+                future.cancel()
+                raise HashingBusy(operation)
+        finally:
+            self.stats.observe(operation, time.perf_counter() - start)
+
+    def hash(self, password):
+        return self._run('hash', _generate, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run('verify', _verify, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True when ``pwhash`` was made with different parameters than the configured method.
+
+        The method may be shorthand ('scrypt', 'pbkdf2:sha256') while stored
+        hashes spell out werkzeug's defaults ('scrypt:32768:8:1'), so the
+        comparison is against the prefix of a hash made once with it.
+        """
+        return pwhash.split('$', 1)[0] != self._prefix
+
+    def metrics(self):
+        return {'method': self.method.split(':', 1)[0], 'workers': self.workers,
+                'rejected': self.rejected, 'latency': self.stats.snapshot()}
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+class AttemptLimiter:
+    """Fixed-window counter of failed logins per (username, client IP) and per client IP.
+
+    The username bucket is keyed on the client too, so guessing at a
+    farmer's account slows down the guesser without locking the farmer out
+    from their own address.
+
+    State lives in a cache.Cache, so with the SQLite backend the limit holds
+    across all gunicorn workers on one host; with the memory backend each
+    worker process counts on its own. The read-then-write in failure() is
+    not atomic, so concurrent failures can be undercounted by a few - the
+    limit slows guessing down, it is not an exact quota. Checked before any
+    hash is computed.
+    """
+
+    def __init__(self, cache, max_per_username=5, max_per_ip=20, window=900):
+        self.cache = cache
+        self.max_per_username = max_per_username
+        self.max_per_ip = max_per_ip
+        self.window = window
+
+    def _keys(self, username, ip):
+        return ((f"login_gagal:user:{username.lower()}:{ip}", self.max_per_username),
+                (f"login_gagal:ip:{ip}", self.max_per_ip))
+
+    def blocked(self, username, ip):
+        for key, limit in self._keys(username, ip):
+            entry = self.cache.backend.get(key)
+            if entry and entry[0] >= limit:
+                return True
+        return False
+
+    def failure(self, username, ip):
+        now = time.time()
+        for key, _ in self._keys(username, ip):
+            entry = self.cache.backend.get(key)
+            if entry:
+                count, started = entry
+                ttl = max(1, int(self.window - (now - started)))
+                self.cache.backend.set(key, [count + 1, started], ttl)
+            else:
+                self.cache.backend.set(key, [1, now], self.window)
+
+    def success(self, username, ip):
+        self.cache.backend.delete(self._keys(username, ip)[0][0])
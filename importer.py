@@ -0,0 +1,273 @@
+import csv
+import io
+import os
+import zipfile
+from datetime import date, datetime
+
+COPY_BATCH_SIZE = 5000
+ALLOWED_EXTENSIONS = {'.zip', '.geojson', '.json', '.gpkg'}
+
+# Attribute names accepted in the uploaded file, lower-cased, per petani column.
+FIELD_ALIASES = {
+    'nama': ('nama', 'name', 'nama_petani'),
+    'nik': ('nik',),
+    'tanggal_lahir': ('tanggal_lahir', 'tgl_lahir'),
+    'no_telpon': ('no_telpon', 'telepon', 'no_hp', 'phone'),
+    'alamat': ('alamat', 'address'),
+    'latitude': ('latitude', 'lat'),
+    'longitude': ('longitude', 'lon', 'lng'),
+}
+
+# Widths of the VARCHAR petani columns; longer values are row errors, not a failed COPY.
+MAX_LENGTHS = {'nik': 20, 'no_telpon': 15}
+
+STAGING_COLUMNS = ('row_no', 'nama', 'nik', 'tanggal_lahir', 'no_telpon', 'alamat',
+                   'lokasi_ewkb', 'lahan_ewkb')
+
+
+class ImportFileError(Exception):
+    """Raised when the uploaded file as a whole cannot be read."""
+
+
+def open_path(path):
+    """Returns the path fiona should open for an uploaded file (zipped shapefiles via /vsizip/)."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in ALLOWED_EXTENSIONS:
+        raise ImportFileError(f"Format berkas tidak didukung: {ext}")
+    if ext == '.zip':
+        with zipfile.ZipFile(path) as zf:
+            shp = [n for n in zf.namelist() if n.lower().endswith('.shp')]
+        if not shp:
+            raise ImportFileError("Arsip ZIP tidak berisi berkas .shp")
+        return f"/vsizip/{os.path.abspath(path)}/{shp[0]}"
+    return path
+
+
+def _lookup(props, field):
+    for alias in FIELD_ALIASES[field]:
+        if alias in props and props[alias] not in (None, ''):
+            return props[alias]
+    return None
+
+
+def _as_date(value):
+    if value is None:
+        return None
+    if isinstance(value, (date, datetime)):
+        return value.strftime('%Y-%m-%d')
+    text = str(value).strip()
+    for fmt in ('%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%Y/%m/%d'):
+        try:
+            return datetime.strptime(text[:10], fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    raise ValueError(f"tanggal_lahir tidak dikenali: {text!r}")
+
+
+def _as_text(value, name):
+    """Attribute as text within MAX_LENGTHS[name].
+
+    Shapefile (DBF) numeric fields arrive as floats; whole numbers are
+    written out as digits, not '3275010101900001.0' or '3.27501e+15'.
+    """
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    text = str(value).strip()
+    if len(text) > MAX_LENGTHS[name]:
+        raise ValueError(f"{name} lebih dari {MAX_LENGTHS[name]} karakter: {text!r}")
+    return text or None
+
+
+def _as_float(value, name):
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} bukan angka: {value!r}")
+
+
+def iter_rows(path):
+    """Reads features one at a time and yields (row_no, staging_row or None, error or None).
+
+    Geometries are reprojected to EPSG:4326, repaired with make_valid and must
+    be (multi)polygons. The farmer's point defaults to the parcel's interior
+    point when the file has no latitude/longitude attributes.
+    """
+    import fiona
+    from fiona.transform import transform_geom
+    import shapely
+    import shapely.wkb
+    from shapely.geometry import Point, shape
+
+    with fiona.open(open_path(path)) as src:
+        src_crs = src.crs_wkt or 'EPSG:4326'
+        needs_transform = src.crs and src.crs.to_epsg() != 4326
+        for row_no, feature in enumerate(src, start=1):
+            try:
+                props = {k.lower(): v for k, v in dict(feature['properties'] or {}).items()}
+                nama = _lookup(props, 'nama')
+                if not nama:
+                    raise ValueError("nama kosong")
+
+                geom = feature['geometry']
+                if geom is None:
+                    raise ValueError("geometri kosong")
+                if needs_transform:
+                    geom = transform_geom(src_crs, 'EPSG:4326', geom)
+                lahan = shape(geom)
+                if not lahan.is_valid:
+                    lahan = shapely.make_valid(lahan)
+                if lahan.geom_type == 'GeometryCollection':
+                    polys = [g for g in lahan.geoms if g.geom_type in ('Polygon', 'MultiPolygon')]
+                    lahan = shapely.union_all(polys) if polys else lahan
+                if lahan.is_empty or lahan.geom_type not in ('Polygon', 'MultiPolygon'):
+                    raise ValueError(f"geometri harus poligon, bukan {lahan.geom_type}")
+
+                lat = _as_float(_lookup(props, 'latitude'), 'latitude')
+                lon = _as_float(_lookup(props, 'longitude'), 'longitude')
+                if lat is not None and lon is not None:
+                    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                        raise ValueError("koordinat di luar jangkauan")
+                    lokasi = Point(lon, lat)
+                else:
+                    lokasi = lahan.representative_point()
+
+                yield row_no, (
+                    row_no,
+                    str(nama),
+                    _as_text(_lookup(props, 'nik'), 'nik'),
+                    _as_date(_lookup(props, 'tanggal_lahir')),
+                    _as_text(_lookup(props, 'no_telpon'), 'no_telpon'),
+                    _lookup(props, 'alamat'),
+                    shapely.wkb.dumps(lokasi, hex=True, srid=4326),
+                    shapely.wkb.dumps(lahan, hex=True, srid=4326),
+                ), None
+            except Exception as e:
+                yield row_no, None, str(e)
+
+
+def _copy_batch(cur, batch):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in batch:
+        writer.writerow(['' if v is None else v for v in row])
+    buf.seek(0)
+    cur.copy_expert(
+        f"COPY petani_import_staging ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+        buf,
+    )
+
+
+def count_features(path):
+    """Number of features in the file, or None when the driver cannot tell without a full read."""
+    import fiona
+
+    with fiona.open(open_path(path)) as src:
+        try:
+            return len(src)
+        except TypeError:
+            return None
+
+
+def import_petani(conn, path, user_id, batch_size=COPY_BATCH_SIZE, progress=None):
+    """Loads a shapefile/GeoJSON/GeoPackage of farmers into ``petani`` in one transaction.
+
+    Valid rows are COPYed into a temporary staging table in batches, then
+    merged: rows whose NIK already exists for this user update that farmer,
+    everything else is inserted. luas_lahan and the simplified geometries are
+    filled in by the petani_sync_lahan_geom trigger. Returns a dict with counts and the per-row
+    error list; the caller commits or rolls back. ``staged`` counts the rows
+    merged, after the ``duplicates`` (earlier rows of a NIK repeated in the
+    file, also listed as errors) were dropped.
+
+    ``progress``, when given, is called with the number of rows read after
+    every staged batch; an exception it raises aborts the import.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            CREATE TEMP TABLE petani_import_staging (
+                row_no INTEGER,
+                nama TEXT,
+                nik TEXT,
+                tanggal_lahir DATE,
+                no_telpon TEXT,
+                alamat TEXT,
+                lokasi_ewkb TEXT,
+                lahan_ewkb TEXT
+            ) ON COMMIT DROP
+        """)
+
+        errors = []
+        staged = 0
+        batch = []
+        row_no = 0
+        for row_no, row, error in iter_rows(path):
+            if error:
+                errors.append((row_no, error))
+                continue
+            batch.append(row)
+            if len(batch) >= batch_size:
+                _copy_batch(cur, batch)
+                staged += len(batch)
+                batch = []
+                if progress:
+                    progress(row_no)
+        if batch:
+            _copy_batch(cur, batch)
+            staged += len(batch)
+        if progress:
+            progress(row_no)
+
+        # A NIK repeated inside the file keeps only its last row.
+        cur.execute("""
+            DELETE FROM petani_import_staging s
+            USING petani_import_staging t
+            WHERE s.nik IS NOT NULL AND s.nik = t.nik AND s.row_no < t.row_no
+            RETURNING s.row_no, s.nik
+        """)
+        duplicates = cur.fetchall()
+        for row_no, nik in duplicates:
+            errors.append((row_no, f"NIK {nik} duplikat di dalam berkas; baris selanjutnya dipakai"))
+        staged -= len(duplicates)
+
+        cur.execute("""
+            UPDATE petani p
+            SET nama = s.nama,
+                tanggal_lahir = COALESCE(s.tanggal_lahir, p.tanggal_lahir),
+                no_telpon = COALESCE(s.no_telpon, p.no_telpon),
+                alamat = COALESCE(s.alamat, p.alamat),
+                lokasi_point = s.lokasi_ewkb::geometry,
+                lahan_geom = s.lahan_ewkb::geometry
+            FROM petani_import_staging s
+            WHERE p.user_id = %s AND s.nik IS NOT NULL AND p.nik = s.nik
+        """, (user_id,))
+        updated = cur.rowcount
+
+        cur.execute("""
+            INSERT INTO petani (user_id, nama, nik, tanggal_lahir, no_telpon, alamat,
+                                lokasi_point, lahan_geom)
+            SELECT %s, s.nama, s.nik, s.tanggal_lahir, s.no_telpon, s.alamat,
+                   s.lokasi_ewkb::geometry, s.lahan_ewkb::geometry
+            FROM petani_import_staging s
+            WHERE s.nik IS NULL
+               OR NOT EXISTS (SELECT 1 FROM petani p WHERE p.user_id = %s AND p.nik = s.nik)
+        """, (user_id, user_id))
+        inserted = cur.rowcount
+
+        errors.sort()
+        return {'staged': staged, 'inserted': inserted, 'updated': updated,
+                'duplicates': len(duplicates), 'errors': errors}
+    finally:
+        cur.close()
+
+
+def error_report_csv(errors):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(['baris', 'kesalahan'])
+    writer.writerows(errors)
+    return buf.getvalue()
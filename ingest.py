@@ -0,0 +1,151 @@
+"""Batch ingestion of komoditas / hasil_panen records sent as JSON by field agents."""
+import math
+from datetime import datetime
+
+from psycopg2.extras import execute_values
+
+MAX_BATCH = 5000
+MAX_KEY_LENGTH = 100
+
+# Per table: numeric field, date field. nama_komoditas and petani_id are common.
+TABLES = {
+    'komoditas': {'angka': 'luas_lahan', 'tanggal': 'tanggal_tanam'},
+    'hasil_panen': {'angka': 'jumlah', 'tanggal': 'tanggal_panen'},
+}
+
+
+class BatchError(ValueError):
+    """The request as a whole is unusable (not a list, too large, ...)."""
+
+
+def _validate(table, record):
+    """Returns (row_values, error). row_values is (petani_id, nama_komoditas, angka, tanggal, client_key)."""
+    spec = TABLES[table]
+    if not isinstance(record, dict):
+        return None, "record harus berupa objek JSON"
+    try:
+        petani_id = int(record.get('petani_id'))
+    except (TypeError, ValueError):
+        return None, "petani_id wajib berupa bilangan bulat"
+
+    nama_komoditas = record.get('nama_komoditas')
+    if not isinstance(nama_komoditas, str) or not nama_komoditas.strip():
+        return None, "nama_komoditas wajib diisi"
+
+    try:
+        angka = float(record.get(spec['angka']))
+    except (TypeError, ValueError):
+        return None, f"{spec['angka']} wajib berupa angka"
+    if not math.isfinite(angka) or angka < 0:
+        return None, f"{spec['angka']} harus berupa angka tidak negatif"
+
+    try:
+        tanggal = datetime.strptime(str(record.get(spec['tanggal'])), '%Y-%m-%d').date()
+    except ValueError:
+        return None, f"{spec['tanggal']} wajib berformat YYYY-MM-DD"
+
+    client_key = record.get('idempotency_key')
+    if client_key is not None:
+        client_key = str(client_key)
+        if not client_key or len(client_key) > MAX_KEY_LENGTH:
+            return None, f"idempotency_key harus 1-{MAX_KEY_LENGTH} karakter"
+
+    return (petani_id, nama_komoditas.strip(), angka, tanggal, client_key), None
+
+
+def ingest(conn, table, user_id, records):
+    """Validates, ownership-checks and inserts ``records`` into ``table`` in one transaction.
+
+    Returns one result dict per input record, in input order, with status
+    ``created``, ``duplicate`` (same idempotency_key already stored for that
+    petani; ``id`` is the existing row) or ``error``. The caller commits.
+    """
+    if not isinstance(records, list):
+        raise BatchError("records harus berupa array")
+    if len(records) > MAX_BATCH:
+        raise BatchError(f"maksimal {MAX_BATCH} record per batch")
+
+    spec = TABLES[table]
+    results = [None] * len(records)
+    rows = []  # (index, values)
+    seen_keys = {}
+    for index, record in enumerate(records):
+        values, error = _validate(table, record)
+        if error:
+            results[index] = {'index': index, 'status': 'error', 'error': error}
+            continue
+        key = (values[0], values[4])
+        if values[4] is not None and key in seen_keys:
+            # Same key twice in one batch: the later copy is a duplicate of the first.
+            results[index] = {'index': index, 'status': 'duplicate', 'duplicate_of': seen_keys[key]}
+            continue
+        if values[4] is not None:
+            seen_keys[key] = index
+        rows.append((index, values))
+
+    cur = conn.cursor()
+    try:
+        petani_ids = sorted({values[0] for _, values in rows})
+        owned = set()
+        if petani_ids:
+            cur.execute("SELECT id FROM petani WHERE user_id = %s AND id = ANY(%s)", (user_id, petani_ids))
+            owned = {row[0] for row in cur.fetchall()}
+
+        insertable = []
+        for index, values in rows:
+            if values[0] not in owned:
+                results[index] = {'index': index, 'status': 'error',
+                                  'error': "petani_id tidak ditemukan atau bukan milik Anda"}
+            else:
+                insertable.append((index, values))
+
+        if insertable:
+            # The ordinal column maps RETURNING rows back to input positions:
+            # each input row draws its id from the table's sequence first, so
+            # the ids RETURNING reports join back to their ordinals.
+            inserted = execute_values(cur, f"""
+                WITH v AS (
+                    SELECT v.*, nextval(pg_get_serial_sequence('{table}', 'id')) AS new_id
+                    FROM (VALUES %s) AS v(ordinal, petani_id, nama_komoditas, angka, tanggal, client_key)
+                ), ins AS (
+                    INSERT INTO {table} (id, petani_id, nama_komoditas, {spec['angka']}, {spec['tanggal']}, client_key)
+                    SELECT new_id, petani_id, nama_komoditas, angka, tanggal, client_key
+                    FROM v
+                    ORDER BY ordinal
+                    ON CONFLICT (petani_id, client_key) DO NOTHING
+                    RETURNING id
+                )
+                SELECT v.ordinal, ins.id FROM ins JOIN v ON v.new_id = ins.id
+            """, [(index,) + values for index, values in insertable],
+                template="(%s, %s::integer, %s, %s::double precision, %s::date, %s)",
+                page_size=1000, fetch=True)
+
+            # Rows left out of RETURNING hit the (petani_id, client_key)
+            # index: their key is already stored.
+            created = dict(inserted)
+            missing = []
+            for index, values in insertable:
+                if index in created:
+                    results[index] = {'index': index, 'status': 'created', 'id': created[index]}
+                else:
+                    missing.append((index, (values[0], values[4])))
+
+            if missing:
+                cur.execute(f"""
+                    SELECT id, petani_id, client_key FROM {table}
+                    WHERE (petani_id, client_key) IN (SELECT * FROM unnest(%s::integer[], %s::text[]))
+                """, ([k[0] for _, k in missing], [k[1] for _, k in missing]))
+                existing = {(p, k): row_id for row_id, p, k in cur.fetchall()}
+                for index, key in missing:
+                    results[index] = {'index': index, 'status': 'duplicate', 'id': existing.get(key)}
+    finally:
+        cur.close()
+
+    for index, result in enumerate(results):
+        if 'duplicate_of' in result:
+            first = results[result['duplicate_of']]
+            if first['status'] == 'error':
+                results[index] = dict(first, index=index)
+            else:
+                result['id'] = first.get('id')
+    return results
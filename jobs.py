@@ -0,0 +1,353 @@
+"""Background job queue in PostgreSQL: imports, exports and rollup rebuilds.
+
+The web app enqueues a job and answers with its id right away; worker.py
+claims queued jobs with ``FOR UPDATE SKIP LOCKED``, runs them and records
+progress, result or error in the same ``jobs`` row (migration 0009), which
+the status endpoints read. There is no broker: PostgreSQL is the queue.
+
+Concurrency is limited twice: at most KINDS[kind]['max_running'] jobs of a
+kind run at once across all workers, and a user never has two jobs of the
+same kind running. Claims are serialized by an advisory lock so the running
+counts they check are exact; the row itself is still picked with SKIP LOCKED,
+so a claim never waits on a job being updated.
+
+A failed job goes back to the queue with exponential backoff until
+max_attempts is used up, unless the handler raised JobFailed (the input
+itself is bad and retrying cannot help). A worker that dies mid-job stops
+heartbeating; requeue_stale() hands its job to another worker.
+
+Uploaded inputs and produced files are kept in ``job_files`` as 1 MB bytea
+chunks, so the web and worker processes need no shared disk.
+"""
+import random
+
+import psycopg2
+from psycopg2.extras import Json
+
+FILE_CHUNK_SIZE = 1024 * 1024
+CLAIM_LOCK_ID = 724_519_002  # arbitrary, next to migrate.ADVISORY_LOCK_ID
+
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 30 * 60
+
+STATUS_LABELS = {
+    'queued': 'Menunggu giliran',
+    'running': 'Berjalan',
+    'succeeded': 'Selesai',
+    'failed': 'Gagal',
+    'cancelled': 'Dibatalkan',
+}
+
+# Per kind: label shown to users, jobs allowed to run at once over all
+# workers, and attempts before a job is marked failed.
+KINDS = {
+    'import_petani': {'label': 'Impor petani', 'max_running': 2, 'max_attempts': 3},
+    'export': {'label': 'Ekspor data', 'max_running': 4, 'max_attempts': 3},
+    'rekap_panen': {'label': 'Bangun ulang rekap panen', 'max_running': 1, 'max_attempts': 2},
+}
+
+JOB_COLUMNS = """
+    id, user_id, kind, payload, status, attempts, max_attempts, run_after, cancel_requested,
+    progress_done, progress_total, message, result, error, created_at, started_at, finished_at
+"""
+
+
+class JobFailed(Exception):
+    """Raised by a handler when the job can never succeed; it is failed without retrying."""
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler once the job's owner asked to cancel it."""
+
+
+class TooManyJobs(Exception):
+    """Raised by enqueue() when the user already has the allowed number of unfinished jobs."""
+
+
+def _row_to_job(row):
+    job = dict(zip([c.strip() for c in JOB_COLUMNS.split(',')], row))
+    for key in ('run_after', 'created_at', 'started_at', 'finished_at'):
+        if job[key] is not None:
+            job[key] = job[key].isoformat()
+    return job
+
+
+def retry_delay(attempts):
+    """Seconds before attempt ``attempts + 1``: doubling from RETRY_BASE_SECONDS, capped, with jitter."""
+    delay = min(RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def enqueue(conn, user_id, kind, payload=None, files=None, max_active=None):
+    """Inserts a queued job and returns its id; the caller commits.
+
+    ``files`` maps a file name to a binary file object whose content is
+    stored with the job (e.g. the uploaded shapefile). With ``max_active``,
+    TooManyJobs is raised when the user already has that many queued or
+    running jobs.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"unknown job kind {kind!r}")
+    with conn.cursor() as cur:
+        if max_active:
+            # Serializes enqueues of one user so two requests cannot both pass the check.
+            cur.execute("SELECT pg_advisory_xact_lock(%s, %s)", (CLAIM_LOCK_ID, user_id))
+            cur.execute("SELECT count(*) FROM jobs WHERE user_id = %s AND status IN ('queued', 'running')",
+                        (user_id,))
+            if cur.fetchone()[0] >= max_active:
+                raise TooManyJobs(max_active)
+        cur.execute("""
+            INSERT INTO jobs (user_id, kind, payload, max_attempts)
+            VALUES (%s, %s, %s, %s)
+            RETURNING id
+        """, (user_id, kind, Json(payload or {}), KINDS[kind]['max_attempts']))
+        job_id = cur.fetchone()[0]
+    for name, fileobj in (files or {}).items():
+        write_file(conn, job_id, name, fileobj)
+    return job_id
+
+
+def get(conn, user_id, job_id):
+    """The job as a dict, or None when it does not exist or belongs to someone else."""
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = %s AND user_id = %s", (job_id, user_id))
+        row = cur.fetchone()
+    return _row_to_job(row) if row else None
+
+
+def recent(conn, user_id, kind=None, limit=20):
+    """The user's latest jobs, newest first, optionally of one kind."""
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT {JOB_COLUMNS} FROM jobs
+            WHERE user_id = %s AND (%s::text IS NULL OR kind = %s)
+            ORDER BY id DESC
+            LIMIT %s
+        """, (user_id, kind, kind, limit))
+        return [_row_to_job(row) for row in cur.fetchall()]
+
+
+def cancel(conn, user_id, job_id):
+    """Cancels a queued job at once, or asks the worker running it to stop.
+
+    Returns the job's status afterwards, or None when the user has no such
+    job. The caller commits.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE jobs
+            SET status = CASE WHEN status = 'queued' THEN 'cancelled' ELSE status END,
+                finished_at = CASE WHEN status = 'queued' THEN now() ELSE finished_at END,
+                cancel_requested = (status = 'running')
+            WHERE id = %s AND user_id = %s AND status IN ('queued', 'running')
+            RETURNING status
+        """, (job_id, user_id))
+        row = cur.fetchone()
+        if row:
+            return row[0]
+        cur.execute("SELECT status FROM jobs WHERE id = %s AND user_id = %s", (job_id, user_id))
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+def counts(conn):
+    """Number of jobs per (kind, status) that are queued or running, for health checks."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT kind, status, count(*), EXTRACT(EPOCH FROM now() - min(created_at))
+            FROM jobs
+            WHERE status IN ('queued', 'running')
+            GROUP BY kind, status
+            ORDER BY kind, status
+        """)
+        return [{'kind': kind, 'status': status, 'jobs': n, 'oldest_seconds': round(float(age), 1)}
+                for kind, status, n, age in cur.fetchall()]
+
+
+def claim(conn, worker_id, kinds=None):
+    """Marks the next runnable job as running for ``worker_id`` and returns it, or None.
+
+    Only kinds below their max_running limit are considered, and jobs whose
+    user already has a job of that kind running are skipped. Commits.
+    """
+    kinds = [k for k in (kinds or KINDS) if k in KINDS]
+    if not kinds:
+        return None
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (CLAIM_LOCK_ID,))
+            cur.execute("""
+                SELECT kind, count(*) FROM jobs
+                WHERE status = 'running' AND kind = ANY(%s)
+                GROUP BY kind
+            """, (kinds,))
+            running = dict(cur.fetchall())
+            kinds = [k for k in kinds if running.get(k, 0) < KINDS[k]['max_running']]
+            if not kinds:
+                conn.commit()
+                return None
+            cur.execute(f"""
+                UPDATE jobs
+                SET status = 'running', attempts = attempts + 1, locked_by = %(worker)s,
+                    started_at = now(), heartbeat_at = now(), message = NULL
+                WHERE id = (
+                    SELECT j.id FROM jobs j
+                    WHERE j.status = 'queued' AND j.run_after <= now() AND j.kind = ANY(%(kinds)s)
+                      AND NOT EXISTS (SELECT 1 FROM jobs r
+                                      WHERE r.status = 'running' AND r.kind = j.kind AND r.user_id = j.user_id)
+                    ORDER BY j.run_after, j.id
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING {JOB_COLUMNS}
+            """, {'worker': worker_id, 'kinds': kinds})
+            row = cur.fetchone()
+        conn.commit()
+    except psycopg2.Error:
+        conn.rollback()
+        raise
+    return _row_to_job(row) if row else None
+
+
+def progress(conn, job_id, worker_id, done=None, total=None, message=None):
+    """Records progress (also a heartbeat) and returns True if the job should stop.
+
+    ``conn`` must be autocommit or separate from the connection doing the
+    job's work, so progress is visible while that transaction is still open.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE jobs
+            SET progress_done = COALESCE(%s, progress_done), progress_total = COALESCE(%s, progress_total),
+                message = COALESCE(%s, message), heartbeat_at = now()
+            WHERE id = %s AND locked_by = %s
+            RETURNING cancel_requested
+        """, (done, total, message, job_id, worker_id))
+        row = cur.fetchone()
+    # A job taken away by requeue_stale() must stop too.
+    return row is None or row[0]
+
+
+def heartbeat(conn, job_ids, worker_id):
+    """Refreshes heartbeat_at of the jobs ``worker_id`` is running."""
+    if not job_ids:
+        return
+    with conn.cursor() as cur:
+        cur.execute("UPDATE jobs SET heartbeat_at = now() WHERE id = ANY(%s) AND locked_by = %s",
+                    (list(job_ids), worker_id))
+
+
+def succeed(conn, job_id, worker_id, result=None):
+    """Marks the job succeeded with ``result`` and drops its input files."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE jobs
+            SET status = 'succeeded', result = %s, error = NULL, locked_by = NULL, finished_at = now(),
+                progress_done = COALESCE(progress_total, progress_done)
+            WHERE id = %s AND locked_by = %s
+        """, (Json(result or {}), job_id, worker_id))
+        cur.execute("DELETE FROM job_files WHERE job_id = %s AND name LIKE 'input%%'", (job_id,))
+
+
+def fail(conn, job_id, worker_id, error, retry=True):
+    """Requeues the job with backoff, or marks it failed once attempts run out (or ``retry`` is false).
+
+    Returns the new status.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT attempts FROM jobs WHERE id = %s", (job_id,))
+        row = cur.fetchone()
+        delay = retry_delay(row[0] if row else 1)
+        cur.execute("""
+            UPDATE jobs
+            SET status = CASE WHEN %(retry)s AND attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+                run_after = now() + make_interval(secs => %(delay)s),
+                error = %(error)s, locked_by = NULL, heartbeat_at = NULL
+            WHERE id = %(id)s AND locked_by = %(worker)s
+            RETURNING status
+        """, {'retry': retry, 'delay': delay, 'error': error, 'id': job_id, 'worker': worker_id})
+        row = cur.fetchone()
+        if row and row[0] == 'failed':
+            cur.execute("UPDATE jobs SET finished_at = now() WHERE id = %s", (job_id,))
+            cur.execute("DELETE FROM job_files WHERE job_id = %s", (job_id,))
+    return row[0] if row else None
+
+
+def mark_cancelled(conn, job_id, worker_id):
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE jobs SET status = 'cancelled', locked_by = NULL, finished_at = now(), message = NULL
+            WHERE id = %s AND locked_by = %s
+        """, (job_id, worker_id))
+        cur.execute("DELETE FROM job_files WHERE job_id = %s", (job_id,))
+
+
+def requeue_stale(conn, stale_after):
+    """Returns running jobs whose worker stopped heartbeating ``stale_after`` seconds ago to the queue.
+
+    Such a job counts the lost run as an attempt; without attempts left it
+    is failed, and one whose owner asked to cancel is cancelled. Returns the
+    ids of the jobs touched.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE jobs
+            SET status = CASE WHEN cancel_requested THEN 'cancelled'
+                              WHEN attempts < max_attempts THEN 'queued'
+                              ELSE 'failed' END,
+                error = 'Worker berhenti saat menjalankan tugas ini.',
+                locked_by = NULL, heartbeat_at = NULL, run_after = now(),
+                finished_at = CASE WHEN cancel_requested OR attempts >= max_attempts THEN now() END
+            WHERE status = 'running' AND heartbeat_at < now() - make_interval(secs => %s)
+            RETURNING id
+        """, (stale_after,))
+        return [row[0] for row in cur.fetchall()]
+
+
+def prune(conn, retention_days):
+    """Deletes finished jobs (and their files) older than ``retention_days``; returns how many."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            DELETE FROM jobs
+            WHERE finished_at < now() - make_interval(days => %s)
+        """, (retention_days,))
+        return cur.rowcount
+
+
+def write_file(conn, job_id, name, fileobj):
+    """Stores a binary file object as job file ``name`` in FILE_CHUNK_SIZE rows; returns its size."""
+    size = 0
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM job_files WHERE job_id = %s AND name = %s", (job_id, name))
+        seq = 0
+        while True:
+            chunk = fileobj.read(FILE_CHUNK_SIZE)
+            if not chunk:
+                break
+            cur.execute("INSERT INTO job_files (job_id, name, seq, data) VALUES (%s, %s, %s, %s)",
+                        (job_id, name, seq, psycopg2.Binary(chunk)))
+            size += len(chunk)
+            seq += 1
+    return size
+
+
+def iter_file(conn, job_id, name):
+    """Yields the chunks of job file ``name`` in order, a few rows in memory at a time."""
+    cur = conn.cursor(name=f'job_file_{job_id}')
+    cur.itersize = 4
+    try:
+        cur.execute("SELECT data FROM job_files WHERE job_id = %s AND name = %s ORDER BY seq", (job_id, name))
+        for (data,) in cur:
+            yield bytes(data)
+    finally:
+        cur.close()
+
+
+def save_file(conn, job_id, name, path):
+    """Writes job file ``name`` to ``path``; returns False when the job has no such file."""
+    found = False
+    with open(path, 'wb') as fh:
+        for chunk in iter_file(conn, job_id, name):
+            fh.write(chunk)
+            found = True
+    return found
@@ -0,0 +1,229 @@
+"""Logging setup: records are queued on the request thread and written by a listener thread.
+
+Configured per environment through APP_ENV (``production`` or
+``development``, the default) with overrides, all read and checked by
+config.load() and passed to configure():
+
+    LOG_LEVEL           root level (production: INFO, development: DEBUG)
+    LOG_FORMAT          ``json`` (production default) or ``text``
+    LOG_FILE            also write to this file (stderr is always used)
+    LOG_ACCESS_SAMPLE   fraction of ordinary requests that get an access line
+                        (production: 0.1, development: 1); errors and slow
+                        requests are always logged
+    LOG_RATE_LIMIT      identical ERROR/WARNING records (same call site and
+    LOG_RATE_WINDOW     exception type) allowed per window of seconds before
+                        the rest are suppressed and summarised (5 per 60 s)
+    LOG_QUEUE_SIZE      records buffered before new ones are dropped (10000)
+    SLOW_REQUEST_MS     requests at least this slow always get an access line (1000)
+
+Every record carries the request id (X-Request-ID, or a generated one),
+user id, endpoint and method of the request it was logged in.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request, session
+
+access_log = logging.getLogger('petani_app.access')
+
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+ENV_DEFAULTS = {
+    'production': {'level': 'INFO', 'format': 'json', 'access_sample': 0.1},
+    'development': {'level': 'DEBUG', 'format': 'text', 'access_sample': 1.0},
+}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; request context and ``extra=`` fields become keys."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith('_') and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s - %(levelname)s - [%(request_id)s] %(message)s')
+
+    def format(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = '-'
+        return super().format(record)
+
+
+class RateLimitFilter(logging.Filter):
+    """Passes at most ``limit`` WARNING+ records per call site and exception type per ``window``.
+
+    During a database outage every request logs the same error; after the
+    first few, the rest are counted and reported once per window instead.
+    """
+
+    def __init__(self, limit=5, window=60.0):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._lock = threading.Lock()
+        self._state = {}  # key -> [window_start, passed, suppressed]
+
+    def filter(self, record):
+        if self.limit <= 0 or record.levelno < logging.WARNING:
+            return True
+        exc_type = record.exc_info[0].__name__ if record.exc_info and record.exc_info[0] else ''
+        key = (record.name, record.pathname, record.lineno, exc_type)
+        now = time.monotonic()
+        with self._lock:
+            state = self._state.get(key)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state else 0
+                self._state[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed_before = suppressed
+                return True
+            if state[1] < self.limit:
+                state[1] += 1
+                return True
+            state[2] += 1
+            return False
+
+
+class RequestQueueHandler(logging.handlers.QueueHandler):
+    """Attaches request context and enqueues without blocking or formatting.
+
+    Tracebacks are formatted by the listener thread, not here. When the
+    queue is full the record is dropped and counted.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            record.user_id = session.get('user_id')
+            record.endpoint = request.endpoint
+            record.method = request.method
+            record.path = request.path
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_state = {'handler': None, 'listener': None, 'targets': [],
+          'access_sample': ENV_DEFAULTS['development']['access_sample'], 'slow_request_ms': 1000.0}
+
+
+def _start_listener():
+    handler = _state['handler']
+    handler.queue = queue.Queue(maxsize=handler.queue.maxsize)
+    listener = logging.handlers.QueueListener(handler.queue, *_state['targets'], respect_handler_level=True)
+    listener.start()
+    _state['listener'] = listener
+
+
+def _stop_listener():
+    listener = _state['listener']
+    if listener is not None:
+        listener.stop()
+        _state['listener'] = None
+
+
+def configure(settings):
+    """Installs the queue handler on the root logger from config.load() ``settings``. Safe to call more than once."""
+    defaults = ENV_DEFAULTS.get(settings['APP_ENV'], ENV_DEFAULTS['development'])
+    level = settings['LOG_LEVEL'] or defaults['level']
+    formatter = JsonFormatter() if (settings['LOG_FORMAT'] or defaults['format']) == 'json' else TextFormatter()
+
+    targets = [logging.StreamHandler(sys.stderr)]
+    if settings['LOG_FILE']:
+        targets.append(logging.FileHandler(settings['LOG_FILE'], encoding='utf-8'))
+    for target in targets:
+        target.setFormatter(formatter)
+
+    _stop_listener()
+    handler = RequestQueueHandler(queue.Queue(maxsize=settings['LOG_QUEUE_SIZE']))
+    handler.addFilter(RateLimitFilter(limit=settings['LOG_RATE_LIMIT'], window=settings['LOG_RATE_WINDOW']))
+    root = logging.getLogger()
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+    access_sample = settings['LOG_ACCESS_SAMPLE']
+    _state.update(handler=handler, targets=targets,
+                  access_sample=defaults['access_sample'] if access_sample is None else access_sample,
+                  slow_request_ms=settings['SLOW_REQUEST_MS'])
+    _start_listener()
+    return handler
+
+
+def _after_fork():
+    if _state['handler'] is not None:
+        _start_listener()
+
+
+# A listener thread does not survive fork (gunicorn --preload); start a fresh
+# one with a fresh queue in every child.
+os.register_at_fork(after_in_child=_after_fork)
+atexit.register(_stop_listener)
+
+
+def dropped():
+    handler = _state['handler']
+    return handler.dropped if handler else 0
+
+
+def init_app(app):
+    """Assigns request ids and writes a sampled access line with the duration of each request."""
+    app.logger.setLevel(logging.NOTSET)
+    sample = _state['access_sample']
+    slow_request_ms = _state['slow_request_ms']
+
+    @app.before_request
+    def _assign_request_id():
+        incoming = request.headers.get('X-Request-ID', '')
+        g.request_id = incoming[:64] if incoming.isprintable() and incoming else uuid.uuid4().hex
+        g.log_started = time.perf_counter()
+
+    @app.after_request
+    def _access_log(response):
+        response.headers['X-Request-ID'] = g.get('request_id', '')
+        started = g.get('log_started')
+        if started is None:
+            return response
+        duration_ms = round((time.perf_counter() - started) * 1000, 1)
+        slow = duration_ms >= slow_request_ms
+        if response.status_code >= 500 or slow or random.random() < sample:
+            access_log.info("%s %s %s", request.method, request.path, response.status_code, extra={
+                'status': response.status_code, 'duration_ms': duration_ms,
+                'queries': g.get('query_count'), 'sampled': not (response.status_code >= 500 or slow),
+            })
+        return response
@@ -1,10 +1,15 @@
-from flask import Flask, render_template
+"""Development server for the real application (same app as gunicorn serves).
 
-app = Flask(__name__)
+    python main.py
 
-@app.route('/')
-def home():
-    return render_template("dashboard.html")  # atau ganti sesuai halaman utama
+Kept for platforms and habits that look for main.py; it used to be a
+separate Flask app that only rendered the dashboard template.
+"""
+import os
+
+from app import create_app
+
+app = create_app()
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5001)), debug=True)
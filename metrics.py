@@ -0,0 +1,230 @@
+"""Request and query instrumentation exposed in Prometheus text format.
+
+Everything here is per process: with several gunicorn workers each scrape of
+/metrics reports the worker that answered it (the pool and cache series
+carry a ``pid`` label to tell them apart). Kept dependency-free on purpose;
+the exposition format is small.
+"""
+import logging
+import threading
+import time
+
+import psycopg2.extensions
+from flask import g, has_app_context, has_request_context, request
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+MAX_LOGGED_SQL = 2000
+
+slow_log = logging.getLogger('petani_app.slow')
+
+
+# Thresholds in seconds (SLOW_QUERY_MS / SLOW_REQUEST_MS, set by init_app);
+# 0 disables the corresponding slow log.
+SLOW_QUERY_SECONDS = 0.2
+SLOW_REQUEST_SECONDS = 1.0
+
+# Query parameters and URL query strings can hold NIKs, phone numbers and
+# password hashes (/petani/search?q=3275...), so the slow-query log leaves
+# out parameters and the slow-request log leaves out query strings unless
+# SLOW_QUERY_LOG_PARAMS is set.
+LOG_QUERY_PARAMS = False
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._values = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, entry in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, entry):
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', bound)])} {count}")
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', '+Inf')])} {entry[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {round(entry[-2], 6)}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {entry[-1]}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    'petani_request_duration_seconds', 'Time to produce a response, per Flask endpoint.',
+    ('endpoint', 'method', 'status'))
+QUERY_SECONDS = Histogram(
+    'petani_db_query_duration_seconds', 'Time spent in cursor.execute, per Flask endpoint.',
+    ('endpoint',))
+QUERIES_PER_REQUEST = Histogram(
+    'petani_db_queries_per_request', 'Number of statements executed by one request.',
+    ('endpoint',), buckets=QUERY_COUNT_BUCKETS)
+ACQUIRE_SECONDS = Histogram(
+    'petani_db_acquire_duration_seconds', 'Time to check a connection out of the pool.')
+SLOW_QUERIES = Counter(
+    'petani_db_slow_queries_total', 'Statements slower than SLOW_QUERY_MS.', ('endpoint',))
+SLOW_REQUESTS = Counter(
+    'petani_slow_requests_total', 'Requests slower than SLOW_REQUEST_MS.', ('endpoint',))
+
+REGISTRY = [REQUEST_SECONDS, QUERY_SECONDS, QUERIES_PER_REQUEST, ACQUIRE_SECONDS,
+            SLOW_QUERIES, SLOW_REQUESTS]
+
+
+def _endpoint():
+    if has_request_context():
+        return request.endpoint or 'unknown'
+    return 'none'
+
+
+def _shorten(text):
+    text = text if isinstance(text, str) else repr(text)
+    if len(text) > MAX_LOGGED_SQL:
+        return text[:MAX_LOGGED_SQL] + f"... ({len(text)} chars)"
+    return text
+
+
+class TimedCursor(psycopg2.extensions.cursor):
+    """Cursor that times every execute/executemany and counts it against the current request.
+
+    Installed on pooled connections through ``cursor_factory``, so library
+    helpers such as execute_values are covered as well.
+    """
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            _record_query(time.perf_counter() - start, query, vars)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            _record_query(time.perf_counter() - start, query, '<executemany>')
+
+
+def _record_query(seconds, query, params):
+    endpoint = _endpoint()
+    QUERY_SECONDS.observe(seconds, endpoint=endpoint)
+    if has_app_context():
+        g.query_count = g.get('query_count', 0) + 1
+        g.query_seconds = g.get('query_seconds', 0.0) + seconds
+    if SLOW_QUERY_SECONDS and seconds >= SLOW_QUERY_SECONDS:
+        SLOW_QUERIES.inc(endpoint=endpoint)
+        if isinstance(query, bytes):
+            query = query.decode('utf-8', 'replace')
+        sql = _shorten(' '.join(str(query).split()))
+        if LOG_QUERY_PARAMS:
+            slow_log.warning("slow query %.1f ms endpoint=%s sql=%s params=%s",
+                             seconds * 1000, endpoint, sql, _shorten(params))
+        else:
+            slow_log.warning("slow query %.1f ms endpoint=%s sql=%s", seconds * 1000, endpoint, sql)
+
+
+def observe_acquire(seconds):
+    ACQUIRE_SECONDS.observe(seconds)
+    if has_app_context():
+        g.db_acquire_seconds = g.get('db_acquire_seconds', 0.0) + seconds
+
+
+def init_app(app, log_query_params=False, slow_query_ms=200.0, slow_request_ms=1000.0):
+    """Times every request and records its query count; logs requests slower than SLOW_REQUEST_MS."""
+    global LOG_QUERY_PARAMS, SLOW_QUERY_SECONDS, SLOW_REQUEST_SECONDS
+    LOG_QUERY_PARAMS = log_query_params
+    SLOW_QUERY_SECONDS = slow_query_ms / 1000.0
+    SLOW_REQUEST_SECONDS = slow_request_ms / 1000.0
+
+    @app.before_request
+    def _start_timer():
+        g.request_started = time.perf_counter()
+        g.query_count = 0
+        g.query_seconds = 0.0
+
+    @app.after_request
+    def _record_request(response):
+        started = g.get('request_started')
+        if started is None:
+            return response
+        # Streamed responses are measured up to the first byte.
+        seconds = time.perf_counter() - started
+        endpoint = request.endpoint or 'unknown'
+        REQUEST_SECONDS.observe(seconds, endpoint=endpoint, method=request.method,
+                                status=response.status_code)
+        QUERIES_PER_REQUEST.observe(g.get('query_count', 0), endpoint=endpoint)
+        if SLOW_REQUEST_SECONDS and seconds >= SLOW_REQUEST_SECONDS:
+            SLOW_REQUESTS.inc(endpoint=endpoint)
+            path = request.full_path.rstrip('?') if LOG_QUERY_PARAMS else request.path
+            slow_log.warning("slow request %.1f ms %s %s endpoint=%s status=%s queries=%d "
+                             "query_ms=%.1f acquire_ms=%.1f",
+                             seconds * 1000, request.method, path, endpoint,
+                             response.status_code, g.get('query_count', 0),
+                             g.get('query_seconds', 0.0) * 1000,
+                             g.get('db_acquire_seconds', 0.0) * 1000)
+        return response
+
+
+def gauge_lines(name, help, samples, kind='gauge'):
+    """Renders ``samples`` (list of (labels dict, value)) as one Prometheus metric family."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        if value is None:
+            continue
+        lines.append(f"{name}{_labels(labels.keys(), labels.values())} {value}")
+    return lines
+
+
+def render(extra_lines=()):
+    """Returns the Prometheus text exposition of every registered metric plus ``extra_lines``."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.extend(extra_lines)
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,312 @@
+"""Applies the versioned SQL files in db/migrations and reports index usage.
+
+    python migrate.py              # apply pending migrations
+    python migrate.py status       # list applied / pending migrations
+    python migrate.py explain      # EXPLAIN every route query, check its index
+    python migrate.py explain --json --force-index
+
+Migrations are applied in filename order and recorded in schema_migrations
+together with a checksum, so an edited migration is reported instead of
+silently skipped. A file whose first line is ``-- migrate: no-transaction``
+runs statement by statement outside a transaction (needed for
+CREATE INDEX CONCURRENTLY); everything else runs in one transaction.
+
+A failed CREATE INDEX CONCURRENTLY leaves an invalid index behind that
+IF NOT EXISTS would then accept. Such leftovers are dropped before the
+statement runs, and a migration is only recorded once every index it
+creates concurrently is valid.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from datetime import date
+
+import psycopg2
+
+import analitik
+import db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'db', 'migrations')
+ADVISORY_LOCK_ID = 724_519_001  # arbitrary, shared by every migrate.py run
+NO_TRANSACTION_MARKER = '-- migrate: no-transaction'
+CONCURRENT_INDEX_RE = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)", re.IGNORECASE)
+
+# Representative queries of each route, with the index (or indexes, as a
+# tuple) they are expected to use. Parameters are filled from the user who
+# owns the most petani rows.
+ROUTE_QUERIES = [
+    ('dashboard', analitik.DASHBOARD_SQL,
+     ('petani_user_id_idx', 'komoditas_petani_id_tanggal_tanam_idx',
+      'rekap_panen_bulanan_user_bulan_idx', 'sync_log_user_txid_idx')),
+    ('filter petani di riwayat', "SELECT id, nama FROM petani WHERE user_id = %(user_id)s",
+     'petani_user_id_idx'),
+    ('cari_petani (typeahead)', """
+        SELECT id FROM petani
+        WHERE user_id = %(user_id)s
+          AND (nama ILIKE '%%sur%%' OR nik LIKE '%%sur%%' OR alamat ILIKE '%%sur%%' OR 'sur' <%% nama)
+     """, 'petani_nama_trgm'),
+    ('riwayat_petani', """
+        SELECT id, nama, nik, tanggal_lahir, no_telpon, alamat, luas_lahan FROM petani
+        WHERE user_id = %(user_id)s ORDER BY id ASC LIMIT 51
+     """, 'petani_user_id_idx'),
+    ('edit_petani', """
+        SELECT id, nama, nik, tanggal_lahir, no_telpon, alamat, lokasi_point, ST_AsText(lahan_geom), luas_lahan
+        FROM petani WHERE id = %(petani_id)s AND user_id = %(user_id)s
+     """, 'petani_pkey'),
+    ('riwayat_komoditas', """
+        SELECT k.id, p.nama, k.nama_komoditas, k.luas_lahan, k.tanggal_tanam
+        FROM komoditas k JOIN petani p ON k.petani_id = p.id
+        WHERE p.user_id = %(user_id)s
+        ORDER BY k.tanggal_tanam DESC NULLS LAST, p.nama ASC NULLS LAST, k.id ASC LIMIT 51
+     """, 'komoditas_petani_id_tanggal_tanam_idx'),
+    ('riwayat_hasil_panen', """
+        SELECT h.id, p.nama, h.nama_komoditas, h.jumlah, h.tanggal_panen
+        FROM hasil_panen h JOIN petani p ON h.petani_id = p.id
+        WHERE p.user_id = %(user_id)s
+        ORDER BY h.tanggal_panen DESC NULLS LAST, p.nama ASC NULLS LAST, h.id ASC LIMIT 51
+     """, 'hasil_panen_petani_id_tanggal_panen_idx'),
+    ('petani_tiles', """
+        SELECT id FROM petani
+        WHERE user_id = %(user_id)s
+          AND lahan_geom && ST_Transform(ST_TileEnvelope(14, 13368, 8706), 4326)
+     """, 'petani_lahan_geom_gist'),
+    ('lokasi_point (spasial)', """
+        SELECT id FROM petani
+        WHERE lokasi_point && ST_MakeEnvelope(113.6, -8.2, 113.8, -8.1, 4326)
+     """, 'petani_lokasi_point_gist'),
+    ('petani_terdekat', """
+        SELECT id FROM petani
+        WHERE user_id = %(user_id)s AND lokasi_point IS NOT NULL
+        ORDER BY lokasi_point <-> ST_SetSRID(ST_MakePoint(113.69, -8.17), 4326) LIMIT 20
+     """, 'petani_user_lokasi_point_gist'),
+    ('petani_dalam_poligon', """
+        SELECT id FROM petani
+        WHERE user_id = %(user_id)s
+          AND ST_Intersects(lahan_geom, ST_MakeEnvelope(113.6, -8.2, 113.8, -8.1, 4326))
+     """, 'petani_user_lahan_geom_gist'),
+    ('cek tumpang tindih (form/edit petani)', """
+        SELECT id FROM petani
+        WHERE ST_Intersects(lahan_geom, ST_MakeEnvelope(113.69, -8.18, 113.70, -8.17, 4326))
+     """, 'petani_lahan_geom_gist'),
+    ('worker: ambil tugas', """
+        SELECT id FROM jobs
+        WHERE status = 'queued' AND run_after <= now()
+        ORDER BY run_after, id LIMIT 1
+     """, 'jobs_antrian_idx'),
+    ('daftar tugas pengguna', """
+        SELECT id FROM jobs WHERE user_id = %(user_id)s ORDER BY id DESC LIMIT 20
+     """, 'jobs_user_idx'),
+]
+
+
+def migration_files():
+    return sorted(f for f in os.listdir(MIGRATIONS_DIR) if f.endswith('.sql'))
+
+
+def _read(name):
+    with open(os.path.join(MIGRATIONS_DIR, name), encoding='utf-8') as fh:
+        return fh.read()
+
+
+def _checksum(sql):
+    return hashlib.sha256(sql.encode('utf-8')).hexdigest()
+
+
+def _split_statements(sql):
+    """Splits a no-transaction migration on ``;`` at end of line (no function bodies allowed)."""
+    statements, current = [], []
+    for line in sql.splitlines():
+        if line.strip().startswith('--') and not current:
+            continue
+        current.append(line)
+        if line.rstrip().endswith(';'):
+            statement = '\n'.join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+    tail = '\n'.join(current).strip()
+    if tail:
+        statements.append(tail)
+    return statements
+
+
+class MigrationError(RuntimeError):
+    """A migration ran but left the schema unusable; it is not recorded as applied."""
+
+
+def _invalid_indexes(cur, names):
+    cur.execute("""
+        SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE NOT i.indisvalid AND c.relname = ANY(%s) AND pg_table_is_visible(c.oid)
+    """, (list(names),))
+    return [row[0] for row in cur.fetchall()]
+
+
+def _run_without_transaction(cur, sql):
+    """Runs a no-transaction migration; raises MigrationError if a concurrent index ends up invalid."""
+    created = []
+    for statement in _split_statements(sql):
+        match = CONCURRENT_INDEX_RE.search(statement)
+        if match:
+            name = match.group(1)
+            created.append(name)
+            if _invalid_indexes(cur, [name]):
+                cur.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+        cur.execute(statement)
+    invalid = _invalid_indexes(cur, created) if created else []
+    if invalid:
+        raise MigrationError(f"Indeks tidak valid setelah CREATE INDEX CONCURRENTLY: {', '.join(invalid)}")
+
+
+def ensure_table(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version TEXT PRIMARY KEY,
+                checksum TEXT NOT NULL,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+        """)
+    conn.commit()
+
+
+def applied_migrations(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT version, checksum FROM schema_migrations")
+        return dict(cur.fetchall())
+
+
+def apply_pending(conn, out=sys.stdout):
+    ensure_table(conn)
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s)", (ADVISORY_LOCK_ID,))
+    conn.commit()
+    try:
+        applied = applied_migrations(conn)
+        for name in migration_files():
+            sql = _read(name)
+            checksum = _checksum(sql)
+            if name in applied:
+                if applied[name] != checksum:
+                    print(f"PERINGATAN: {name} berubah sejak diterapkan", file=out)
+                continue
+
+            print(f"Menerapkan {name} ...", file=out)
+            if sql.lstrip().startswith(NO_TRANSACTION_MARKER):
+                conn.autocommit = True
+                try:
+                    with conn.cursor() as cur:
+                        _run_without_transaction(cur, sql)
+                        cur.execute("INSERT INTO schema_migrations (version, checksum) VALUES (%s, %s)",
+                                    (name, checksum))
+                finally:
+                    conn.autocommit = False
+            else:
+                try:
+                    with conn.cursor() as cur:
+                        cur.execute(sql)
+                        cur.execute("INSERT INTO schema_migrations (version, checksum) VALUES (%s, %s)",
+                                    (name, checksum))
+                    conn.commit()
+                except psycopg2.Error:
+                    conn.rollback()
+                    raise
+    finally:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (ADVISORY_LOCK_ID,))
+        conn.commit()
+
+
+def status(conn, out=sys.stdout):
+    ensure_table(conn)
+    applied = applied_migrations(conn)
+    for name in migration_files():
+        if name not in applied:
+            state = 'tertunda'
+        elif applied[name] != _checksum(_read(name)):
+            state = 'diterapkan (berubah!)'
+        else:
+            state = 'diterapkan'
+        print(f"{name:50} {state}", file=out)
+
+
+def _plan_indexes(node, found):
+    if 'Index Name' in node:
+        found.append(node['Index Name'])
+    if node.get('Node Type') == 'Seq Scan':
+        found.append(f"Seq Scan on {node.get('Relation Name')}")
+    for child in node.get('Plans', []):
+        _plan_indexes(child, found)
+    return found
+
+
+def explain_report(conn, force_index=False):
+    """Runs EXPLAIN for every ROUTE_QUERIES entry and returns one dict per route.
+
+    With ``force_index`` sequential scans are disabled, which shows whether the
+    index *can* serve the query on a small development dataset where the
+    planner would rightly prefer a sequential scan.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT p.user_id, min(p.id) FROM petani p
+            GROUP BY p.user_id ORDER BY count(*) DESC LIMIT 1
+        """)
+        row = cur.fetchone()
+        params = {'user_id': row[0] if row else 0, 'petani_id': row[1] if row else 0}
+        params.update(analitik.dashboard_params(params['user_id'], date.today()))
+
+        if force_index:
+            cur.execute("SET LOCAL enable_seqscan = off")
+
+        report = []
+        for route, sql, expected in ROUTE_QUERIES:
+            cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cur.fetchone()[0][0]['Plan']
+            used = _plan_indexes(plan, [])
+            expected = (expected,) if isinstance(expected, str) else expected
+            report.append({
+                'route': route,
+                'expected_index': ', '.join(expected),
+                'plan_nodes': used,
+                'uses_expected_index': all(name in used for name in expected),
+                'total_cost': plan.get('Total Cost'),
+            })
+    conn.rollback()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', nargs='?', default='up', choices=['up', 'status', 'explain'])
+    parser.add_argument('--json', action='store_true', help='print the explain report as JSON')
+    parser.add_argument('--force-index', action='store_true', help='disable seq scans while explaining')
+    args = parser.parse_args(argv)
+
+    conn = psycopg2.connect(**db.connection_kwargs())
+    try:
+        if args.command == 'up':
+            apply_pending(conn)
+        elif args.command == 'status':
+            status(conn)
+        else:
+            report = explain_report(conn, force_index=args.force_index)
+            if args.json:
+                print(json.dumps(report, indent=2))
+            else:
+                for item in report:
+                    mark = 'OK ' if item['uses_expected_index'] else 'GAGAL'
+                    print(f"[{mark}] {item['route']:35} {item['expected_index']:45} {', '.join(item['plan_nodes'])}")
+            if not all(item['uses_expected_index'] for item in report):
+                return 1
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,184 @@
+import base64
+import json
+from datetime import date, datetime
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 500
+STREAM_BATCH_SIZE = 1000
+
+
+def encode_cursor(values):
+    """Encodes the sort key of the last row on a page as an opaque URL-safe token."""
+    def _plain(v):
+        if isinstance(v, (date, datetime)):
+            return v.isoformat()
+        return v
+    raw = json.dumps([_plain(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, length):
+    """Decodes a token from encode_cursor. Returns None for missing or malformed tokens."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except (ValueError, UnicodeError):
+        return None
+    if not isinstance(values, list) or len(values) != length:
+        return None
+    return values
+
+
+def parse_per_page(value, default=DEFAULT_PER_PAGE):
+    try:
+        per_page = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(per_page, MAX_PER_PAGE))
+
+
+def parse_date(value):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+def parse_filters(args):
+    """Reads the history-page filters (date range, komoditas, petani) from request args."""
+    petani_id = args.get('petani_id', type=int)
+    komoditas = (args.get('komoditas') or '').strip()
+    return {
+        'dari': parse_date(args.get('dari')),
+        'sampai': parse_date(args.get('sampai')),
+        'komoditas': komoditas or None,
+        'petani_id': petani_id,
+    }
+
+
+def keyset_condition(order_by, values):
+    """Builds the WHERE fragment selecting rows strictly after ``values``.
+
+    ``order_by`` is a list of (sql_expression, direction) pairs matching the
+    query's ORDER BY; the last pair must be unique (normally the id).
+    Mixed directions are expanded into the equivalent OR-chain:
+    (a < x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z).
+
+    Columns that may be NULL must be ordered 'ASC NULLS LAST' or 'DESC NULLS
+    LAST': NULLs then come after every value, so "after x" also matches
+    NULL, nothing but NULL ties with NULL, and nothing comes after it.
+    """
+    def equal(expr, value, params):
+        if value is None:
+            return f"{expr} IS NULL"
+        params.append(value)
+        return f"{expr} = %s"
+
+    clauses = []
+    params = []
+    for i, (expr, direction) in enumerate(order_by):
+        words = direction.upper().split()
+        nulls_last = words[1:] == ['NULLS', 'LAST']
+        value = values[i]
+        if value is None and nulls_last:
+            continue
+        clause_params = []
+        parts = [equal(prev_expr, prev_value, clause_params)
+                 for (prev_expr, _), prev_value in zip(order_by[:i], values)]
+        op = '<' if words[0] == 'DESC' else '>'
+        if nulls_last:
+            parts.append(f"({expr} {op} %s OR {expr} IS NULL)")
+        else:
+            parts.append(f"{expr} {op} %s")
+        clause_params.append(value)
+        clauses.append('(' + ' AND '.join(parts) + ')')
+        params.extend(clause_params)
+    if not clauses:
+        return 'FALSE', params
+    return '(' + ' OR '.join(clauses) + ')', params
+
+
+def order_clause(order_by):
+    return ', '.join(f"{expr} {direction}" for expr, direction in order_by)
+
+
+def fetch_page(conn, select_sql, where, params, order_by, key_of, cursor_token, per_page):
+    """Runs one keyset page of ``select_sql``.
+
+    ``where`` is a list of SQL conditions joined with AND, ``key_of`` maps a
+    row to its sort-key values. Returns (rows, next_cursor); next_cursor is
+    None on the last page.
+    """
+    where = list(where)
+    params = list(params)
+    after = decode_cursor(cursor_token, len(order_by))
+    if after is not None:
+        condition, condition_params = keyset_condition(order_by, after)
+        where.append(condition)
+        params.extend(condition_params)
+
+    sql = select_sql
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {order_clause(order_by)} LIMIT %s"
+    params.append(per_page + 1)
+
+    cur = conn.cursor()
+    try:
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+    finally:
+        cur.close()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(key_of(rows[-1]))
+    return rows, next_cursor
+
+
+class RowStream:
+    """Iterates a query through a server-side (named) cursor.
+
+    Rows are pulled from PostgreSQL ``batch_size`` at a time, so a template
+    rendered with stream_template holds at most one batch in memory. The
+    first row is fetched eagerly so ``{% if rows %}`` works in templates.
+    """
+
+    def __init__(self, conn, name, sql, params, batch_size=STREAM_BATCH_SIZE):
+        self._cur = conn.cursor(name=name)
+        self._cur.itersize = batch_size
+        self._cur.execute(sql, params)
+        self._first = self._cur.fetchone()
+        self.count = 0
+
+    def __bool__(self):
+        return self._first is not None
+
+    def __iter__(self):
+        try:
+            if self._first is None:
+                return
+            self.count += 1
+            yield self._first
+            for row in self._cur:
+                self.count += 1
+                yield row
+        finally:
+            self.close()
+
+    def close(self):
+        if not self._cur.closed:
+            self._cur.close()
+
+
+def stream_rows(conn, name, select_sql, where, params, order_by):
+    sql = select_sql
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {order_clause(order_by)}"
+    return RowStream(conn, name, sql, list(params))
@@ -0,0 +1,118 @@
+"""Typeahead search over the current user's farmers (nama, nik, alamat).
+
+Queries of three characters or more match substrings and, for typos, word
+similarity; both are served by the (user_id, column gin_trgm_ops) indexes
+of migration 0008. Shorter queries only match the start of nama or nik.
+Results are ranked: exact nama/nik, then prefix, then substring, then
+similarity, and at most MAX_RESULTS are returned.
+
+PrefixCache keeps recent answers per user. A result list shorter than
+MAX_RESULTS is complete, so a longer query that extends it ("sur" ->
+"suro") is answered by filtering that list instead of asking the database.
+"""
+MIN_QUERY_LENGTH = 2
+# pg_trgm indexes cannot serve patterns shorter than one trigram.
+TRIGRAM_MIN_LENGTH = 3
+MAX_QUERY_LENGTH = 100
+MAX_RESULTS = 20
+
+SEARCH_SQL = """
+    SELECT id, nama, nik, alamat
+    FROM (
+        SELECT p.id, p.nama, p.nik, p.alamat,
+               CASE WHEN lower(p.nama) = %(q)s OR p.nik = %(q)s THEN 3
+                    WHEN lower(p.nama) LIKE %(prefix)s OR p.nik LIKE %(prefix)s THEN 2
+                    WHEN p.nama ILIKE %(substring)s OR p.nik LIKE %(substring)s THEN 1
+                    ELSE 0 END AS tingkat,
+               word_similarity(%(q)s, p.nama) + 0.5 * word_similarity(%(q)s, p.alamat) AS kemiripan
+        FROM petani p
+        WHERE p.user_id = %(user_id)s
+          AND (p.nama ILIKE %(substring)s OR p.nik LIKE %(substring)s OR p.alamat ILIKE %(substring)s
+               OR %(q)s <%% p.nama)
+    ) r
+    ORDER BY tingkat DESC, kemiripan DESC, nama, id
+    LIMIT %(limit)s
+"""
+
+PREFIX_SQL = """
+    SELECT id, nama, nik, alamat
+    FROM petani p
+    WHERE p.user_id = %(user_id)s AND (lower(p.nama) LIKE %(prefix)s OR p.nik LIKE %(prefix)s)
+    ORDER BY lower(p.nama) = %(q)s DESC, nama, id
+    LIMIT %(limit)s
+"""
+
+
+def normalize(q):
+    """Lower-cased, whitespace-collapsed query, or '' when it is too short to search."""
+    q = ' '.join((q or '').split()).lower()[:MAX_QUERY_LENGTH]
+    return q if len(q) >= MIN_QUERY_LENGTH else ''
+
+
+def _like_escape(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search(conn, user_id, q):
+    """Up to MAX_RESULTS ``{'id', 'nama', 'nik', 'alamat'}`` for a normalized query ``q``."""
+    escaped = _like_escape(q)
+    params = {'user_id': user_id, 'q': q, 'prefix': escaped + '%',
+              'substring': '%' + escaped + '%', 'limit': MAX_RESULTS}
+    with conn.cursor() as cur:
+        cur.execute(SEARCH_SQL if len(q) >= TRIGRAM_MIN_LENGTH else PREFIX_SQL, params)
+        return [{'id': row[0], 'nama': row[1], 'nik': row[2], 'alamat': row[3]} for row in cur.fetchall()]
+
+
+def _tier(row, q):
+    nama = (row['nama'] or '').lower()
+    nik = row['nik'] or ''
+    if q in (nama, nik):
+        return 3
+    if nama.startswith(q) or nik.startswith(q):
+        return 2
+    if q in nama or q in nik:
+        return 1
+    return 0
+
+
+def narrow(rows, q):
+    """The rows of a complete prefix result that still match ``q``, re-tiered like SEARCH_SQL."""
+    matches = [row for row in rows
+               if q in (row['nama'] or '').lower() or q in (row['nik'] or '')
+               or q in (row['alamat'] or '').lower()]
+    # sorted() is stable: within a tier the prefix query's similarity order is kept.
+    return sorted(matches, key=lambda row: -_tier(row, q))
+
+
+class PrefixCache:
+    """Search results per (scope, query) on top of a cache.Cache.
+
+    ``scope`` should change whenever the user's farmers change (user id plus
+    data version), so stale entries are never read and simply expire.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def _key(self, scope, q):
+        return f"{scope}|{q}"
+
+    def get(self, scope, q):
+        entry = self.store.get(self._key(scope, q))
+        if entry is not None:
+            return entry['hasil']
+        # Only substring results can be narrowed; prefix-only answers for
+        # short queries miss rows that contain q further in.
+        for end in range(len(q) - 1, TRIGRAM_MIN_LENGTH - 1, -1):
+            entry = self.store.get(self._key(scope, q[:end]))
+            if entry is None:
+                continue
+            if not entry['lengkap']:
+                return None
+            rows = narrow(entry['hasil'], q)
+            # Typos only match by similarity, which narrowing cannot reproduce.
+            return rows or None
+        return None
+
+    def set(self, scope, q, rows):
+        self.store.set(self._key(scope, q), {'hasil': rows, 'lengkap': len(rows) < MAX_RESULTS})
@@ -0,0 +1,179 @@
+"""Spatial queries over petani.lokasi_point / petani.lahan_geom, answered as GeoJSON.
+
+Every per-user query filters on user_id and a geometry operator together so
+the (user_id, geometry) GiST indexes of migration 0007 serve both at once;
+the overlap check spans all users and uses the plain lahan_geom index.
+"""
+import math
+
+import geometri
+
+MAX_K = 100
+MAX_RADIUS_M = 50000
+MAX_RESULTS = 500
+# Intersections smaller than this (m²) are shared edges or digitising noise, not overlaps.
+MIN_OVERLAP_M2 = 1.0
+# Metres per degree of latitude; longitude degrees shrink by cos(latitude).
+M_PER_DEGREE = 111320.0
+
+
+class SpatialInputError(ValueError):
+    """A coordinate, distance or geometry parameter is missing or out of range."""
+
+
+def parse_point(lat, lon):
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        raise SpatialInputError("lat dan lon wajib berupa angka")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise SpatialInputError("lat/lon di luar jangkauan")
+    return lat, lon
+
+
+def parse_geometry(payload, fmt=None):
+    """Returns (sql_fragment, param) for a polygon in any geometri.INPUT_FORMATS.
+
+    The geometry is repaired with ST_MakeValid, like the petani trigger does.
+    """
+    try:
+        geom_sql, param = geometri.parse(payload, fmt)
+    except geometri.GeometryInputError as e:
+        raise SpatialInputError(str(e))
+    return f"ST_MakeValid({geom_sql})", param
+
+
+FEATURE_SQL = """
+    SELECT COALESCE(json_agg(json_build_object(
+               'type', 'Feature',
+               'id', r.id,
+               'geometry', ST_AsGeoJSON({geometry}, 6)::json,
+               'properties', json_build_object(
+                   'nama', r.nama, 'alamat', r.alamat, 'luas_lahan', r.luas_lahan,
+                   'lon', ST_X(r.lokasi_point), 'lat', ST_Y(r.lokasi_point){extra})
+           ) ORDER BY r.urutan), '[]'::json)
+    FROM ({inner}) r
+"""
+
+
+def _collection(cur, inner, params, geometry, extra=''):
+    column = 'r.lahan_geom' if geometry == 'lahan' else 'r.lokasi_point'
+    cur.execute(FEATURE_SQL.format(geometry=column, extra=extra, inner=inner), params)
+    return {'type': 'FeatureCollection', 'features': cur.fetchone()[0]}
+
+
+def nearest(conn, user_id, lat, lon, k=10, geometry='titik'):
+    """The ``k`` farmers whose lokasi_point is closest to (lat, lon), with distance in metres.
+
+    The KNN index scan orders by planar distance in degrees; twice ``k``
+    candidates are re-ranked by geodesic distance so the answer stays right
+    away from the equator.
+    """
+    k = max(1, min(int(k), MAX_K))
+    inner = """
+        SELECT c.*, ST_Distance(c.lokasi_point::geography, q.geom::geography) AS jarak_m,
+               row_number() OVER (ORDER BY ST_Distance(c.lokasi_point::geography, q.geom::geography)) AS urutan
+        FROM (
+            SELECT p.id, p.nama, p.alamat, p.luas_lahan, p.lokasi_point, p.lahan_geom
+            FROM petani p
+            WHERE p.user_id = %(user_id)s AND p.lokasi_point IS NOT NULL
+            ORDER BY p.lokasi_point <-> ST_SetSRID(ST_MakePoint(%(lon)s, %(lat)s), 4326)
+            LIMIT %(candidates)s
+        ) c, (SELECT ST_SetSRID(ST_MakePoint(%(lon)s, %(lat)s), 4326) AS geom) q
+        ORDER BY urutan
+        LIMIT %(k)s
+    """
+    with conn.cursor() as cur:
+        return _collection(cur, inner, {'user_id': user_id, 'lat': lat, 'lon': lon, 'k': k,
+                                        'candidates': 2 * k},
+                           geometry, extra=", 'jarak_m', round(r.jarak_m::numeric, 1)")
+
+
+def within_radius(conn, user_id, lat, lon, radius_m, geometry='titik', limit=MAX_RESULTS):
+    """Farmers whose lokasi_point lies within ``radius_m`` metres of (lat, lon), nearest first.
+
+    A degree-based ST_DWithin that is never smaller than the radius lets the
+    index prefilter; the geography ST_DWithin then applies the exact distance.
+    """
+    try:
+        radius_m = float(radius_m)
+    except (TypeError, ValueError):
+        raise SpatialInputError("meter wajib berupa angka")
+    if not 0 < radius_m <= MAX_RADIUS_M:
+        raise SpatialInputError(f"meter harus antara 0 dan {MAX_RADIUS_M}")
+    inner = """
+        SELECT p.id, p.nama, p.alamat, p.luas_lahan, p.lokasi_point, p.lahan_geom,
+               ST_Distance(p.lokasi_point::geography, q.geom::geography) AS jarak_m,
+               row_number() OVER (ORDER BY ST_Distance(p.lokasi_point::geography, q.geom::geography)) AS urutan
+        FROM petani p, (SELECT ST_SetSRID(ST_MakePoint(%(lon)s, %(lat)s), 4326) AS geom) q
+        WHERE p.user_id = %(user_id)s
+          AND ST_DWithin(p.lokasi_point, q.geom, %(degrees)s)
+          AND ST_DWithin(p.lokasi_point::geography, q.geom::geography, %(radius)s)
+        ORDER BY urutan
+        LIMIT %(limit)s
+    """
+    cos_lat = max(0.01, math.cos(math.radians(lat)))
+    params = {'user_id': user_id, 'lat': lat, 'lon': lon, 'radius': radius_m,
+              'degrees': radius_m / (M_PER_DEGREE * cos_lat), 'limit': limit}
+    with conn.cursor() as cur:
+        return _collection(cur, inner, params, geometry, extra=", 'jarak_m', round(r.jarak_m::numeric, 1)")
+
+
+def within_polygon(conn, user_id, polygon, geometry='titik', limit=MAX_RESULTS, fmt=None):
+    """Farmers whose parcel intersects ``polygon`` (or, without a parcel, whose point lies in it)."""
+    geom_sql, geom_param = parse_geometry(polygon, fmt)
+    inner = f"""
+        SELECT p.id, p.nama, p.alamat, p.luas_lahan, p.lokasi_point, p.lahan_geom,
+               row_number() OVER (ORDER BY p.id) AS urutan
+        FROM petani p, (SELECT {geom_sql} AS geom) q
+        WHERE p.user_id = %(user_id)s
+          AND (ST_Intersects(p.lahan_geom, q.geom)
+               OR (p.lahan_geom IS NULL AND ST_Intersects(p.lokasi_point, q.geom)))
+        ORDER BY urutan
+        LIMIT %(limit)s
+    """
+    with conn.cursor() as cur:
+        return _collection(cur, inner, {'user_id': user_id, 'geom': geom_param, 'limit': limit}, geometry)
+
+
+def overlaps(conn, user_id, polygon, exclude_id=None, fmt=None):
+    """Existing parcels that overlap ``polygon`` by more than MIN_OVERLAP_M2.
+
+    Checked against every user's parcels, because two claims on the same land
+    are a conflict regardless of who entered them, but only the caller's own
+    farmers are named; others are counted. Returns
+    ``{'milik_sendiri': [{'id', 'nama', 'luas_irisan_m2'}], 'milik_lain': int}``.
+    """
+    geom_sql, geom_param = parse_geometry(polygon, fmt)
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT p.id, p.user_id = %(user_id)s, p.nama,
+                   ST_Area(ST_Intersection(p.lahan_geom, q.geom)::geography) AS irisan
+            FROM petani p, (SELECT {geom_sql} AS geom) q
+            WHERE ST_Intersects(p.lahan_geom, q.geom)
+              AND p.id IS DISTINCT FROM %(exclude_id)s
+            LIMIT %(limit)s
+        """, {'user_id': user_id, 'geom': geom_param, 'exclude_id': exclude_id, 'limit': MAX_RESULTS})
+        rows = cur.fetchall()
+    own, others = [], 0
+    for petani_id, is_own, nama, irisan in rows:
+        if irisan is None or irisan < MIN_OVERLAP_M2:
+            continue
+        if is_own:
+            own.append({'id': petani_id, 'nama': nama, 'luas_irisan_m2': round(irisan, 1)})
+        else:
+            others += 1
+    own.sort(key=lambda item: -item['luas_irisan_m2'])
+    return {'milik_sendiri': own, 'milik_lain': others}
+
+
+def overlap_message(result):
+    """Indonesian warning text for an overlaps() result, or None when there is no overlap."""
+    parts = [f"{item['nama']} ({item['luas_irisan_m2']:,.0f} m²)" for item in result['milik_sendiri'][:5]]
+    if len(result['milik_sendiri']) > 5:
+        parts.append(f"{len(result['milik_sendiri']) - 5} petani lain")
+    if result['milik_lain']:
+        parts.append(f"{result['milik_lain']} lahan milik pengguna lain")
+    if not parts:
+        return None
+    return "Lahan ini tumpang tindih dengan: " + ", ".join(parts) + "."
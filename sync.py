@@ -0,0 +1,168 @@
+"""Delta sync for offline clients, read from sync_log (migration 0006).
+
+A cursor is ``<txid>:<change_id>``. Each call returns log entries after the
+cursor whose transaction id is below the snapshot's xmin, i.e. transactions
+that have certainly finished. Transactions still running at that moment have
+a larger txid and are picked up by a later call, so a change is never
+skipped even when transactions commit out of order.
+"""
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+
+TABLES = {
+    'petani': """
+        SELECT id, nama, nik, tanggal_lahir, no_telpon, alamat, luas_lahan,
+               ST_X(lokasi_point), ST_Y(lokasi_point), ST_AsGeoJSON(lahan_geom, 6), updated_at
+        FROM petani WHERE user_id = %s AND id = ANY(%s)
+    """,
+    'komoditas': """
+        SELECT k.id, k.petani_id, k.nama_komoditas, k.luas_lahan, k.tanggal_tanam, k.updated_at
+        FROM komoditas k JOIN petani p ON p.id = k.petani_id
+        WHERE p.user_id = %s AND k.id = ANY(%s)
+    """,
+    'hasil_panen': """
+        SELECT h.id, h.petani_id, h.nama_komoditas, h.jumlah, h.tanggal_panen, h.updated_at
+        FROM hasil_panen h JOIN petani p ON p.id = h.petani_id
+        WHERE p.user_id = %s AND h.id = ANY(%s)
+    """,
+}
+
+FIELDS = {
+    'petani': ('id', 'nama', 'nik', 'tanggal_lahir', 'no_telpon', 'alamat', 'luas_lahan',
+               'lon', 'lat', 'lahan_geojson', 'updated_at'),
+    'komoditas': ('id', 'petani_id', 'nama_komoditas', 'luas_lahan', 'tanggal_tanam', 'updated_at'),
+    'hasil_panen': ('id', 'petani_id', 'nama_komoditas', 'jumlah', 'tanggal_panen', 'updated_at'),
+}
+
+
+class CursorExpired(Exception):
+    """The cursor points before the pruned part of sync_log; the client must resync from scratch."""
+
+
+def parse_cursor(value):
+    """Returns (txid, change_id) for a ``txid:change_id`` string; empty means from the start."""
+    if not value:
+        return 0, 0
+    try:
+        txid, change_id = value.split(':', 1)
+        return int(txid), int(change_id)
+    except ValueError:
+        raise ValueError("cursor tidak valid")
+
+
+def _plain(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if value is not None and not isinstance(value, (int, float, str, bool)):
+        return float(value)
+    return value
+
+
+def changes_since(conn, user_id, cursor, limit=DEFAULT_LIMIT):
+    """Returns the next batch of changes for ``user_id`` after ``cursor``.
+
+    Result: ``{'upserts': {table: [row, ...]}, 'deletes': {table: [id, ...]},
+    'cursor': str, 'has_more': bool}``. Several log entries for the same row
+    collapse into one upsert with the row's current state, or one delete.
+    """
+    since_txid, since_change = parse_cursor(cursor)
+    limit = max(1, min(int(limit), MAX_LIMIT))
+
+    with conn.cursor() as cur:
+        cur.execute("SELECT pruned_before::text::bigint FROM sync_log_watermark")
+        row = cur.fetchone()
+        if row and cursor and since_txid < row[0]:
+            raise CursorExpired()
+
+        cur.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+        horizon = cur.fetchone()[0]
+
+        cur.execute("""
+            SELECT txid::text::bigint, change_id, table_name, row_id, op
+            FROM sync_log
+            WHERE user_id = %s
+              AND (txid, change_id) > (%s::text::xid8, %s)
+              AND txid < %s::text::xid8
+            ORDER BY txid, change_id
+            LIMIT %s
+        """, (user_id, str(since_txid), since_change, str(horizon), limit + 1))
+        entries = cur.fetchall()
+
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+        if entries:
+            last_txid, last_change = entries[-1][0], entries[-1][1]
+            next_cursor = f"{last_txid}:{last_change}"
+        else:
+            last_txid, last_change = since_txid, since_change
+            next_cursor = cursor or f"{since_txid}:{since_change}"
+        if not has_more:
+            # Everything below the horizon has been delivered; jump to it so the
+            # next call starts scanning at still-unseen transactions.
+            next_cursor = f"{max(horizon, last_txid)}:{0 if horizon > last_txid else last_change}"
+
+        latest = {}
+        for _, _, table_name, row_id, op in entries:
+            latest[(table_name, row_id)] = op
+
+        upserts = {table: [] for table in TABLES}
+        deletes = {table: [] for table in TABLES}
+        wanted = {table: [] for table in TABLES}
+        for (table_name, row_id), op in latest.items():
+            if table_name not in TABLES:
+                continue
+            if op == 'd':
+                deletes[table_name].append(row_id)
+            else:
+                wanted[table_name].append(row_id)
+
+        for table, ids in wanted.items():
+            if not ids:
+                continue
+            cur.execute(TABLES[table], (user_id, ids))
+            found = set()
+            for values in cur.fetchall():
+                found.add(values[0])
+                upserts[table].append({k: _plain(v) for k, v in zip(FIELDS[table], values)})
+            # Rows changed and then removed (or moved to another user) after
+            # the horizon are reported as deleted; a later delete entry follows.
+            deletes[table].extend(sorted(set(ids) - found))
+
+    return {'upserts': upserts, 'deletes': deletes, 'cursor': next_cursor, 'has_more': has_more}
+
+
+def prune(conn, keep_days=30):
+    """Compacts sync_log: drops entries older than ``keep_days`` that no client can still need.
+
+    Superseded entries (a newer entry exists for the same row) are always
+    safe to drop. Old tombstones are dropped too, and the watermark moves
+    past them so clients whose cursor predates them get CursorExpired and
+    resync instead of silently keeping deleted rows. The newest 'u' entry of
+    every live row is kept, so a client starting from an empty cursor still
+    receives every row.
+    """
+    # One statement, so the tombstones and the watermark that replaces them
+    # commit together even on an autocommit connection.
+    with conn.cursor() as cur:
+        cur.execute("""
+            WITH removed AS (
+                DELETE FROM sync_log l
+                WHERE l.changed_at < now() - make_interval(days => %s)
+                  AND (l.op = 'd'
+                       OR EXISTS (SELECT 1 FROM sync_log n
+                                  WHERE n.table_name = l.table_name AND n.row_id = l.row_id
+                                    AND n.change_id > l.change_id))
+                RETURNING l.txid, l.op
+            ), summary AS (
+                SELECT count(*) AS removed, max(txid::text::bigint) FILTER (WHERE op = 'd') AS tombstone_max
+                FROM removed
+            ), watermark AS (
+                INSERT INTO sync_log_watermark (id, pruned_before)
+                SELECT true, (tombstone_max + 1)::text::xid8 FROM summary WHERE tombstone_max IS NOT NULL
+                ON CONFLICT (id) DO UPDATE
+                    SET pruned_before = GREATEST(sync_log_watermark.pruned_before, EXCLUDED.pruned_before)
+            )
+            SELECT removed FROM summary
+        """, (keep_days,))
+        return cur.fetchone()[0]
@@ -0,0 +1,61 @@
+"""Shared fixtures.
+
+Tests that need PostgreSQL (with PostGIS) run against TEST_DATABASE_URL and
+are skipped when it is not set. Pending migrations are applied to it first,
+so point it at a throwaway database.
+"""
+import io
+import os
+import uuid
+
+import pytest
+
+
+@pytest.fixture(scope='session')
+def database():
+    """psycopg2.connect() arguments of the migrated test database."""
+    url = os.environ.get('TEST_DATABASE_URL')
+    if not url:
+        pytest.skip('TEST_DATABASE_URL is not set')
+    psycopg2 = pytest.importorskip('psycopg2')
+    import config
+    import migrate
+
+    kwargs = config._database_kwargs({'DATABASE_URL': url})
+    conn = psycopg2.connect(**kwargs)
+    try:
+        migrate.apply_pending(conn, out=io.StringIO())
+    finally:
+        conn.close()
+    return kwargs
+
+
+@pytest.fixture
+def connect(database):
+    """Opens connections to the test database; all of them are closed after the test."""
+    import psycopg2
+
+    opened = []
+
+    def _connect(autocommit=False):
+        conn = psycopg2.connect(**database)
+        conn.autocommit = autocommit
+        opened.append(conn)
+        return conn
+
+    yield _connect
+    for conn in opened:
+        conn.close()
+
+
+@pytest.fixture
+def user_id(connect):
+    """A fresh user; deleting it afterwards cascades to everything the test wrote for it."""
+    conn = connect(autocommit=True)
+    with conn.cursor() as cur:
+        cur.execute("INSERT INTO users (username, password) VALUES (%s, 'x') RETURNING id",
+                    (f"test_{uuid.uuid4().hex[:12]}",))
+        new_id = cur.fetchone()[0]
+    yield new_id
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM users WHERE id = %s", (new_id,))
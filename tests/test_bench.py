@@ -0,0 +1,19 @@
+"""Nearest-rank percentiles reported by the benchmarks."""
+import pytest
+
+pytest.importorskip('psycopg2')
+from bench.run import percentile
+
+
+def test_nearest_rank_on_1_to_100():
+    values = list(range(1, 101))
+    assert (percentile(values, 50), percentile(values, 95), percentile(values, 99)) == (50, 95, 99)
+    assert percentile(values, 100) == 100
+    assert percentile(values, 0) == 1
+
+
+def test_small_samples():
+    assert percentile([7], 95) == 7
+    assert percentile([1, 2, 3, 4], 50) == 2
+    assert percentile([1, 2, 3, 4], 51) == 3
+    assert percentile([], 50) is None
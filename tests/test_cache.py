@@ -0,0 +1,19 @@
+import cache
+
+
+def test_sqlite_hit_only_rewrites_access_time_after_touch_interval(tmp_path, monkeypatch):
+    backend = cache.SQLiteBackend(str(tmp_path / 'cache.db'), touch_interval=60.0)
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, 'time', lambda: now[0])
+    backend.set('k', [1, 2], ttl=3600)
+
+    def accessed_at():
+        return backend._conn().execute("SELECT accessed_at FROM cache WHERE key = 'k'").fetchone()[0]
+
+    now[0] = 1030.0
+    assert backend.get('k') == [1, 2]
+    assert accessed_at() == 1000.0
+
+    now[0] = 1061.0
+    assert backend.get('k') == [1, 2]
+    assert accessed_at() == 1061.0
@@ -0,0 +1,33 @@
+"""config.load() checks every setting at once and stops a production start without SECRET_KEY."""
+import pytest
+
+import config
+
+
+def test_every_bad_value_is_reported_in_one_error():
+    with pytest.raises(config.ConfigError) as raised:
+        config.load({'CACHE_TTL': 'lima', 'DB_POOL_TIMEOUT': '-1', 'LOG_FORMAT': 'xml',
+                     'LOG_ACCESS_SAMPLE': '2', 'DB_PORT': '5432', 'DATABASE_URL': 'mysql://x/y'})
+    message = str(raised.value)
+    for expected in ("CACHE_TTL='lima' harus berupa bilangan bulat", "DB_POOL_TIMEOUT='-1' tidak boleh negatif",
+                     "LOG_FORMAT='xml' harus salah satu dari: json, text", "LOG_ACCESS_SAMPLE=2.0 harus antara 0 dan 1",
+                     "DATABASE_URL harus berbentuk"):
+        assert expected in message
+
+
+def test_secret_key_is_required_in_production():
+    with pytest.raises(config.ConfigError, match='SECRET_KEY wajib diisi'):
+        config.load({'APP_ENV': 'production'})
+    assert config.load({'APP_ENV': 'production', 'SECRET_KEY': 'k'})['SECRET_KEY'] == 'k'
+
+
+def test_development_falls_back_to_the_dev_key():
+    assert config.load({})['SECRET_KEY'] == config.DEV_SECRET_KEY
+
+
+def test_defaults_and_parsed_values():
+    settings = config.load({'LOG_LEVEL': 'info', 'DB_POOL_MAX': '8', 'SLOW_QUERY_MS': '50'})
+    assert settings['LOG_LEVEL'] == 'INFO'
+    assert settings['DB_POOL_MAX'] == 8
+    assert settings['SLOW_QUERY_MS'] == 50.0
+    assert settings['LOG_FORMAT'] is None and settings['DB_POOL_TIMEOUT'] == 10.0
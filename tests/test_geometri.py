@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+import geometri
+
+# The worked example from Google's encoded polyline format documentation.
+GOOGLE_EXAMPLE = '_p~iF~ps|U_ulLnnqC_mqNvxq`@'
+
+
+def test_decode_polyline_returns_lon_lat_positions():
+    coords = geometri.decode_polyline(GOOGLE_EXAMPLE, 5)
+    expected = [[-120.2, 38.5], [-120.95, 40.7], [-126.453, 43.252]]
+    assert len(coords) == len(expected)
+    for position, want in zip(coords, expected):
+        assert position == pytest.approx(want)
+
+
+def test_decode_polyline_scales_by_precision():
+    coords = geometri.decode_polyline(GOOGLE_EXAMPLE, 6)
+    assert coords[0] == pytest.approx([-12.02, 3.85])
+
+
+@pytest.mark.parametrize('text', ['_p~iF', '_p~iF~ps|', 'ab cd'])
+def test_decode_polyline_rejects_truncated_or_invalid_text(text):
+    with pytest.raises(geometri.GeometryInputError):
+        geometri.decode_polyline(text, 5)
+
+
+def test_parse_closes_polyline_ring_into_geojson_polygon():
+    sql, param = geometri.parse({'presisi': 5, 'poligon': [[GOOGLE_EXAMPLE]]})
+    assert 'ST_GeomFromGeoJSON' in sql
+    polygon = json.loads(param)
+    assert polygon['type'] == 'Polygon'
+    ring = polygon['coordinates'][0]
+    assert len(ring) == 4
+    assert ring[0] == ring[-1]
+
+
+def test_parse_detects_wkt_and_json_text():
+    sql, param = geometri.parse(' POLYGON((0 0, 1 0, 1 1, 0 0)) ')
+    assert sql == 'ST_GeomFromText(%(geom)s, 4326)'
+    assert param == 'POLYGON((0 0, 1 0, 1 1, 0 0))'
+    sql, _ = geometri.parse('{"type": "Polygon", "coordinates": []}')
+    assert 'ST_GeomFromGeoJSON' in sql
+
+
+@pytest.mark.parametrize('payload, fmt', [
+    ({'presisi': 5, 'poligon': [['_p~iF~ps|U']]}, None),  # fewer than 3 points
+    ({'presisi': 5, 'poligon': []}, None),
+    ({'type': 'Point', 'coordinates': [0, 0]}, None),
+    ('{bukan json', None),
+    ('LINESTRING(0 0, 1 1)', 'wkt'),
+    ('bukan base64!', 'twkb'),
+    ('', None),
+])
+def test_parse_rejects_invalid_input(payload, fmt):
+    with pytest.raises(geometri.GeometryInputError):
+        geometri.parse(payload, fmt)
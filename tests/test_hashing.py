@@ -0,0 +1,74 @@
+"""Password hashing: rehash detection, the login limiter and the bounded hashing pool."""
+import time
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+import hashing
+
+
+@pytest.mark.parametrize('method', ['scrypt', 'pbkdf2:sha256', 'pbkdf2:sha256:600000', hashing.DEFAULT_METHOD])
+def test_hash_made_with_the_configured_method_is_current(method):
+    hasher = hashing.PasswordHasher(method=method, workers=0)
+    assert not hasher.needs_rehash(generate_password_hash('rahasia', method=method))
+    assert not hasher.needs_rehash(hasher.hash('rahasia'))
+
+
+def test_hash_with_other_parameters_needs_rehash():
+    hasher = hashing.PasswordHasher(method='scrypt', workers=0)
+    assert hasher.needs_rehash(generate_password_hash('rahasia', method='pbkdf2:sha256'))
+    assert hasher.needs_rehash(generate_password_hash('rahasia', method='scrypt:16384:8:1'))
+
+
+def _limiter():
+    import cache
+    return hashing.AttemptLimiter(cache.make_cache('memory', max_entries=100, namespace='test_login'),
+                                  max_per_username=3, max_per_ip=5, window=60)
+
+
+def test_guessing_at_an_account_does_not_lock_out_its_owner():
+    limiter = _limiter()
+    for _ in range(3):
+        limiter.failure('Budi', '203.0.113.9')
+    assert limiter.blocked('budi', '203.0.113.9')
+    assert not limiter.blocked('budi', '198.51.100.4')
+
+
+def test_client_ip_bucket_spans_usernames():
+    limiter = _limiter()
+    for n in range(5):
+        limiter.failure(f"petani{n}", '203.0.113.9')
+    assert limiter.blocked('lain', '203.0.113.9')
+    assert not limiter.blocked('lain', '198.51.100.4')
+
+
+def test_client_address_comes_from_the_trusted_proxy_hop(monkeypatch):
+    flask = pytest.importorskip('flask')
+    app_module = pytest.importorskip('app')
+    monkeypatch.setitem(app_module.settings, 'TRUSTED_PROXY_HOPS', 1)
+    web = app_module.create_app()
+    web.add_url_rule('/_alamat', '_alamat', lambda: flask.request.remote_addr)
+    response = web.test_client().get('/_alamat', headers={'X-Forwarded-For': '198.51.100.4, 203.0.113.9'},
+                                     environ_base={'REMOTE_ADDR': '10.0.0.2'})
+    assert response.get_data(as_text=True) == '203.0.113.9'
+
+
+def _slow(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def test_timed_out_hash_keeps_its_slot_until_it_finishes():
+    hasher = hashing.PasswordHasher(method='pbkdf2:sha256', workers=1, max_pending=1, timeout=0.05,
+                                    mp_context='fork')
+    try:
+        with pytest.raises(hashing.HashingBusy):
+            hasher._run('hash', _slow, 0.5)
+        # The first job still runs in the pool, so its slot is still taken.
+        with pytest.raises(hashing.HashingBusy):
+            hasher._run('hash', _slow, 0)
+        assert hasher.rejected == 1
+        time.sleep(0.8)
+        assert hasher._run('hash', _slow, 0) == 0
+    finally:
+        hasher.shutdown()
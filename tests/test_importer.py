@@ -0,0 +1,34 @@
+"""Attribute normalisation for imported petani rows."""
+import pytest
+
+import importer
+
+
+def test_whole_number_floats_from_dbf_become_digits():
+    assert importer._as_text(3275010101900001.0, 'nik') == '3275010101900001'
+    assert importer._as_text(81234567890.0, 'no_telpon') == '81234567890'
+    assert importer._as_text(' 0812-3456 ', 'no_telpon') == '0812-3456'
+    assert importer._as_text(None, 'nik') is None
+
+
+@pytest.mark.parametrize('name, value', [('nik', '1' * 21), ('no_telpon', '+62 812 3456 7890')])
+def test_values_wider_than_the_column_are_row_errors(name, value):
+    with pytest.raises(ValueError, match=name):
+        importer._as_text(value, name)
+
+
+def test_in_file_duplicates_are_not_counted_as_staged(connect, user_id, tmp_path):
+    pytest.importorskip('fiona')
+    import json
+    square = {'type': 'Polygon', 'coordinates': [[[113.7, -8.2], [113.701, -8.2], [113.701, -8.199],
+                                                  [113.7, -8.199], [113.7, -8.2]]]}
+    features = [{'type': 'Feature', 'geometry': square, 'properties': {'nama': nama, 'nik': nik}}
+                for nama, nik in [('Ani', '3275010101900001'), ('Ani Baru', '3275010101900001'), ('Budi', None)]]
+    path = tmp_path / 'petani.geojson'
+    path.write_text(json.dumps({'type': 'FeatureCollection', 'features': features}))
+
+    conn = connect()
+    hasil = importer.import_petani(conn, str(path), user_id)
+    conn.rollback()
+    assert (hasil['staged'], hasil['duplicates'], hasil['inserted'], hasil['updated']) == (2, 1, 2, 0)
+    assert [row for row, _ in hasil['errors']] == [1]
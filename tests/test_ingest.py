@@ -0,0 +1,45 @@
+"""Batch ingestion: per-record validation and mapping of inserted ids back to input positions."""
+import pytest
+
+import ingest
+
+
+def _record(**overrides):
+    record = {'petani_id': 1, 'nama_komoditas': 'Padi', 'luas_lahan': 1.5, 'tanggal_tanam': '2024-03-01'}
+    record.update(overrides)
+    return record
+
+
+@pytest.mark.parametrize('angka', [float('nan'), float('inf'), float('-inf'), -1, 'nan', '-0.5'])
+def test_invalid_angka_is_a_per_record_error(angka):
+    values, error = ingest._validate('komoditas', _record(luas_lahan=angka))
+    assert values is None
+    assert 'luas_lahan' in error
+
+
+def test_zero_and_numeric_strings_are_accepted():
+    assert ingest._validate('komoditas', _record(luas_lahan=0))[0][2] == 0.0
+    assert ingest._validate('komoditas', _record(luas_lahan='2.25'))[0][2] == 2.25
+
+
+def test_created_ids_follow_input_positions(connect, user_id):
+    conn = connect()
+    with conn.cursor() as cur:
+        cur.execute("INSERT INTO petani (user_id, nama) VALUES (%s, 'Test') RETURNING id", (user_id,))
+        petani_id = cur.fetchone()[0]
+    records = [_record(petani_id=petani_id, nama_komoditas=f"K{n}",
+                       idempotency_key=f"key-{n}" if n % 2 else None)
+               for n in range(7)]
+    first = ingest.ingest(conn, 'komoditas', user_id, records)
+    conn.commit()
+
+    with conn.cursor() as cur:
+        cur.execute("SELECT id, nama_komoditas FROM komoditas WHERE petani_id = %s", (petani_id,))
+        names = dict(cur.fetchall())
+    assert [r['status'] for r in first] == ['created'] * 7
+    assert [names[r['id']] for r in first] == [f"K{n}" for n in range(7)]
+
+    again = ingest.ingest(conn, 'komoditas', user_id, records[1:2] + [_record(petani_id=petani_id, nama_komoditas='Baru')])
+    conn.commit()
+    assert again[0] == {'index': 0, 'status': 'duplicate', 'id': first[1]['id']}
+    assert again[1]['status'] == 'created' and again[1]['id'] not in names
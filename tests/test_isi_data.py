@@ -0,0 +1,70 @@
+"""isi_komoditas / isi_hasil_panen only write rows under the user's own farmers."""
+import pytest
+
+flask = pytest.importorskip('flask')
+app_module = pytest.importorskip('app')
+
+FORMS = {
+    '/isi_komoditas': {'petani_id': '42', 'nama_komoditas': 'Padi', 'luas_lahan': '1.5', 'tanggal_tanam': '2024-03-01'},
+    '/isi_hasil_panen': {'petani_id': '42', 'nama_komoditas': 'Padi', 'jumlah': '800', 'tanggal_panen': '2024-06-01'},
+}
+
+
+class FakeConnection:
+    def __init__(self, rowcount):
+        self.rowcount = rowcount
+        self.executed = []
+        self.committed = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, params=None):
+        self.conn.executed.append((sql, params))
+        self.rowcount = self.conn.rowcount
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def post(monkeypatch):
+    bumps = []
+    monkeypatch.setattr(app_module.versions, 'bump', lambda conn, user_id, tiles=False: bumps.append(user_id))
+
+    def _post(path, rowcount):
+        conn = FakeConnection(rowcount)
+        monkeypatch.setattr(app_module, 'get_db_conn', lambda: conn)
+        client = app_module.create_app().test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = 7
+        return client.post(path, data=FORMS[path]), conn, bumps
+    return _post
+
+
+@pytest.mark.parametrize('path', sorted(FORMS))
+def test_farmer_of_another_user_is_refused(post, path):
+    response, conn, bumps = post(path, rowcount=0)
+    assert response.status_code == 200
+    assert 'tidak memiliki akses' in response.get_data(as_text=True)
+    sql, params = conn.executed[0]
+    assert 'p.user_id = %s' in sql and params[-2:] == ('42', 7)
+    assert not conn.committed and bumps == []
+
+
+@pytest.mark.parametrize('path', sorted(FORMS))
+def test_own_farmer_is_written_and_bumps_the_owner(post, path):
+    response, conn, bumps = post(path, rowcount=1)
+    assert response.status_code == 302
+    assert conn.committed and bumps == [7]
@@ -0,0 +1,25 @@
+import pytest
+
+import jobs
+
+
+@pytest.fixture
+def no_jitter(monkeypatch):
+    monkeypatch.setattr(jobs.random, 'uniform', lambda low, high: 1.0)
+
+
+def test_retry_delay_doubles_from_base(no_jitter):
+    base = jobs.RETRY_BASE_SECONDS
+    assert [jobs.retry_delay(n) for n in (0, 1, 2, 3, 4)] == [base, base, 2 * base, 4 * base, 8 * base]
+
+
+def test_retry_delay_is_capped(no_jitter):
+    assert jobs.retry_delay(20) == jobs.RETRY_MAX_SECONDS
+    assert jobs.retry_delay(1000) == jobs.RETRY_MAX_SECONDS
+
+
+def test_retry_delay_jitter_stays_within_a_fifth():
+    for attempts in (1, 3, 1000):
+        expected = min(jobs.RETRY_BASE_SECONDS * 2 ** (attempts - 1), jobs.RETRY_MAX_SECONDS)
+        for _ in range(50):
+            assert 0.8 * expected <= jobs.retry_delay(attempts) <= 1.2 * expected
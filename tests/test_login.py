@@ -0,0 +1,50 @@
+"""A correct password logs in even when upgrading its hash fails."""
+import psycopg2
+import pytest
+from werkzeug.security import generate_password_hash
+
+flask = pytest.importorskip('flask')
+app_module = pytest.importorskip('app')
+import hashing
+
+OLD_HASH = generate_password_hash('rahasia', method='pbkdf2:sha256:1000')
+
+
+class FakeConnection:
+    def __init__(self):
+        self.rolled_back = False
+
+    def cursor(self):
+        return FakeCursor()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        self.rolled_back = True
+
+
+class FakeCursor:
+    def execute(self, sql, params=None):
+        if sql.startswith('UPDATE users'):
+            raise psycopg2.OperationalError('koneksi terputus')
+
+    def fetchone(self):
+        return (1, OLD_HASH)
+
+    def close(self):
+        pass
+
+
+def test_failed_rehash_keeps_the_login(monkeypatch):
+    conn = FakeConnection()
+    monkeypatch.setattr(app_module, 'get_db_conn', lambda: conn)
+    monkeypatch.setattr(app_module, 'password_hasher', hashing.PasswordHasher(method='scrypt', workers=0))
+    client = app_module.create_app().test_client()
+
+    response = client.post('/login', data={'username': 'budi', 'password': 'rahasia'})
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/dashboard')
+    assert conn.rolled_back
+    with client.session_transaction() as session:
+        assert session['user_id'] == 1
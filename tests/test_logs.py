@@ -0,0 +1,55 @@
+import json
+import logging
+
+import pytest
+
+logs = pytest.importorskip('logs')
+
+
+def make_record(lineno=10, msg='koneksi database gagal'):
+    return logging.LogRecord('petani_app', logging.ERROR, 'app.py', lineno, msg, None, None)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(logs.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_rate_limit_suppresses_after_limit_within_window(clock):
+    limiter = logs.RateLimitFilter(limit=2, window=60.0)
+    passed = [limiter.filter(make_record()) for _ in range(5)]
+    assert passed == [True, True, False, False, False]
+    # Another call site has its own budget.
+    assert limiter.filter(make_record(lineno=20))
+
+
+def test_next_window_reports_suppressed_count(clock):
+    limiter = logs.RateLimitFilter(limit=1, window=60.0)
+    for _ in range(4):
+        limiter.filter(make_record())
+    clock[0] += 59.9
+    assert not limiter.filter(make_record())
+
+    clock[0] += 0.1
+    record = make_record()
+    assert limiter.filter(record)
+    assert record.suppressed_before == 4
+    entry = json.loads(logs.JsonFormatter().format(record))
+    assert entry['suppressed_before'] == 4
+    assert entry['msg'] == 'koneksi database gagal'
+
+    clock[0] += 60.0
+    record = make_record()
+    assert limiter.filter(record)
+    assert not hasattr(record, 'suppressed_before')
+
+
+def test_below_warning_and_disabled_limit_pass(clock):
+    limiter = logs.RateLimitFilter(limit=1, window=60.0)
+    info = make_record()
+    info.levelno = logging.INFO
+    assert all(limiter.filter(info) for _ in range(3))
+    unlimited = logs.RateLimitFilter(limit=0)
+    assert all(unlimited.filter(make_record()) for _ in range(10))
@@ -0,0 +1,51 @@
+"""Slow-query and slow-request logs leave out parameters and query strings unless SLOW_QUERY_LOG_PARAMS is set."""
+import logging
+
+import pytest
+
+pytest.importorskip('flask')
+import config
+import metrics
+
+
+@pytest.mark.parametrize('log_params', [False, True])
+def test_slow_query_params_are_opt_in(monkeypatch, caplog, log_params):
+    monkeypatch.setattr(metrics, 'SLOW_QUERY_SECONDS', 0.1)
+    monkeypatch.setattr(metrics, 'LOG_QUERY_PARAMS', log_params)
+    with caplog.at_level(logging.WARNING, logger='petani_app.slow'):
+        metrics._record_query(0.5, "SELECT * FROM petani WHERE nik = %s", ('3275010101900001',))
+    assert 'SELECT * FROM petani' in caplog.text
+    assert ('3275010101900001' in caplog.text) is log_params
+
+
+def test_flag_setting():
+    assert config.load({'SLOW_QUERY_LOG_PARAMS': 'Yes'})['SLOW_QUERY_LOG_PARAMS'] is True
+    assert config.load({})['SLOW_QUERY_LOG_PARAMS'] is False
+    with pytest.raises(config.ConfigError, match='true/false'):
+        config.load({'SLOW_QUERY_LOG_PARAMS': 'kadang'})
+
+
+@pytest.mark.parametrize('path', ['/health/db', '/health/hashing', '/health/cache', '/health/jobs', '/metrics'])
+def test_monitoring_endpoints_require_the_metrics_token(monkeypatch, path):
+    app_module = pytest.importorskip('app')
+    monkeypatch.setitem(app_module.settings, 'METRICS_TOKEN', 'rahasia')
+    monkeypatch.setattr(app_module, 'get_db_conn', lambda: None)
+    client = app_module.create_app().test_client()
+
+    assert client.get(path).status_code == 401
+    assert client.get(path, headers={'Authorization': 'Bearer salah'}).status_code == 401
+    assert client.get(path, headers={'Authorization': 'Bearer rahasia'}).status_code in (200, 503)
+
+
+@pytest.mark.parametrize('log_params', [False, True])
+def test_slow_request_query_string_is_opt_in(monkeypatch, caplog, log_params):
+    import flask
+    for name in ('LOG_QUERY_PARAMS', 'SLOW_QUERY_SECONDS', 'SLOW_REQUEST_SECONDS'):
+        monkeypatch.setattr(metrics, name, getattr(metrics, name))  # init_app sets them
+    web = flask.Flask(__name__)
+    metrics.init_app(web, log_query_params=log_params, slow_request_ms=1e-6)
+    web.add_url_rule('/petani/search', 'cari', lambda: 'ok')
+    with caplog.at_level(logging.WARNING, logger='petani_app.slow'):
+        web.test_client().get('/petani/search?q=3275010101900001')
+    assert 'GET /petani/search' in caplog.text
+    assert ('3275010101900001' in caplog.text) is log_params
@@ -0,0 +1,41 @@
+"""No-transaction migrations must not record an index left invalid by CREATE INDEX CONCURRENTLY."""
+import pytest
+
+pytest.importorskip('psycopg2')
+import migrate
+
+SQL = """-- migrate: no-transaction
+CREATE INDEX CONCURRENTLY IF NOT EXISTS petani_updated_at_idx ON petani (user_id, updated_at);
+"""
+
+
+class FakeCursor:
+    def __init__(self, invalid_before=(), invalid_after=()):
+        self.invalid = set(invalid_before)
+        self.invalid_after = set(invalid_after)
+        self.statements = []
+
+    def execute(self, sql, params=None):
+        self.statements.append(' '.join(sql.split()))
+        if sql.startswith('DROP INDEX'):
+            self.invalid.clear()
+        elif sql.startswith('CREATE INDEX'):
+            self.invalid |= self.invalid_after
+        self._rows = [(name,) for name in params[0] if name in self.invalid] if params else []
+
+    def fetchall(self):
+        return self._rows
+
+
+def test_leftover_invalid_index_is_dropped_before_the_retry():
+    cur = FakeCursor(invalid_before={'petani_updated_at_idx'})
+    migrate._run_without_transaction(cur, SQL)
+    drops = [s for s in cur.statements if s.startswith('DROP INDEX')]
+    assert drops == ['DROP INDEX CONCURRENTLY IF EXISTS "petani_updated_at_idx"']
+    assert cur.statements[-2].startswith('CREATE INDEX CONCURRENTLY')
+
+
+def test_index_left_invalid_fails_the_migration():
+    cur = FakeCursor(invalid_after={'petani_updated_at_idx'})
+    with pytest.raises(migrate.MigrationError, match='petani_updated_at_idx'):
+        migrate._run_without_transaction(cur, SQL)
@@ -0,0 +1,49 @@
+"""Keyset pagination over nullable sort columns, checked against SQLite's ORDER BY."""
+import sqlite3
+
+import pagination
+
+ORDER = [("tanggal", "DESC NULLS LAST"), ("nama", "ASC NULLS LAST"), ("id", "ASC")]
+
+
+def _table():
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, tanggal TEXT, nama TEXT)")
+    rows = []
+    for n in range(1, 41):
+        tanggal = None if n % 4 == 0 else f"2024-01-{n % 5 + 1:02d}"
+        nama = None if n % 3 == 0 else f"petani {n % 7}"
+        rows.append((n, tanggal, nama))
+    conn.executemany("INSERT INTO t VALUES (?, ?, ?)", rows)
+    return conn
+
+
+def _select(conn, where, params, limit=None):
+    sql = "SELECT id, tanggal, nama FROM t"
+    if where:
+        sql += " WHERE " + where.replace('%s', '?')
+    sql += f" ORDER BY {pagination.order_clause(ORDER)}"
+    if limit:
+        sql += f" LIMIT {limit}"
+    return conn.execute(sql, params).fetchall()
+
+
+def test_pages_cover_rows_with_null_keys_exactly_once():
+    conn = _table()
+    expected = _select(conn, None, [])
+    seen, after = [], None
+    while True:
+        where, params = pagination.keyset_condition(ORDER, after) if after else (None, [])
+        page = _select(conn, where, params, limit=7)
+        if not page:
+            break
+        seen.extend(page)
+        last = page[-1]
+        after = pagination.decode_cursor(pagination.encode_cursor((last[1], last[2], last[0])), 3)
+    assert seen == expected
+    assert any(row[1] is None for row in seen) and any(row[2] is None for row in seen)
+
+
+def test_nothing_follows_the_last_null_key():
+    where, params = pagination.keyset_condition([("nama", "ASC NULLS LAST")], [None])
+    assert (where, params) == ('FALSE', [])
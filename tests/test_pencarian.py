@@ -0,0 +1,55 @@
+import cache
+import pencarian
+
+
+def row(id, nama, nik='', alamat=''):
+    return {'id': id, 'nama': nama, 'nik': nik, 'alamat': alamat}
+
+
+def make_cache(max_entries=1024):
+    return pencarian.PrefixCache(cache.Cache(cache.MemoryBackend(max_entries=max_entries)))
+
+
+def test_narrow_filters_and_reranks_by_tier():
+    rows = [row(1, 'Pak Suroto', alamat='Desa Sukamaju'), row(2, 'Suroso'),
+            row(3, 'Budi', alamat='Jl. Surokarto'), row(4, 'Siti'), row(5, 'suro')]
+    assert [r['id'] for r in pencarian.narrow(rows, 'suro')] == [5, 2, 1, 3]
+
+
+def test_exact_hit_and_miss():
+    prefixes = make_cache()
+    rows = [row(1, 'Suroto')]
+    prefixes.set(1, 'sur', rows)
+    assert prefixes.get(1, 'sur') == rows
+    assert prefixes.get(2, 'sur') is None
+    assert prefixes.get(1, 'bud') is None
+
+
+def test_longer_query_is_narrowed_from_complete_prefix_result():
+    prefixes = make_cache()
+    prefixes.set(1, 'sur', [row(1, 'Suroto'), row(2, 'Surti'), row(3, 'Pak Suroso')])
+    assert [r['id'] for r in prefixes.get(1, 'suro')] == [1, 3]
+    # Nothing left after narrowing may still be a similarity match: ask the database.
+    assert prefixes.get(1, 'surx') is None
+
+
+def test_truncated_prefix_result_is_not_narrowed():
+    prefixes = make_cache()
+    prefixes.set(1, 'sur', [row(i, f'Suroto {i}') for i in range(pencarian.MAX_RESULTS)])
+    assert prefixes.get(1, 'suro') is None
+
+
+def test_short_prefix_results_are_not_narrowed():
+    prefixes = make_cache()
+    prefixes.set(1, 'su', [row(1, 'Suroto')])
+    assert prefixes.get(1, 'sur') is None
+
+
+def test_evicted_entries_miss():
+    prefixes = make_cache(max_entries=2)
+    prefixes.set(1, 'abc', [row(1, 'Abc')])
+    prefixes.set(1, 'def', [row(2, 'Def')])
+    prefixes.set(1, 'ghi', [row(3, 'Ghi')])
+    assert prefixes.get(1, 'abc') is None
+    assert prefixes.get(1, 'abcd') is None
+    assert prefixes.get(1, 'ghi') == [row(3, 'Ghi')]
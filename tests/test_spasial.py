@@ -0,0 +1,35 @@
+"""Spatial query errors: data exceptions are the client's fault (400), internal errors are logged 500s."""
+import psycopg2
+import pytest
+
+flask = pytest.importorskip('flask')
+app_module = pytest.importorskip('app')
+
+
+class InvalidParameter(psycopg2.DataError):
+    pgcode = '22023'
+
+
+class InternalError(psycopg2.InternalError):
+    pgcode = 'XX000'
+
+
+class FakeConnection:
+    def rollback(self):
+        pass
+
+
+@pytest.mark.parametrize('error, status', [(InvalidParameter, 400), (InternalError, 500)])
+def test_database_errors_map_by_sqlstate_class(monkeypatch, caplog, error, status):
+    def query(conn, user_id, polygon, **kwargs):
+        raise error('gagal')
+
+    monkeypatch.setattr(app_module, 'get_db_conn', FakeConnection)
+    monkeypatch.setattr(app_module.spasial, 'within_polygon', query)
+    client = app_module.create_app().test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+
+    response = client.post('/api/petani/area', json={'wkt': 'POLYGON((0 0, 1 0, 1 1, 0 0))'})
+    assert response.status_code == status
+    assert ('Database error in spatial query' in caplog.text) is (status == 500)
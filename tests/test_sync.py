@@ -0,0 +1,81 @@
+"""Cursor expiry of /sync: cursors older than the pruning watermark get 410 and a full resync."""
+import pytest
+
+flask = pytest.importorskip('flask')
+app_module = pytest.importorskip('app')
+import sync
+
+WATERMARK = 1000
+HORIZON = 2000
+
+
+class FakeConnection:
+    """Answers the two snapshot queries of sync.changes_since; the user has no log entries."""
+
+    def cursor(self):
+        return FakeCursor()
+
+    def rollback(self):
+        pass
+
+
+class FakeCursor:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.sql = sql
+
+    def fetchone(self):
+        if 'sync_log_watermark' in self.sql:
+            return (WATERMARK,)
+        return (HORIZON,)
+
+    def fetchall(self):
+        return []
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app_module, 'get_db_conn', FakeConnection)
+    client = app_module.create_app().test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+    return client
+
+
+def test_cursor_before_the_watermark_gets_410(client):
+    response = client.get(f'/sync?since={WATERMARK - 1}:7')
+    assert response.status_code == 410
+    assert response.get_json()['resync'] is True
+
+
+def test_empty_cursor_is_never_expired(client):
+    response = client.get('/sync')
+    assert response.status_code == 200
+    assert response.get_json()['cursor'] == f'{HORIZON}:0'
+
+
+def test_cursor_at_the_watermark_is_served(client):
+    response = client.get(f'/sync?since={WATERMARK}:0')
+    assert response.status_code == 200
+
+
+def test_pruned_tombstone_expires_older_cursors(connect, user_id):
+    conn = connect(autocommit=True)
+    with conn.cursor() as cur:
+        cur.execute("INSERT INTO petani (user_id, nama) VALUES (%s, 'Sutrisno') RETURNING id", (user_id,))
+        petani_id = cur.fetchone()[0]
+        cur.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+        old_cursor = f"{cur.fetchone()[0]}:0"
+        cur.execute("DELETE FROM petani WHERE id = %s", (petani_id,))
+        cur.execute("UPDATE sync_log SET changed_at = now() - interval '40 days' "
+                    "WHERE table_name = 'petani' AND row_id = %s", (petani_id,))
+
+    assert sync.prune(conn, keep_days=30) >= 2
+    with pytest.raises(sync.CursorExpired):
+        sync.changes_since(conn, user_id, old_cursor)
+    assert sync.changes_since(conn, user_id, '')['deletes']['petani'] == []
@@ -0,0 +1,58 @@
+import os
+import time
+
+import tiles
+
+
+def test_tiles_are_looked_up_under_their_version(tmp_path):
+    cache = tiles.TileCache(str(tmp_path))
+    cache.put(7, 1, 14, 100, 200, b'lama')
+
+    assert cache.get(7, 1, 14, 100, 200) == b'lama'
+    assert cache.get(7, 2, 14, 100, 200) is None
+
+
+def test_tile_rendered_before_a_write_is_not_served_after_it(tmp_path):
+    cache = tiles.TileCache(str(tmp_path))
+    # Rendered from data read at version 3, stored after the write moved the version to 4.
+    cache.put(7, 3, 14, 100, 200, b'lama')
+
+    other_worker = tiles.TileCache(str(tmp_path))
+    assert other_worker.get(7, 4, 14, 100, 200) is None
+
+
+def test_storing_a_newer_version_removes_older_ones(tmp_path):
+    cache = tiles.TileCache(str(tmp_path))
+    cache.put(7, 1, 14, 100, 200, b'lama')
+    cache.put(8, 1, 14, 100, 200, b'lain')
+    cache.put(7, 2, 14, 100, 200, b'baru')
+
+    assert sorted(p.name for p in (tmp_path / '7').iterdir()) == ['2']
+    assert (tmp_path / '8' / '1').is_dir()
+    assert tiles.TileCache(str(tmp_path)).get(7, 1, 14, 100, 200) is None
+    assert cache.get(7, 1, 14, 100, 200) is None
+    assert cache.get(7, 2, 14, 100, 200) == b'baru'
+
+
+def test_sweep_keeps_the_disk_store_under_its_cap(tmp_path):
+    cache = tiles.TileCache(str(tmp_path), disk_max_bytes=1000, max_age=0, sweep_interval=3600)
+    for y in range(10):
+        cache.put(7, 1, 14, 100, y, b'x' * 200)
+        os.utime(cache._path(7, 1, 14, 100, y), (1000 + y, 1000 + y))
+    os.utime(cache._path(7, 1, 14, 100, 0))  # read recently by some worker
+
+    assert cache.sweep() == 6
+    other_worker = tiles.TileCache(str(tmp_path))
+    assert other_worker.get(7, 1, 14, 100, 0) is not None
+    assert [y for y in range(1, 10) if other_worker.get(7, 1, 14, 100, y)] == [7, 8, 9]
+
+
+def test_sweep_removes_expired_tiles(tmp_path):
+    cache = tiles.TileCache(str(tmp_path), disk_max_bytes=0, max_age=60)
+    cache.put(7, 1, 14, 100, 1, b'lama')
+    cache.put(7, 1, 14, 100, 2, b'baru')
+    os.utime(cache._path(7, 1, 14, 100, 1), (time.time() - 120,) * 2)
+
+    assert cache.sweep() == 1
+    assert not os.path.exists(cache._path(7, 1, 14, 100, 1))
+    assert os.path.exists(cache._path(7, 1, 14, 100, 2))
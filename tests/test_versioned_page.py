@@ -0,0 +1,72 @@
+"""versioned_page must neither consume flashed messages nor cache a page that showed one."""
+import pytest
+
+flask = pytest.importorskip('flask')
+app_module = pytest.importorskip('app')
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app_module, 'data_version', lambda user_id: 1)
+    app_module.page_cache.backend.clear()
+    web = flask.Flask(__name__)
+    web.secret_key = 'test'
+    web.add_url_rule('/pesan', 'pesan', lambda: '|'.join(flask.get_flashed_messages()))
+    client = web.test_client()
+    client.web = web
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+    return client
+
+
+def test_message_flashed_but_not_rendered_reaches_the_next_page(client):
+    @app_module.versioned_page
+    def halaman():
+        flask.flash('Gagal memuat data', 'danger')
+        return 'tanpa pesan'
+    client.web.add_url_rule('/halaman', 'halaman', halaman)
+
+    assert client.get('/halaman').get_data(as_text=True) == 'tanpa pesan'
+    assert client.get('/pesan').get_data(as_text=True) == 'Gagal memuat data'
+
+
+def test_page_that_rendered_a_flashed_message_is_not_cached(client):
+    calls = []
+
+    @app_module.versioned_page
+    def halaman():
+        calls.append(1)
+        if len(calls) == 1:
+            flask.flash('Gagal memuat data', 'danger')
+        return 'isi ' + '|'.join(flask.get_flashed_messages())
+    client.web.add_url_rule('/halaman', 'halaman', halaman)
+
+    first = client.get('/halaman')
+    assert first.get_data(as_text=True) == 'isi Gagal memuat data'
+    assert first.headers.get('ETag') is None
+    second = client.get('/halaman')
+    assert second.get_data(as_text=True) == 'isi '
+    assert len(calls) == 2
+    assert second.headers.get('ETag')
+
+
+def test_data_version_is_read_once_per_request(monkeypatch):
+    reads = []
+    monkeypatch.setattr(app_module.db, 'request_conn', lambda: None)
+    monkeypatch.setattr(app_module.versions, 'get', lambda conn, user_id: reads.append(user_id) or (5, 2))
+    app_module.page_cache.backend.clear()
+    web = flask.Flask(__name__)
+    web.secret_key = 'test'
+
+    @app_module.versioned_page
+    def halaman():
+        return f"versi {app_module.data_version(1)}"
+    web.add_url_rule('/halaman', 'halaman', halaman)
+    client = web.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+
+    assert client.get('/halaman').get_data(as_text=True) == 'versi 5'
+    assert reads == [1]
+    client.get('/halaman')
+    assert reads == [1, 1]
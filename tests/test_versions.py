@@ -0,0 +1,54 @@
+"""The per-user data version lives in PostgreSQL, so every process sees a write's bump with its commit."""
+import pytest
+
+import versions
+
+
+def test_bump_becomes_visible_with_the_commit(connect, user_id):
+    writer, reader = connect(), connect(autocommit=True)
+    before = versions.get(reader, user_id)
+
+    versions.bump(writer, user_id, tiles=True)
+    assert versions.get(reader, user_id) == before
+
+    writer.commit()
+    version, tile_version = versions.get(reader, user_id)
+    assert version == before[0] + 1
+    assert tile_version == before[1] + 1
+
+
+def test_rolled_back_write_keeps_the_version(connect, user_id):
+    writer, reader = connect(), connect(autocommit=True)
+    before = versions.get(reader, user_id)
+    versions.bump(writer, user_id)
+    writer.rollback()
+    assert versions.get(reader, user_id) == before
+
+
+def test_bump_without_tiles_keeps_the_tile_version(connect, user_id):
+    conn = connect()
+    versions.bump(conn, user_id, tiles=True)
+    conn.commit()
+    version, tile_version = versions.get(conn, user_id)
+
+    versions.bump(conn, user_id)
+    conn.commit()
+    assert versions.get(conn, user_id) == (version + 1, tile_version)
+
+
+def test_worker_job_bumps_the_version_in_its_own_transaction(connect, user_id):
+    worker = pytest.importorskip('worker')
+    import jobs
+
+    work, control, reader = connect(), connect(autocommit=True), connect(autocommit=True)
+    job_id = jobs.enqueue(work, user_id, 'rekap_panen')
+    work.commit()
+    before = versions.get(reader, user_id)
+
+    runner = worker.Worker(['rekap_panen'], concurrency=1)
+    job = jobs.claim(work, runner.id, ['rekap_panen'])
+    assert job['id'] == job_id
+    runner._execute(job, work, control)
+
+    assert jobs.get(reader, user_id, job_id)['status'] == 'succeeded'
+    assert versions.get(reader, user_id)[0] == before[0] + 1
@@ -0,0 +1,210 @@
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+MAX_ZOOM = 22
+EXTENT = 4096
+BUFFER = 64
+
+# Precomputed simplifications of petani.lahan_geom (see migration 0003),
+# as (max zoom, column). Above the last entry the full geometry is used.
+LAHAN_RESOLUTIONS = [
+    (12, 'lahan_geom_100m'),
+    (15, 'lahan_geom_10m'),
+    (17, 'lahan_geom_1m'),
+]
+
+
+def lahan_column_for_zoom(z):
+    """Returns the petani column holding lahan_geom simplified for map zoom ``z``."""
+    for max_zoom, column in LAHAN_RESOLUTIONS:
+        if z <= max_zoom:
+            return column
+    return 'lahan_geom'
+
+
+TILE_SQL = """
+    WITH bounds AS (
+        SELECT ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS geom
+    ),
+    mvtgeom AS (
+        SELECT ST_AsMVTGeom(ST_Transform(p.{geom_column}, 3857), bounds.geom, %(extent)s, %(buffer)s, true) AS geom,
+               p.id, p.nama, p.luas_lahan
+        FROM petani p, bounds
+        WHERE p.user_id = %(user_id)s
+          AND p.lahan_geom && ST_Transform(bounds.geom, 4326)
+    )
+    SELECT ST_AsMVT(mvtgeom.*, 'petani', %(extent)s, 'geom') FROM mvtgeom
+"""
+
+
+def valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def fetch_tile(conn, user_id, z, x, y):
+    cur = conn.cursor()
+    try:
+        # The && filter stays on lahan_geom so the GiST index is used; only the
+        # geometry that is clipped and encoded comes from the simplified column.
+        cur.execute(TILE_SQL.format(geom_column=lahan_column_for_zoom(z)), {'z': z, 'x': x, 'y': y, 'user_id': user_id,
+                               'extent': EXTENT, 'buffer': BUFFER})
+        row = cur.fetchone()
+        return bytes(row[0]) if row and row[0] is not None else b''
+    finally:
+        cur.close()
+
+
+class TileCache:
+    """Two-level MVT cache: a per-worker LRU in front of an on-disk store shared by the host's workers.
+
+    Files live at ``<directory>/<user_id>/<tile_version>/<z>/<x>/<y>.mvt``.
+    The tile version (versions.py) moves on in the transaction of every
+    petani write, so tiles are never invalidated in place: after the commit
+    every process, on any host, looks them up under the new version, and a
+    tile rendered from data read before the write can only be stored under
+    the old one. Storing the first tile of a newer version removes the
+    user's older version directories.
+
+    The disk store is bounded by ``disk_max_bytes`` and ``max_age`` seconds
+    (0 disables either): at most every ``sweep_interval`` seconds a put walks
+    the directory, removes tiles older than ``max_age`` and then the least
+    recently used ones until the store is under 90% of ``disk_max_bytes``.
+    Disk hits refresh a file's mtime, which is what "recently used" means
+    across the workers sharing the directory.
+    """
+
+    def __init__(self, directory, max_bytes=32 * 1024 * 1024, disk_max_bytes=512 * 1024 * 1024,
+                 max_age=7 * 24 * 3600, sweep_interval=60.0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self.max_age = max_age
+        self.sweep_interval = sweep_interval
+        self._next_sweep = 0.0
+        self._sweep_lock = threading.Lock()
+        self._lru = OrderedDict()  # (user_id, version, z, x, y) -> data
+        self._bytes = 0
+        self._latest = {}  # user_id -> newest tile version this process has stored
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_evictions = 0
+
+    def _path(self, user_id, version, z, x, y):
+        return os.path.join(self.directory, str(user_id), str(version), str(z), str(x), f"{y}.mvt")
+
+    def _remember(self, key, data):
+        self._forget(key)
+        self._lru[key] = data
+        self._bytes += len(data)
+        while self._bytes > self.max_bytes and self._lru:
+            _, evicted = self._lru.popitem(last=False)
+            self._bytes -= len(evicted)
+
+    def _forget(self, key):
+        old = self._lru.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old)
+
+    def get(self, user_id, version, z, x, y):
+        key = (user_id, version, z, x, y)
+        with self._lock:
+            data = self._lru.get(key)
+            if data is not None:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return data
+
+        path = self._path(*key)
+        try:
+            with open(path, 'rb') as fh:
+                data = fh.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self._remember(key, data)
+            self.hits += 1
+        return data
+
+    def put(self, user_id, version, z, x, y, data):
+        key = (user_id, version, z, x, y)
+        path = self._path(*key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self._remember(key, data)
+            newer = version > self._latest.get(user_id, -1)
+            if newer:
+                self._latest[user_id] = version
+        if newer:
+            self._drop_older(user_id, version)
+        now = time.monotonic()
+        if now >= self._next_sweep and self._sweep_lock.acquire(blocking=False):
+            try:
+                self._next_sweep = now + self.sweep_interval
+                self.sweep()
+            finally:
+                self._sweep_lock.release()
+
+    def _drop_older(self, user_id, version):
+        """Removes the user's tiles of versions before ``version``, on disk and in this process's LRU."""
+        user_dir = os.path.join(self.directory, str(user_id))
+        for name in os.listdir(user_dir):
+            if name.isdigit() and int(name) < version:
+                shutil.rmtree(os.path.join(user_dir, name), ignore_errors=True)
+        with self._lock:
+            for key in [k for k in self._lru if k[0] == user_id and k[1] < version]:
+                self._forget(key)
+
+    def sweep(self):
+        """Applies ``max_age`` and ``disk_max_bytes`` to the disk store; returns the number of tiles removed.
+
+        Several processes may sweep at once; a file another one already
+        removed is skipped. The per-process LRUs are left alone: they are
+        bounded by ``max_bytes`` themselves.
+        """
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith('.mvt'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        expired_before = time.time() - self.max_age if self.max_age else None
+        target = self.disk_max_bytes * 0.9 if self.disk_max_bytes else None
+        removed = 0
+        for mtime, size, path in files:
+            expired = expired_before is not None and mtime < expired_before
+            if not expired and (target is None or total <= target):
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        with self._lock:
+            self.disk_evictions += removed
+        return removed
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'memory_entries': len(self._lru), 'memory_bytes': self._bytes,
+                    'disk_evictions': self.disk_evictions}
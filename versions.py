@@ -0,0 +1,34 @@
+"""Per-user data versions in PostgreSQL (migration 0010), shared by every web process and worker.py.
+
+``version`` changes with any write to the user's petani, komoditas or
+hasil_panen rows or harvest rollup; ETags, rendered pages and cached lists
+are keyed on it. ``tile_version`` changes only with petani rows and keys
+the tile cache. Both are bumped inside the transaction that changes the
+data, so a process reading them after the commit - on any host - never
+pairs a new version with old data or an old version with new data.
+"""
+
+
+def get(conn, user_id):
+    """Returns ``(version, tile_version)``; ``(0, 0)`` for a user who has not written anything yet."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT version, tile_version FROM data_versions WHERE user_id = %s", (user_id,))
+        row = cur.fetchone()
+    return tuple(row) if row else (0, 0)
+
+
+def bump(conn, user_id, tiles=False):
+    """Moves the user's version on (and ``tile_version`` with ``tiles=True``) in ``conn``'s transaction.
+
+    The data_versions row stays locked until that transaction ends, so call
+    this as the last statement before the commit.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO data_versions AS v (user_id, version, tile_version)
+            VALUES (%(user_id)s, 1, %(tiles)s::int)
+            ON CONFLICT (user_id) DO UPDATE
+                SET version = v.version + 1,
+                    tile_version = v.tile_version + %(tiles)s::int,
+                    updated_at = now()
+        """, {'user_id': user_id, 'tiles': bool(tiles)})
@@ -0,0 +1,323 @@
+"""Background job worker: runs the imports, exports and rollup rebuilds queued in ``jobs``.
+
+    python worker.py                                  # JOB_CONCURRENCY threads, every kind
+    python worker.py --concurrency 1 --kinds export   # a worker that only exports
+    python worker.py --once                           # run what is runnable now, then exit
+
+Deploy it next to the web process (the Procfile ``worker:`` line); any
+number of worker processes may share one database. Each thread claims one
+job at a time (see jobs.claim for the concurrency limits) and runs it on its
+own connection: the handler's writes, the user's data version
+(versions.py), the job's result and its output files commit together, so a
+job is never half done and the web processes see its changes the moment it
+is marked succeeded. Progress goes through a
+second, autocommit connection and stays visible while that transaction is
+open. A housekeeping thread heartbeats running jobs, requeues jobs of
+workers that died (no heartbeat for JOB_STALE_AFTER seconds), deletes
+finished jobs after JOB_RETENTION_DAYS and compacts sync_log entries older
+than SYNC_LOG_RETENTION_DAYS (sync.prune).
+
+SIGTERM or SIGINT stops claiming and lets running jobs finish.
+"""
+import argparse
+import io
+import logging
+import os
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import psycopg2
+from dotenv import load_dotenv
+
+import analitik
+import config
+import db
+import export
+import importer
+import jobs
+import logs
+import sync
+import versions
+
+log = logging.getLogger('petani_app.worker')
+
+# Row-count progress is written at most this often; messages always are.
+PROGRESS_INTERVAL = 1.0
+RECONNECT_DELAY = 5.0
+PRUNE_INTERVAL = 3600.0
+ERROR_REPORT_ROWS = 500
+
+
+def connect(autocommit=False):
+    conn = psycopg2.connect(application_name='petani_worker', **db.connection_kwargs())
+    conn.autocommit = autocommit
+    return conn
+
+
+class JobContext:
+    """What a handler gets: the job, its work connection and progress reporting."""
+
+    def __init__(self, worker_id, job, conn, control):
+        self.worker_id = worker_id
+        self.job = job
+        self.conn = conn
+        self.control = control
+        self._last_progress = 0.0
+
+    def progress(self, done=None, total=None, message=None):
+        """Records progress; raises jobs.JobCancelled when the job should stop."""
+        now = time.monotonic()
+        if total is None and message is None and now - self._last_progress < PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        if jobs.progress(self.control, self.job['id'], self.worker_id, done, total, message):
+            raise jobs.JobCancelled()
+
+
+def run_import(ctx):
+    """Imports the uploaded file stored with the job, like the old synchronous route did."""
+    job = ctx.job
+    user_id = job['user_id']
+    filename = os.path.basename(job['payload'].get('filename') or '')
+    with tempfile.TemporaryDirectory(prefix='impor_') as tmp:
+        path = os.path.join(tmp, filename or 'berkas')
+        if not jobs.save_file(ctx.conn, job['id'], 'input', path):
+            raise jobs.JobFailed("Berkas unggahan tidak ditemukan.")
+        ctx.progress(0, message="Membaca berkas")
+        try:
+            total = importer.count_features(path)
+            ctx.progress(0, total, "Memuat baris")
+            hasil = importer.import_petani(ctx.conn, path, user_id, progress=ctx.progress)
+        except importer.ImportFileError as e:
+            raise jobs.JobFailed(str(e))
+        except (psycopg2.Error, jobs.JobCancelled):
+            raise
+        except Exception as e:
+            raise jobs.JobFailed(f"Berkas tidak dapat dibaca: {e}") from e
+
+    result = {
+        'inserted': hasil['inserted'],
+        'updated': hasil['updated'],
+        'duplicates': hasil['duplicates'],
+        'error_count': len(hasil['errors']),
+        'errors': hasil['errors'][:ERROR_REPORT_ROWS],
+    }
+    if hasil['errors']:
+        report = io.BytesIO(importer.error_report_csv(hasil['errors']).encode('utf-8'))
+        jobs.write_file(ctx.conn, job['id'], 'laporan', report)
+        result['berkas'] = {'laporan': {'filename': f"laporan_impor_{job['id']}.csv", 'mimetype': 'text/csv'}}
+    versions.bump(ctx.conn, user_id, tiles=True)
+    return result
+
+
+def run_export(ctx):
+    """Writes an export file and stores it with the job for /tugas/<id>/unduh/hasil."""
+    job = ctx.job
+    dataset = job['payload'].get('dataset')
+    fmt = job['payload'].get('format')
+    if dataset not in export.DATASETS or fmt not in export.FORMATS:
+        raise jobs.JobFailed("Dataset atau format ekspor tidak dikenal.")
+    mimetype, extension = export.FORMATS[fmt]
+    filename = job['payload'].get('filename') or f"{dataset}_{datetime.now():%Y%m%d_%H%M%S}.{extension}"
+
+    rows = export.count_rows(ctx.conn, dataset, job['user_id'])
+    ctx.progress(0, rows, "Menulis berkas")
+    with tempfile.TemporaryDirectory(prefix='ekspor_') as tmp:
+        path = os.path.join(tmp, f"ekspor.{extension}")
+        size = export.write_file(ctx.conn, dataset, fmt, job['user_id'], path, progress=ctx.progress)
+        ctx.progress(rows, message="Menyimpan berkas")
+        with open(path, 'rb') as fh:
+            jobs.write_file(ctx.conn, job['id'], 'hasil', fh)
+    return {'rows': rows, 'bytes': size,
+            'berkas': {'hasil': {'filename': filename, 'mimetype': mimetype}}}
+
+
+def run_rekap(ctx):
+    """Recomputes the user's monthly harvest rollup (analitik.rebuild_rollups)."""
+    user_id = ctx.job['user_id']
+    ctx.progress(message="Menghitung ulang rekap panen")
+    rows = analitik.rebuild_rollups(ctx.conn, user_id)
+    versions.bump(ctx.conn, user_id)
+    return {'rows': rows}
+
+
+HANDLERS = {
+    'import_petani': run_import,
+    'export': run_export,
+    'rekap_panen': run_rekap,
+}
+
+
+def _retryable(exc):
+    """Connection trouble, deadlocks and unknown errors are retried; bad input and SQL errors are not."""
+    if isinstance(exc, jobs.JobFailed):
+        return False
+    if isinstance(exc, psycopg2.Error):
+        return isinstance(exc, (psycopg2.OperationalError, psycopg2.InterfaceError))
+    return True
+
+
+def _error_text(exc):
+    if isinstance(exc, jobs.JobFailed):
+        return str(exc)
+    if isinstance(exc, psycopg2.Error):
+        return f"Kesalahan database: {exc}".strip()
+    return f"Kesalahan tak terduga: {exc}"
+
+
+class Worker:
+    def __init__(self, kinds=None, concurrency=2, poll_interval=1.0, stale_after=300, retention_days=7,
+                 sync_retention_days=30):
+        self.id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.kinds = list(kinds or HANDLERS)
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.retention_days = retention_days
+        self.sync_retention_days = sync_retention_days
+        self.stopping = threading.Event()
+        self._done = threading.Event()
+        self._running = set()
+        self._lock = threading.Lock()
+
+    def stop(self, *_):
+        if not self.stopping.is_set():
+            log.info("Worker %s stopping; waiting for running jobs %s", self.id, sorted(self._running))
+        self.stopping.set()
+
+    def run(self, once=False):
+        log.info("Worker %s started: kinds=%s concurrency=%s", self.id, ','.join(self.kinds), self.concurrency)
+        housekeeping = threading.Thread(target=self._housekeeping, name='job-housekeeping', daemon=True)
+        housekeeping.start()
+        loops = [threading.Thread(target=self._loop, args=(once,), name=f'job-{n}')
+                 for n in range(self.concurrency)]
+        for thread in loops:
+            thread.start()
+        # join() with a timeout keeps the main thread free to handle signals.
+        while any(thread.is_alive() for thread in loops):
+            for thread in loops:
+                thread.join(1.0)
+        self._done.set()
+        housekeeping.join(5.0)
+        log.info("Worker %s stopped", self.id)
+
+    def _loop(self, once):
+        work = control = None
+        while not self.stopping.is_set():
+            try:
+                if work is None:
+                    work, control = connect(), connect(autocommit=True)
+                job = jobs.claim(work, self.id, self.kinds)
+                if job is None:
+                    if once:
+                        break
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                self._execute(job, work, control)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                log.error(f"Job worker lost its database connection: {e}", exc_info=True)
+                for conn in (work, control):
+                    if conn is not None and not conn.closed:
+                        conn.close()
+                work = control = None
+                self.stopping.wait(RECONNECT_DELAY)
+        for conn in (work, control):
+            if conn is not None and not conn.closed:
+                conn.close()
+
+    def _execute(self, job, work, control):
+        ctx = JobContext(self.id, job, work, control)
+        with self._lock:
+            self._running.add(job['id'])
+        start = time.monotonic()
+        try:
+            result = HANDLERS[job['kind']](ctx)
+            jobs.succeed(work, job['id'], self.id, result)
+            work.commit()
+        except jobs.JobCancelled:
+            work.rollback()
+            jobs.mark_cancelled(control, job['id'], self.id)
+            log.info("Job %s (%s) cancelled", job['id'], job['kind'])
+        except Exception as e:
+            try:
+                work.rollback()
+            except psycopg2.Error:
+                pass  # the connection is gone; the loop reconnects below
+            status = jobs.fail(control, job['id'], self.id, _error_text(e), retry=_retryable(e))
+            log.error(f"Job {job['id']} ({job['kind']}, attempt {job['attempts']}/{job['max_attempts']}) "
+                      f"failed, now {status}: {e}", exc_info=not isinstance(e, jobs.JobFailed))
+            if work.closed:
+                raise psycopg2.InterfaceError("work connection closed")
+        else:
+            log.info("Job %s (%s) done in %.1f s", job['id'], job['kind'], time.monotonic() - start)
+        finally:
+            with self._lock:
+                self._running.discard(job['id'])
+
+    def _housekeeping(self):
+        conn = None
+        last_prune = 0.0
+        interval = max(1.0, self.stale_after / 4)
+        while not self._done.wait(interval):
+            try:
+                if conn is None:
+                    conn = connect(autocommit=True)
+                with self._lock:
+                    running = list(self._running)
+                jobs.heartbeat(conn, running, self.id)
+                stale = jobs.requeue_stale(conn, self.stale_after)
+                if stale:
+                    log.warning("Requeued jobs of stopped workers: %s", stale)
+                if time.monotonic() - last_prune > PRUNE_INTERVAL:
+                    pruned = jobs.prune(conn, self.retention_days)
+                    if pruned:
+                        log.info("Deleted %s finished jobs older than %s days", pruned, self.retention_days)
+                    compacted = sync.prune(conn, self.sync_retention_days)
+                    if compacted:
+                        log.info("Compacted %s sync_log entries older than %s days",
+                                 compacted, self.sync_retention_days)
+                    last_prune = time.monotonic()
+            except psycopg2.Error as e:
+                log.error(f"Job housekeeping failed: {e}", exc_info=True)
+                if conn is not None and not conn.closed:
+                    conn.close()
+                conn = None
+        if conn is not None and not conn.closed:
+            conn.close()
+
+
+def main(argv=None):
+    load_dotenv()
+    settings = config.load()
+    logs.configure(settings)
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--kinds', default=','.join(HANDLERS),
+                        help=f"comma-separated job kinds to run ({', '.join(HANDLERS)})")
+    parser.add_argument('--concurrency', type=int, default=settings['JOB_CONCURRENCY'],
+                        help='jobs run at once by this process')
+    parser.add_argument('--once', action='store_true', help='exit when no job can be claimed')
+    args = parser.parse_args(argv)
+
+    kinds = [k for k in args.kinds.split(',') if k]
+    unknown = [k for k in kinds if k not in HANDLERS]
+    if unknown:
+        parser.error(f"jenis tugas tidak dikenal: {', '.join(unknown)}")
+
+    worker = Worker(kinds, concurrency=args.concurrency, poll_interval=settings['JOB_POLL_INTERVAL'],
+                    stale_after=settings['JOB_STALE_AFTER'], retention_days=settings['JOB_RETENTION_DAYS'],
+                    sync_retention_days=settings['SYNC_LOG_RETENTION_DAYS'])
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run(once=args.once)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())